@@ -0,0 +1,142 @@
+"""
+Import-time and cold-start report for the dashboard and flights.py.
+
+Runs the imports of a script in a fresh interpreter with `-X importtime`,
+lists the slowest modules and checks the total against a budget:
+
+    python benchmarks/import_time.py                  # dashboard main page
+    python benchmarks/import_time.py src/flights.py   # any script or page
+    python benchmarks/import_time.py --server         # also time streamlit run
+
+Exits with status 1 when a budget is exceeded.
+"""
+import argparse
+import ast
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC = os.path.join(ROOT, "src")
+DASHBOARD = os.path.join(SRC, "Flights_dashboard.py")
+
+# Cold-start budgets on a fresh container (seconds): the imports of the main
+# page, and `streamlit run` until the server answers its health check
+IMPORT_BUDGET = 1.5
+SERVER_BUDGET = 5.0
+
+
+def script_imports(path):
+    """Top-level modules imported by `path`, in order of appearance."""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names = [node.module]
+        else:
+            continue
+        modules += [name for name in names if name not in modules]
+    return modules
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output into (module, self_us, cumulative_us) rows.
+
+    Nested modules are indented under their importer; the indentation is
+    stripped so every module appears once with its own timings.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure_imports(modules, cwd=SRC):
+    """Import `modules` in a fresh interpreter and return the parsed timings."""
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def top_level_total(rows, modules):
+    """Total import time (seconds) of the requested top-level modules."""
+    cumulative = {module: us for module, _, us in rows}
+    return sum(cumulative.get(module, 0) for module in modules) / 1e6
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def measure_server(script=DASHBOARD, timeout=60):
+    """Seconds from `streamlit run` until the server's health check is ok."""
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", script,
+         "--server.headless", "true", "--server.port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                url = f"http://localhost:{port}/_stcore/health"
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.1)
+        sys.exit("streamlit did not start within the timeout")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("script", nargs="?", default=DASHBOARD)
+    parser.add_argument("--top", type=int, default=15,
+                        help="number of slowest modules to list")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET,
+                        help="import budget in seconds")
+    parser.add_argument("--server", action="store_true",
+                        help="also time `streamlit run` until it is healthy")
+    args = parser.parse_args()
+
+    modules = script_imports(args.script)
+    rows = measure_imports(modules)
+    total = top_level_total(rows, modules)
+
+    print(f"Imports of {os.path.relpath(args.script, ROOT)}: {total:.3f} s "
+          f"(budget {args.budget:.1f} s)")
+    print(f"{'cumulative [ms]':>16} {'self [ms]':>10}  module")
+    for module, self_us, cumulative_us in sorted(
+            rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:16.1f} {self_us / 1000:10.1f}  {module}")
+
+    over_budget = total > args.budget
+    if args.server:
+        elapsed = measure_server(args.script)
+        print(f"streamlit run until healthy: {elapsed:.2f} s "
+              f"(budget {SERVER_BUDGET:.1f} s)")
+        over_budget = over_budget or elapsed > SERVER_BUDGET
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 import streamlit as st
-import sqlite3
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import delay_bins
+import dimensions
+import flight_cube
+import queries
+import query_cache
+import sampling
+import table_versions
+import warmup
+from widgets import airport_selectbox, export_button
 import os
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', "flights_database.db")
@@ -61,10 +66,70 @@ st.markdown("""
 
 def load_data(query):
     """Helper function to load data from the SQLite database."""
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        df = pd.read_sql_query(query, conn)
-    return df
+    # results are shared by all sessions, see query_cache.py
+    return query_cache.read_sql(query, DB_PATH)
+
+
+warmup.start(DB_PATH)
+warmup_status = warmup.progress()
+if warmup_status["running"]:
+    st.sidebar.progress(
+        warmup_status["done"] / max(warmup_status["total"], 1),
+        text=f"Warming caches: {warmup_status['step'] or 'starting'}")
+
+with st.sidebar.expander("Query cache"):
+    cache_stats = query_cache.stats()
+    st.caption(
+        f"{cache_stats['entries']} results, "
+        f"{cache_stats['bytes'] / 2**20:.1f} of "
+        f"{cache_stats['budget'] / 2**20:.0f} MB  \n"
+        f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+        f"{cache_stats['evictions']} evictions")
+
+approximate = st.sidebar.toggle(
+    "Fast approximate mode", False,
+    help="Answer the cards, the map distances, the delay distribution, the "
+         "top destinations and the time of day chart from a "
+         f"{sampling.SAMPLE_FRACTION:.0%} stratified sample until the exact "
+         "figures are computed.")
+# aggregates answered with an estimate in this run
+pending_exact = []
+
+
+@st.cache_resource(max_entries=1)
+def get_estimator(sample_version):
+    # one per drawn sample, shared by all sessions
+    return sampling.Estimator(load_data(sampling.SAMPLE_QUERY), path=DB_PATH)
+
+
+def load_or_estimate(exact, estimate=None):
+    """
+    `exact()`, answered from the flight cube, when the cube is built or
+    approximate mode is off; otherwise an estimate (with `*_ci` columns)
+    while the cube is built in the background. The sample is drawn by the
+    warm-up (warmup.py); until it is, the answer is exact. Without
+    `estimate` (the sample cannot answer it), None until the cube is built.
+    """
+    if not approximate or flight_cube.is_ready(DB_PATH):
+        return exact()
+    if estimate is None:
+        pending_exact.append(exact)
+        flight_cube.prefetch(DB_PATH)
+        return None
+    if not sampling.is_current(DB_PATH):
+        return exact()
+    pending_exact.append(exact)
+    flight_cube.prefetch(DB_PATH)
+    estimator = get_estimator(
+        table_versions.versions(DB_PATH, [sampling.SAMPLE_TABLE]))
+    return estimate(estimator)
+
+
+def with_ci(df, column, value, unit=""):
+    """`value` with its 95% interval when `df` holds an estimate."""
+    if column + "_ci" not in df:
+        return f"{value}{unit}"
+    return f"≈{value} ± {df[column + '_ci'][0]}{unit}"
 
 
 st.markdown("""
@@ -78,224 +143,33 @@ st.markdown("""
 
 st.markdown("<hr>", unsafe_allow_html=True)
 
-nyc_airports = ('JFK', 'LGA', 'EWR')
-
-
-#######################################################
-# ALL QUERIES USED IN THE DASHBOARD
-#######################################################
-
-# QUERYING: total flights, percentage delayed, percentage missing arrival time
-query_summary = """
-SELECT 
-    COUNT(*) as total_flights,
-    ROUND(100.0 * SUM(CASE WHEN arr_delay > 0 THEN 1 ELSE 0 END) / 
-          SUM(CASE WHEN arr_delay IS NOT NULL THEN 1 ELSE 0 END), 2) as delay_arrival_percentage,
-    ROUND(100.0 * SUM(CASE WHEN arr_delay IS NULL THEN 1 ELSE 0 END) / COUNT(*), 2) as missing_arrival_percentage
-FROM flights
-WHERE origin IN ('JFK','EWR','LGA');
-"""
-
-query_top_dest = """
-    SELECT 
-        dest, 
-        COUNT(*) as flight_count,
-        (SELECT name FROM airports WHERE faa = dest LIMIT 1) as dest_name
-    FROM flights
-    WHERE origin IN ('JFK','EWR','LGA')
-    GROUP BY dest
-    ORDER BY flight_count DESC
-    LIMIT 1
-    """
-
-# QUERYING: top destination from NYC airports
-
-
-def query_top_dest_from(airports):
-    return f"""
-    SELECT 
-        dest, 
-        COUNT(*) as flight_count,
-        (SELECT name FROM airports WHERE faa = dest LIMIT 1) as dest_name
-    FROM flights
-    WHERE origin = {airport}
-    GROUP BY dest
-    ORDER BY flight_count DESC
-    LIMIT 1
-    """
-
-
-# QUERYING: all routes from NYC airports
-query_routes_all = """
-    SELECT 
-        origin, 
-        dest, 
-        COUNT(*) as flight_count
-    FROM flights
-    WHERE origin IN ('JFK', 'LGA', 'EWR')
-    GROUP BY origin, dest
-    """
-
-# QUERYING: all routes from the chosen airport
-
-
-def query_routes_from(airport):
-    return f"""
-    SELECT
-        origin,
-        dest,
-        COUNT(*) as flight_count
-    FROM flights
-    WHERE origin = '{airport}'
-    GROUP BY origin, dest
-    """
-
+nyc_airports = queries.NYC_ORIGINS
 
-def query_average_distances(airports):
-    if type(airports) == str:
-        return f"""
-        SELECT 
-            origin, 
-            dest, 
-            AVG(distance) as Distance
-        FROM flights
-        WHERE origin = '{airports}'
-        GROUP BY dest
-        """
-    else:
-        return f"""
-        SELECT
-            origin,
-            dest,
-            AVG(distance) as Distance   
-        FROM flights
-        WHERE origin IN {airports}
-        GROUP BY origin, dest
-        """
-
-
-# QUERYING: all airports
-query_airports = """
-    SELECT 
-        a.faa, a.name, a.lat, a.lon, 
-        CAST(IFNULL(alt, 0) AS INTEGER) as Altitude,
-        tz as Timezone
-    FROM airports a
-    """
+# The aggregates of the dashboard come from the in-memory flight cube
+# (flight_cube.py), which the warm-up builds.
+airports_df = load_data(queries.query_airports)
+airports_df['is_nyc'] = airports_df['faa'].isin(dimensions.NYC_AIRPORTS)
 
-airports_df = load_data(query_airports)
-airports_df['is_nyc'] = airports_df['faa'].apply(
-    lambda x: x in ['JFK', 'LGA', 'EWR']
-)
-
-# QUERYING: all routes from a specific airport
-# pass airport as a tuple
-
-
-def select_to_airport(airports):
-    return f"""
-        SELECT 
-            origin, 
-            dest, 
-            COUNT(*) as flight_count
-        FROM flights
-        WHERE origin IN {airports}
-        GROUP BY origin, dest
-        """
-
-# QUERYING: delay distribution from airport
-
-
-def query_delay_distribution(airports):
-    if type(airports) == str:
-        return f"""
-        SELECT 
-            'On Time' as delay_category,
-            COUNT(*) as flight_count,
-            ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin IN ('JFK','EWR','LGA') AND arr_delay IS NOT NULL), 2) as percentage
-        FROM flights
-        WHERE origin = '{airports}' AND arr_delay <= 0
-        UNION ALL
-        SELECT 
-            'Minor (≤15 min)' as delay_category,
-            COUNT(*) as flight_count,
-            ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin IN ('JFK','EWR','LGA') AND arr_delay IS NOT NULL), 2) as percentage
-        FROM flights
-        WHERE origin = '{airports}' AND arr_delay > 0 AND arr_delay <= 15
-        UNION ALL
-        SELECT 
-            'Moderate (16-30 min)' as delay_category,
-            COUNT(*) as flight_count,
-            ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin IN ('JFK','EWR','LGA') AND arr_delay IS NOT NULL), 2) as percentage
-        FROM flights
-        WHERE origin = '{airports}' AND arr_delay > 15 AND arr_delay <= 30
-        UNION ALL
-        SELECT 
-            'Significant (31-60 min)' as delay_category,
-            COUNT(*) as flight_count,
-            ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin IN ('JFK','EWR','LGA') AND arr_delay IS NOT NULL), 2) as percentage
-        FROM flights
-        WHERE origin = '{airports}' AND arr_delay > 30 AND arr_delay <= 60
-        UNION ALL
-        SELECT 
-            'Severe (>60 min)' as delay_category,
-            COUNT(*) as flight_count,
-            ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin IN ('JFK','EWR','LGA') AND arr_delay IS NOT NULL), 2) as percentage
-        FROM flights
-        WHERE origin = '{airports}' AND arr_delay > 60
-        """
-    else:
-        return f"""
-            SELECT 
-                'On Time' as delay_category,
-                COUNT(*) as flight_count,
-                ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin IN ('JFK','EWR','LGA') AND arr_delay IS NOT NULL), 2) as percentage
-            FROM flights
-            WHERE origin IN {airports} AND arr_delay <= 0
-            UNION ALL
-            SELECT 
-                'Minor (≤15 min)' as delay_category,
-                COUNT(*) as flight_count,
-                ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin IN ('JFK','EWR','LGA') AND arr_delay IS NOT NULL), 2) as percentage
-            FROM flights
-            WHERE origin IN {airports} AND arr_delay > 0 AND arr_delay <= 15
-            UNION ALL
-            SELECT 
-                'Moderate (16-30 min)' as delay_category,
-                COUNT(*) as flight_count,
-                ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin IN ('JFK','EWR','LGA') AND arr_delay IS NOT NULL), 2) as percentage
-            FROM flights
-            WHERE origin IN {airports} AND arr_delay > 15 AND arr_delay <= 30
-            UNION ALL
-            SELECT 
-                'Significant (31-60 min)' as delay_category,
-                COUNT(*) as flight_count,
-                ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin IN ('JFK','EWR','LGA') AND arr_delay IS NOT NULL), 2) as percentage
-            FROM flights
-            WHERE origin IN {airports} AND arr_delay > 30 AND arr_delay <= 60
-            UNION ALL
-            SELECT 
-                'Severe (>60 min)' as delay_category,
-                COUNT(*) as flight_count,
-                ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin IN ('JFK','EWR','LGA') AND arr_delay IS NOT NULL), 2) as percentage
-            FROM flights
-            WHERE origin IN {airports} AND arr_delay > 60
-            """
-# --------------------
-
-
-df_summary = load_data(query_summary)
+df_summary = load_or_estimate(lambda: flight_cube.summary(DB_PATH),
+                              lambda estimator: estimator.summary())
 
 total_flights = int(df_summary['total_flights'][0])
 delay_arrival_percentage = df_summary['delay_arrival_percentage'][0]
 missing_arrival_percentage = df_summary['missing_arrival_percentage'][0]
 
 
-df_top_dest = load_data(query_top_dest)
+df_top_dest = load_or_estimate(
+    lambda: flight_cube.top_destinations(1, DB_PATH),
+    lambda estimator: estimator.top_destinations(1))
 top_destination = df_top_dest['dest'][0]
 top_dest_name = df_top_dest['dest_name'][0]
 top_dest_count = int(df_top_dest['flight_count'][0])
 
+# plotly is imported after the sidebar and the summary are drawn, so
+# they show while it loads
+import plotly.express as px
+import plotly.graph_objects as go
+
 col_left, col_right = st.columns([1, 2])
 
 with col_left:
@@ -307,15 +181,20 @@ with col_left:
     
     <div class="metric-card">
         <div class="metric-label">Delayed Arrivals</div>
-        <div class="metric-value">{}%</div>
+        <div class="metric-value">{}</div>
     </div>
     
     <div class="metric-card">
         <div class="metric-label">Most Popular Destination (2023)</div>
-        <div class="metric-value">{} ({:,})</div>
+        <div class="metric-value">{} ({})</div>
         <div class="airport-subtitle">{}</div>
     </div>
-    """.format(total_flights, delay_arrival_percentage, top_destination, top_dest_count, top_dest_name),
+    """.format(total_flights,
+               with_ci(df_summary, 'delay_arrival_percentage',
+                       delay_arrival_percentage, '%'),
+               top_destination,
+               with_ci(df_top_dest, 'flight_count', f"{top_dest_count:,}"),
+               top_dest_name),
         unsafe_allow_html=True)
 
 
@@ -327,25 +206,29 @@ with col_right:
         all_airports_bool = st.toggle(
             "Show data for all origin airports", True)
         if not all_airports_bool:
-            origin_airport = st.selectbox(
-                "Select the origin airport", nyc_airports, index=0)
-            routes_df = load_data(query_routes_from(origin_airport))
+            origin_airport = airport_selectbox(
+                "Select the origin airport", nyc_airports, key='map_origin',
+                container=st)
+            routes_df = dimensions.get_route_index(
+                DB_PATH).routes_from(origin_airport)
             airports_df_map = airports_df[airports_df['faa'].isin(
                 routes_df['dest'].unique())]
             connected_airports = set(routes_df['dest'].unique())
             connected_airports.add(origin_airport)
-            airports_df_map['has_connection'] = airports_df_map['faa'].apply(
-                lambda x: x in connected_airports
-            )
+            airports_df_map['has_connection'] = airports_df_map['faa'].isin(
+                connected_airports)
         else:
             origin_airport = nyc_airports
             airports_df_map = airports_df
-            routes_df = load_data(query_routes_all)
+            routes_df = dimensions.get_route_index(
+                DB_PATH).routes_from(nyc_airports)
             connected_airports = set(routes_df['dest'].unique())
             connected_airports.update(['JFK', 'LGA', 'EWR'])
-            airports_df_map['has_connection'] = airports_df_map['faa'].apply(
-                lambda x: x in connected_airports
-            )
+            airports_df_map['has_connection'] = airports_df_map['faa'].isin(
+                connected_airports)
+
+    with st.sidebar.expander("Export flights"):
+        export_button({"origin": origin_airport}, "dashboard")
 
     with col2:
         color_by = st.selectbox(
@@ -354,7 +237,9 @@ with col_right:
     if color_by == 'Distance':
         airports_df_map = airports_df_map[airports_df_map['has_connection'] == True]
 
-    average_distances = load_data(query_average_distances(origin_airport))
+    average_distances = load_or_estimate(
+        lambda: flight_cube.average_distances(origin_airport, DB_PATH),
+        lambda estimator: estimator.average_distances(origin_airport))
     airports_df_map = airports_df_map.merge(
         average_distances,
         how='left',
@@ -432,12 +317,17 @@ with col1:
     with cola:
         all_airports_delays = st.toggle(
             "Show data for all origin airports", True, key='delay_dist')
-        df_delay = load_data(query_delay_distribution(nyc_airports))
+        df_delay = load_or_estimate(
+            lambda: flight_cube.delay_distribution(nyc_airports, DB_PATH),
+            lambda estimator: estimator.delay_distribution(nyc_airports))
     with colb:
         if not all_airports_delays:
-            airport = st.selectbox(
-                "Select the origin airport", nyc_airports, index=0)
-            df_delay = load_data(query_delay_distribution(airport))
+            airport = airport_selectbox(
+                "Select the origin airport", nyc_airports, key='delay_origin',
+                container=st)
+            df_delay = load_or_estimate(
+                lambda: flight_cube.delay_distribution(airport, DB_PATH),
+                lambda estimator: estimator.delay_distribution(airport))
 
     colors = ["#0D47A1", "#1565C0", "#1976D2", "#1E88E5", "#42A5F5"]
 
@@ -446,6 +336,7 @@ with col1:
         x='delay_category',
         y='flight_count',
         text=df_delay['percentage'].apply(lambda x: f'{x}%'),
+        error_y='flight_count_ci' if 'flight_count_ci' in df_delay else None,
         color='delay_category',
         color_discrete_sequence=colors,
         labels={'flight_count': 'Number of Flights',
@@ -473,70 +364,57 @@ with col1:
 with col2:
     st.subheader("Flight Volume by NYC Airport")
 
-    query_airport_volume = """
-    SELECT 
-        origin as airport,
-        CASE 
-            WHEN origin = 'JFK' THEN 'John F. Kennedy (JFK)'
-            WHEN origin = 'LGA' THEN 'LaGuardia (LGA)'
-            WHEN origin = 'EWR' THEN 'Newark Liberty (EWR)'
-        END as airport_name,
-        COUNT(*) as flights_count,
-        SUM(p.seats) as seats_sum,
-        COUNT(DISTINCT f.dest) as destinations_count
-    FROM flights f
-    JOIN planes p ON f.tailnum = p.tailnum
-    WHERE origin IN ('JFK','EWR','LGA')
-    GROUP BY origin
-    ORDER BY flights_count DESC
-    """
-
-    df_airports = load_data(query_airport_volume)
+    df_airports = load_or_estimate(lambda: flight_cube.airport_volume(DB_PATH))
 
-    flights_or_seats = st.selectbox("Show the distribution for total flights or total seats",
-                                    ['Total Flights', 'Total Seats', 'Destinations served'], index=0)
-
-    if flights_or_seats == 'Total Flights':
-        data_col = 'flights_count'
-        data_title = 'Flights'
-    elif flights_or_seats == 'Total Seats':
-        data_col = 'seats_sum'
-        data_title = 'Seats'
+    if df_airports is None:
+        # seats and destinations are not in the sample
+        st.info("The flight volume by airport appears once the exact "
+                "figures are computed.")
     else:
-        data_col = 'destinations_count'
-        data_title = 'Destinations'
-
-    colors = ["#1565C0", "#1E88E5", "#42A5F5"]
-
-    fig_airports = px.pie(
-        df_airports,
-        names='airport_name',
-        values=data_col,
-        color_discrete_sequence=colors,
-        hole=0.4,
-        height=400
-    )
+        flights_or_seats = st.selectbox("Show the distribution for total flights or total seats",
+                                        ['Total Flights', 'Total Seats', 'Destinations served'], index=0)
+
+        if flights_or_seats == 'Total Flights':
+            data_col = 'flights_count'
+            data_title = 'Flights'
+        elif flights_or_seats == 'Total Seats':
+            data_col = 'seats_sum'
+            data_title = 'Seats'
+        else:
+            data_col = 'destinations_count'
+            data_title = 'Destinations'
+
+        colors = ["#1565C0", "#1E88E5", "#42A5F5"]
+
+        fig_airports = px.pie(
+            df_airports,
+            names='airport_name',
+            values=data_col,
+            color_discrete_sequence=colors,
+            hole=0.4,
+            height=400
+        )
 
-    fig_airports.update_traces(
-        textposition='inside',
-        textinfo='label+percent',
-        hoverinfo='label+value',
-        textfont_size=14
-    )
+        fig_airports.update_traces(
+            textposition='inside',
+            textinfo='label+percent',
+            hoverinfo='label+value',
+            textfont_size=14
+        )
 
-    fig_airports.update_layout(
-        annotations=[dict(
-            text=f"{df_airports[data_col].sum():,}<br>{data_title}",
-            x=0.5, y=0.5,
-            font_size=18,
-            showarrow=False
-        )],
-        margin=dict(l=20, r=20, t=40, b=20)
-    )
+        fig_airports.update_layout(
+            annotations=[dict(
+                text=f"{df_airports[data_col].sum():,}<br>{data_title}",
+                x=0.5, y=0.5,
+                font_size=18,
+                showarrow=False
+            )],
+            margin=dict(l=20, r=20, t=40, b=20)
+        )
 
-    st.markdown('<div>', unsafe_allow_html=True)
-    st.plotly_chart(fig_airports, use_container_width=True)
-    st.markdown('</div>', unsafe_allow_html=True)
+        st.markdown('<div>', unsafe_allow_html=True)
+        st.plotly_chart(fig_airports, use_container_width=True)
+        st.markdown('</div>', unsafe_allow_html=True)
 
 st.markdown("<hr>", unsafe_allow_html=True)
 
@@ -545,18 +423,9 @@ st.markdown("<hr>", unsafe_allow_html=True)
 # ----------------------------
 st.subheader("Top 10 Destinations from NYC Airports")
 
-query_top_destinations = """
-SELECT 
-    dest, 
-    COUNT(*) as flight_count,
-    (SELECT name FROM airports WHERE faa = dest LIMIT 1) as dest_name
-FROM flights
-WHERE origin IN ('JFK','EWR','LGA')
-GROUP BY dest
-ORDER BY flight_count DESC
-LIMIT 10
-"""
-df_destinations = load_data(query_top_destinations)
+df_destinations = load_or_estimate(
+    lambda: flight_cube.top_destinations(10, DB_PATH),
+    lambda estimator: estimator.top_destinations(10))
 
 blue_palette = [
     "#f7fbff",
@@ -582,6 +451,7 @@ fig_destinations = px.bar(
             'dest': 'Destination Airport'},
     height=500,
     text=df_destinations['flight_count'],
+    error_x='flight_count_ci' if 'flight_count_ci' in df_destinations else None,
     custom_data=['dest_name']
 )
 
@@ -623,31 +493,8 @@ st.markdown('</div>', unsafe_allow_html=True)
 # Airline Performance Analysis
 # ----------------------------
 st.subheader("Time of Day Analysis")
-query_time_of_day = """
-SELECT 
-    CASE
-        WHEN CAST(dep_time/100 AS INTEGER) BETWEEN 5 AND 8 THEN 'Early Morning (5-8)'
-        WHEN CAST(dep_time/100 AS INTEGER) BETWEEN 9 AND 12 THEN 'Morning (9-12)'
-        WHEN CAST(dep_time/100 AS INTEGER) BETWEEN 13 AND 16 THEN 'Afternoon (13-16)'
-        WHEN CAST(dep_time/100 AS INTEGER) BETWEEN 17 AND 20 THEN 'Evening (17-20)'
-        ELSE 'Night (21-4)'
-    END as time_of_day,
-    COUNT(*) as flight_count,
-    ROUND(100.0 * SUM(CASE WHEN arr_delay > 0 THEN 1 ELSE 0 END) / 
-        COUNT(CASE WHEN arr_delay IS NOT NULL THEN 1 ELSE NULL END), 2) as delay_percentage
-FROM flights
-WHERE origin IN ('JFK','EWR','LGA') AND dep_time IS NOT NULL
-GROUP BY time_of_day
-ORDER BY 
-    CASE 
-        WHEN time_of_day = 'Early Morning (5-8)' THEN 1
-        WHEN time_of_day = 'Morning (9-12)' THEN 2
-        WHEN time_of_day = 'Afternoon (13-16)' THEN 3
-        WHEN time_of_day = 'Evening (17-20)' THEN 4
-        ELSE 5
-    END
-"""
-df_time = load_data(query_time_of_day)
+df_time = load_or_estimate(lambda: flight_cube.time_of_day(DB_PATH),
+                           lambda estimator: estimator.time_of_day())
 blue_colors = ["#8fc4ff", "#6baed6", "#4a98c9", "#3182bd", "#1c6ca8"]
 
 fig_time = px.bar(
@@ -657,6 +504,7 @@ fig_time = px.bar(
     color='delay_percentage',
     color_continuous_scale=blue_colors,
     text=df_time['delay_percentage'].apply(lambda x: f"{x}%"),
+    error_y='delay_percentage_ci' if 'delay_percentage_ci' in df_time else None,
     labels={
         'time_of_day': 'Time of Day',
         'delay_percentage': 'Delayed Flights (%)'
@@ -703,3 +551,69 @@ fig_time.update_traces(
 st.markdown('<div>', unsafe_allow_html=True)
 st.plotly_chart(fig_time, use_container_width=True)
 st.markdown('</div>', unsafe_allow_html=True)
+
+
+# ----------------------------
+# Arrival Delay by Distance
+# ----------------------------
+st.subheader("Arrival Delay by Distance")
+
+
+df_carriers = load_data(queries.query_carriers)
+carrier_names = dict(zip(df_carriers['carrier'], df_carriers['name']))
+
+col_width, col_carriers = st.columns([1, 3])
+with col_width:
+    bin_width = st.slider("Distance bin width (miles)", min_value=50,
+                          max_value=500, value=200, step=50)
+with col_carriers:
+    selected_carriers = st.multiselect(
+        "Compare airlines (all flights when empty)",
+        options=list(carrier_names),
+        format_func=lambda c: f"{carrier_names[c]} ({c})"
+    )
+
+# only the aggregated (bin, carrier) rows come back from SQLite, cached
+# until `flights` changes (delay_bins.py)
+df_bins = delay_bins.distance_delay_bins(
+    bin_width, selected_carriers, by_carrier=bool(selected_carriers),
+    path=DB_PATH)
+fig_bins = px.line(
+    df_bins,
+    x='bin_midpoint',
+    y='arr_delay',
+    color='carrier' if selected_carriers else None,
+    markers=True,
+    hover_data={'count': ':,'},
+    labels={
+        'bin_midpoint': 'Distance (miles, bin midpoint)',
+        'arr_delay': 'Average Arrival Delay (minutes)',
+        'carrier': 'Airline',
+        'count': 'Flights'
+    },
+    height=450
+)
+fig_bins.update_layout(
+    template='plotly_white',
+    margin=dict(l=40, r=40, t=40, b=40)
+)
+
+st.markdown('<div>', unsafe_allow_html=True)
+st.plotly_chart(fig_bins, use_container_width=True)
+st.markdown('</div>', unsafe_allow_html=True)
+
+
+# ----------------------------
+# Approximate mode: swap in the exact figures once they are computed
+# ----------------------------
+if pending_exact:
+    st.sidebar.caption(
+        "≈ Estimates with 95% intervals; the exact figures replace them "
+        "when ready.")
+
+    @st.fragment(run_every=2)
+    def replace_estimates():
+        if flight_cube.is_ready(DB_PATH):
+            st.rerun()
+
+    replace_estimates()
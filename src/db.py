@@ -0,0 +1,94 @@
+import math
+import os
+import sqlite3
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "flights_database.db")
+
+EARTH_RADIUS_KM = 6378.1370
+
+
+# The functions below are registered as deterministic SQL functions, so they
+# can be used in WHERE/GROUP BY clauses and in indexes on expressions. SQL
+# NULL arrives as None and gives NULL back.
+
+def geo_distance(lat1, lon1, lat2, lon2):
+    """Distance in km between two points (same formula as flights.py)."""
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    exp_one = (2 * math.sin(dlat / 2) * math.cos(dlon / 2)) ** 2
+    exp_two = (2 * math.cos((lat1 + lat2) / 2) * math.sin(dlon / 2)) ** 2
+    return EARTH_RADIUS_KM * math.sqrt(exp_one + exp_two)
+
+
+def compass_bearing(lat1, lon1, lat2, lon2):
+    """Initial bearing in degrees (0° = north) from point 1 to point 2."""
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    lat1, lat2 = math.radians(lat1), math.radians(lat2)
+    diff_long = math.radians(lon2 - lon1)
+    x = math.sin(diff_long) * math.cos(lat2)
+    y = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * \
+        math.cos(lat2) * math.cos(diff_long)
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+
+def hhmm_to_minutes(hhmm):
+    """Convert an HHMM time (e.g. 1530) to minutes since midnight."""
+    if hhmm is None or hhmm < 0:
+        return None
+    hhmm = int(hhmm)
+    return (hhmm // 100) * 60 + hhmm % 100
+
+
+def minutes_to_hhmm(minutes):
+    """Convert minutes since midnight to HHMM, wrapping past midnight."""
+    if minutes is None or minutes < 0:
+        return None
+    minutes = int(minutes) % 1440
+    return (minutes // 60) * 100 + minutes % 60
+
+
+def wind_alignment(wind_dir, bearing):
+    """
+    Cosine of the angle between the wind direction and the route bearing.
+
+    With `wind_dir` the direction the wind comes from, `wind_speed *
+    wind_alignment(...)` is the headwind (negative for a tailwind).
+    """
+    if wind_dir is None or bearing is None:
+        return None
+    return math.cos(math.radians(wind_dir - bearing))
+
+
+SQL_FUNCTIONS = {
+    "geo_distance": (geo_distance, 4),
+    "compass_bearing": (compass_bearing, 4),
+    "hhmm_to_minutes": (hhmm_to_minutes, 1),
+    "minutes_to_hhmm": (minutes_to_hhmm, 1),
+    "wind_alignment": (wind_alignment, 2),
+}
+
+
+def register_functions(conn):
+    """Register the project's SQL functions on an open connection."""
+    for name, (function, n_args) in SQL_FUNCTIONS.items():
+        conn.create_function(name, n_args, function, deterministic=True)
+    return conn
+
+
+def table_columns(conn, table):
+    """Names of the columns of `table`, in order."""
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def connect(path=DB_PATH, **kwargs):
+    """
+    Open the flights database with the SQL functions registered.
+
+    Use this instead of `sqlite3.connect` so that queries (and indexes on
+    expressions) using the functions work on every connection.
+    """
+    return register_functions(sqlite3.connect(path, **kwargs))
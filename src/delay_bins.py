@@ -0,0 +1,66 @@
+import functools
+
+import pandas as pd
+
+import db
+import table_versions
+
+
+def query_distance_delay_bins(conn, width=200, carriers=None, by_carrier=False):
+    """
+    Mean arrival delay per distance bin, aggregated inside SQLite.
+
+    Bin `b` covers distances [b * width, (b + 1) * width). Only one row per
+    bin (and carrier, with `by_carrier`) comes back: bin, bin_start,
+    bin_end, bin_midpoint, [carrier,] arr_delay (the mean) and count (the
+    number of non-missing delays). `carriers` restricts the flights used.
+    """
+    width = int(width)
+    if width <= 0:
+        raise ValueError("The bin width must be a positive number of miles")
+
+    group = "bin, carrier" if by_carrier else "bin"
+    where = "distance IS NOT NULL AND arr_delay IS NOT NULL"
+    params = [width]
+    if carriers:
+        carriers = list(carriers)
+        where += f" AND carrier IN ({', '.join(['?'] * len(carriers))})"
+        params += carriers
+
+    grouped = pd.read_sql_query(f"""
+        SELECT CAST(distance / ? AS INTEGER) AS bin,
+               {'carrier,' if by_carrier else ''}
+               AVG(arr_delay) AS arr_delay,
+               COUNT(*) AS count
+        FROM flights
+        WHERE {where}
+        GROUP BY {group}
+        ORDER BY {group}
+    """, conn, params=params)
+
+    grouped.insert(1, "bin_start", grouped["bin"] * width)
+    grouped.insert(2, "bin_end", grouped["bin_start"] + width)
+    grouped.insert(3, "bin_midpoint", grouped["bin_start"] + width / 2)
+    return grouped
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_bins(path, version, width, carriers, by_carrier):
+    conn = db.connect(path)
+    try:
+        return query_distance_delay_bins(conn, width, carriers, by_carrier)
+    finally:
+        conn.close()
+
+
+def distance_delay_bins(width=200, carriers=None, by_carrier=False,
+                        path=db.DB_PATH):
+    """
+    Cached `query_distance_delay_bins` on the database at `path`.
+
+    Results are reused until `flights` changes.
+    """
+    carriers = tuple(sorted(carriers)) if carriers else None
+    version = table_versions.versions(path, ["flights"])
+    result = _cached_bins(path, version, int(width), carriers, by_carrier)
+    return result.copy()
@@ -0,0 +1,152 @@
+import functools
+import os
+import threading
+
+import pandas as pd
+
+import db
+import table_versions
+
+NYC_AIRPORTS = ["EWR", "JFK", "LGA"]
+
+# key column of each dimension table
+KEYS = {"airports": "faa", "airlines": "carrier", "planes": "tailnum"}
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _compact(df):
+    """Store repeated text values (time zones, plane models, ...) as categories."""
+    for column in df.columns:
+        if df[column].dtype == object and df[column].nunique() < len(df) / 2:
+            df[column] = df[column].astype("category")
+    return df
+
+
+class Dimensions:
+    """
+    The airports, airlines and planes tables, indexed by faa/carrier/tailnum.
+
+    Lookups go through the hash index of each frame, so mapping a column of
+    codes to an attribute is a single vectorized `map`.
+    """
+
+    def __init__(self, conn):
+        self.tables = {}
+        for table, key in KEYS.items():
+            df = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+            df = df.drop_duplicates(key).set_index(key)
+            self.tables[table] = _compact(df)
+
+    @property
+    def airports(self):
+        return self.tables["airports"]
+
+    @property
+    def airlines(self):
+        return self.tables["airlines"]
+
+    @property
+    def planes(self):
+        return self.tables["planes"]
+
+    def map(self, table, codes, column="name"):
+        """Map airport/airline/plane codes to `column`; unknown codes give NaN."""
+        return pd.Series(codes).astype(object).map(self.tables[table][column])
+
+    @functools.cached_property
+    def airport_labels(self):
+        """'FAA - Name' label of every airport, built once per load."""
+        airports = self.airports
+        labels = airports.index + " - " + airports["name"].astype(str)
+        return dict(zip(airports.index, labels))
+
+    def airport_names(self, faa):
+        return self.map("airports", faa, "name")
+
+    def airline_names(self, carriers):
+        """Airline names, falling back to the carrier code when unknown."""
+        carriers = pd.Series(carriers).astype(object)
+        names = self.map("airlines", carriers, "name").astype(object)
+        return names.fillna(carriers)
+
+    def plane_attribute(self, tailnums, column):
+        return self.map("planes", tailnums, column)
+
+    def is_nyc(self, faa):
+        return pd.Series(faa).isin(NYC_AIRPORTS)
+
+
+class RouteIndex:
+    """
+    Flight counts per (origin, dest), from a single GROUP BY over `flights`.
+
+    Answers "which destinations does this origin serve" and "does this
+    route have flights" without querying `flights` again.
+    """
+
+    def __init__(self, conn):
+        self.routes = pd.read_sql_query("""
+            SELECT origin, dest, COUNT(*) AS flight_count
+            FROM flights
+            GROUP BY origin, dest
+            ORDER BY origin, flight_count DESC, dest
+        """, conn)
+        self._counts = dict(zip(zip(self.routes["origin"], self.routes["dest"]),
+                                self.routes["flight_count"]))
+        self._by_origin = {origin: group["dest"].tolist()
+                           for origin, group in self.routes.groupby("origin")}
+
+    def destinations(self, origin, sort_by="traffic"):
+        """Destinations served from `origin`, busiest first or by code."""
+        dests = self._by_origin.get(origin, [])
+        return sorted(dests) if sort_by == "code" else list(dests)
+
+    def flight_count(self, origin, dest):
+        return int(self._counts.get((origin, dest), 0))
+
+    def routes_from(self, origins):
+        """The (origin, dest, flight_count) rows of the given origins."""
+        if isinstance(origins, str):
+            origins = [origins]
+        return self.routes[self.routes["origin"].isin(list(origins))]
+
+    def top_routes(self, n, origins=NYC_AIRPORTS):
+        """The `n` busiest (origin, dest) pairs departing from `origins`."""
+        busiest = self.routes_from(origins).nlargest(n, "flight_count")
+        return list(zip(busiest["origin"], busiest["dest"]))
+
+
+def _shared(kind, build, path, tables):
+    """
+    Build `kind` once per process and database, rebuilding it when one of
+    the `tables` it reads changes.
+    """
+    path = os.path.abspath(path)
+    version = table_versions.versions(path, tables)
+    with _lock:
+        cached = _cache.get((kind, path))
+        if cached is None or cached[0] != version:
+            conn = db.connect(path)
+            try:
+                cached = (version, build(conn))
+            finally:
+                conn.close()
+            _cache[(kind, path)] = cached
+    return cached[1]
+
+
+def get_dimensions(path=db.DB_PATH):
+    """
+    Process-wide `Dimensions` for the database at `path`.
+
+    Loaded once and shared by every caller (pages, sessions, threads); it is
+    reloaded when one of the tables changes.
+    """
+    return _shared("dimensions", Dimensions, path, list(KEYS))
+
+
+def get_route_index(path=db.DB_PATH):
+    """Process-wide `RouteIndex`, rebuilt when `flights` changes."""
+    return _shared("routes", RouteIndex, path, ["flights"])
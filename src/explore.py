@@ -1,12 +1,9 @@
-import sqlite3
+import db
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
 
 def load_data(query):
     """Helper function to load data from the SQLite database."""
-    with sqlite3.connect("/Users/monika/projectFlights-group8-1/flights_database.db") as conn:
+    with db.connect("/Users/monika/projectFlights-group8-1/flights_database.db") as conn:
         cursor = conn.cursor()
         df = pd.read_sql_query(query, conn)
     return df
@@ -0,0 +1,243 @@
+"""
+Streaming export of flights to CSV or Parquet.
+
+The matching rows are fetched from SQLite `chunksize` at a time and handed
+straight to the `csv` module or to a pyarrow `ParquetWriter` (one row group
+per chunk), so only one chunk is in memory, however many years are
+exported. From the command line:
+
+    python src/export.py flights.parquet
+    python src/export.py jfk_lax.csv --origin JFK --dest LAX \\
+        --start 2023-01-01 --end 2023-03-31
+"""
+import argparse
+import csv
+import os
+import shlex
+import sys
+
+import db
+import streaming
+from queries import DELAY_BUCKET
+
+FORMATS = ("csv", "parquet")
+MIME_TYPES = {"csv": "text/csv", "parquet": "application/octet-stream"}
+
+_DATE = "(year * 10000 + month * 100 + day)"
+
+
+def _values(value):
+    if value is None:
+        return []
+    if isinstance(value, (str, int)):
+        return [value]
+    return list(value)
+
+
+def _date_number(date):
+    """'YYYY-MM-DD' (or a date) as YYYYMMDD."""
+    return int(str(date)[:10].replace("-", ""))
+
+
+def flights_query(origin=None, dest=None, carrier=None, start=None, end=None,
+                  hours=None, delay_buckets=None):
+    """
+    SQL and parameters selecting the flights that match every filter.
+
+    `origin`, `dest` and `carrier` take a code or a list of codes, `start`
+    and `end` bound the dates (inclusive), `hours` lists departure hours
+    and `delay_buckets` arrival delay categories (queries.DELAY_CATEGORIES).
+    Filters left as None (or empty) select everything.
+    """
+    conditions, params = [], []
+    for column, selected in [("origin", origin), ("dest", dest),
+                             ("carrier", carrier),
+                             ("CAST(dep_time / 100 AS INTEGER)", hours),
+                             (DELAY_BUCKET, delay_buckets)]:
+        selected = _values(selected)
+        if selected:
+            conditions.append(
+                f"{column} IN ({', '.join(['?'] * len(selected))})")
+            params += selected
+    if start is not None:
+        conditions.append(f"{_DATE} >= ?")
+        params.append(_date_number(start))
+    if end is not None:
+        conditions.append(f"{_DATE} <= ?")
+        params.append(_date_number(end))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT * FROM flights {where}", params
+
+
+def count_flights(path=db.DB_PATH, **filters):
+    """Number of flights matching `filters` (see `flights_query`)."""
+    query, params = flights_query(**filters)
+    conn = db.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM ({query})",
+                            params).fetchone()[0]
+    finally:
+        conn.close()
+
+
+# filter: option of the command line
+_OPTIONS = {"origin": "--origin", "dest": "--dest", "carrier": "--carrier",
+            "hours": "--hour", "delay_buckets": "--delay-bucket",
+            "start": "--start", "end": "--end"}
+
+
+def command_line(out, **filters):
+    """The command exporting the flights matching `filters` to `out`."""
+    words = ["python", "src/export.py", out]
+    for name, option in _OPTIONS.items():
+        value = filters.get(name)
+        if name in ("start", "end"):
+            values = [] if value is None else [str(value)[:10]]
+        else:
+            values = [str(v) for v in _values(value)]
+        if values:
+            words += [option, *values]
+    return shlex.join(words)
+
+
+def _arrow_type(declared):
+    """Arrow type for a SQLite declared column type (its type affinity)."""
+    import pyarrow as pa
+
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return pa.int64()
+    if any(name in declared for name in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return pa.string()
+
+
+def _arrow_column(values, type_):
+    import pyarrow as pa
+
+    if pa.types.is_string(type_):
+        # SQLite may store numbers in a TEXT column
+        return pa.array([None if v is None else str(v) for v in values],
+                        type=type_)
+    try:
+        return pa.array(values, type=type_)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # whole numbers stored as REAL in an INTEGER column
+        return pa.array(values).cast(type_)
+
+
+class _CsvWriter:
+    def __init__(self, out, columns, types):
+        self.file = open(out, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, out, columns, types):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.schema = pa.schema(
+            [(column, _arrow_type(type_)) for column, type_ in zip(columns, types)])
+        self.writer = pq.ParquetWriter(out, self.schema)
+
+    def write(self, rows):
+        import pyarrow as pa
+
+        columns = list(zip(*rows))
+        self.writer.write_table(pa.Table.from_arrays(
+            [_arrow_column(values, field.type)
+             for values, field in zip(columns, self.schema)],
+            schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+_WRITERS = {"csv": _CsvWriter, "parquet": _ParquetWriter}
+
+
+def export_flights(out, fmt=None, chunksize=streaming.DEFAULT_CHUNKSIZE,
+                   path=db.DB_PATH, progress=None, **filters):
+    """
+    Write the flights matching `filters` (see `flights_query`) to `out`.
+
+    `fmt` is 'csv' or 'parquet', by default the extension of `out`.
+    `progress(done, total)` is called after every chunk. Returns the number
+    of rows written.
+    """
+    fmt = fmt or os.path.splitext(out)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}, use one of {FORMATS}")
+    query, params = flights_query(**filters)
+
+    conn = db.connect(path)
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM ({query})",
+                             params).fetchone()[0]
+        declared = {row[1]: row[2] for row in
+                    conn.execute("PRAGMA table_info(flights)")}
+        cursor = conn.execute(query, params)
+        columns = [description[0] for description in cursor.description]
+        writer = _WRITERS[fmt](out, columns,
+                               [declared.get(column) for column in columns])
+        done = 0
+        try:
+            if progress:
+                progress(done, total)
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                writer.write(rows)
+                done += len(rows)
+                if progress:
+                    progress(done, total)
+        finally:
+            writer.close()
+    finally:
+        conn.close()
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export flights to CSV or Parquet, streaming from SQLite.")
+    parser.add_argument("out", help="output file, .csv or .parquet")
+    parser.add_argument("--format", choices=FORMATS,
+                        help="output format (default: from the extension)")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite database")
+    parser.add_argument("--origin", nargs="+", help="origin airport code(s)")
+    parser.add_argument("--dest", nargs="+", help="destination code(s)")
+    parser.add_argument("--carrier", nargs="+", help="carrier code(s)")
+    parser.add_argument("--hour", nargs="+", type=int,
+                        help="departure hour(s), 0-23")
+    parser.add_argument("--delay-bucket", nargs="+",
+                        help="arrival delay categories, e.g. 'On Time'")
+    parser.add_argument("--start", help="first date, YYYY-MM-DD")
+    parser.add_argument("--end", help="last date, YYYY-MM-DD")
+    parser.add_argument("--chunksize", type=int,
+                        default=streaming.DEFAULT_CHUNKSIZE,
+                        help="rows read and written at a time")
+    args = parser.parse_args(argv)
+
+    def report(done, total):
+        print(f"\r{done:,} / {total:,} flights", end="", file=sys.stderr)
+
+    written = export_flights(args.out, args.format, args.chunksize, args.db,
+                             report, origin=args.origin, dest=args.dest,
+                             carrier=args.carrier, hours=args.hour,
+                             delay_buckets=args.delay_bucket,
+                             start=args.start, end=args.end)
+    print(f"\nWrote {written:,} flights to {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Compact in-memory columns of `flights` for the cross-filtering explorer.
+
+Every flight is one position in a few NumPy arrays: small integer codes of
+the categorical FILTERS, the day number and the delays. The rows are sorted
+by date, so a date range is a contiguous run of rows. For every value of
+every filter a bitmap (one bit per flight, `np.packbits`) is built up
+front; a combination of filters is then a few byte-wise OR/AND operations
+over the bitmaps, restricted to the bytes of the date range, and each chart
+re-aggregates the selected rows with `np.bincount`.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import db
+import table_versions
+from flight_schema import read_typed
+from queries import DELAY_BUCKET
+
+FILTERS = ("origin", "dest", "carrier", "hour", "delay_bucket")
+
+_cache = {}
+_lock = threading.Lock()
+
+
+class FlightColumns:
+    """The columns of `flights` and their bitmaps, see the module docstring."""
+
+    def __init__(self, conn):
+        # `dep_hour`: `hour` is the scheduled hour in flights
+        df = read_typed(f"""
+            SELECT origin, dest, carrier, year, month, day,
+                   CAST(dep_time / 100 AS INTEGER) AS dep_hour,
+                   {DELAY_BUCKET} AS delay_bucket,
+                   dep_delay, arr_delay
+            FROM flights
+            ORDER BY year, month, day
+        """, conn)
+        df = df.rename(columns={"dep_hour": "hour"})
+        dates = pd.to_datetime(df[["year", "month", "day"]].astype("int64"))
+        self.first_day = dates.min() if len(df) else pd.Timestamp(0)
+        self.day = (dates - self.first_day).dt.days.to_numpy(np.int32)
+        self.dep_delay = df["dep_delay"].to_numpy(np.float32, na_value=np.nan)
+        self.arr_delay = df["arr_delay"].to_numpy(np.float32, na_value=np.nan)
+
+        self.values, self.codes, self.bitmaps = {}, {}, {}
+        for dimension in FILTERS:
+            codes, uniques = pd.factorize(df[dimension], sort=True,
+                                          use_na_sentinel=False)
+            self.values[dimension] = np.asarray(uniques, dtype=object)
+            self.codes[dimension] = codes.astype(
+                np.min_scalar_type(len(uniques)))
+            # (value, byte) array; bit i of a row is set when flight i has it
+            self.bitmaps[dimension] = np.stack(
+                [np.packbits(codes == i) for i in range(len(uniques))]
+            ) if len(uniques) else np.zeros((0, 0), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.day)
+
+    @property
+    def last_day(self):
+        return self.first_day + pd.Timedelta(days=int(self.day.max())
+                                             if len(self) else 0)
+
+    def options(self, dimension):
+        """The values of `dimension` that occur, without missing ones."""
+        return [value for value in self.values[dimension] if not pd.isna(value)]
+
+    def _rows(self, dimension, selected):
+        index = pd.Index(self.values[dimension])
+        positions = index.get_indexer(list(selected))
+        return positions[positions >= 0]
+
+    def mask(self, selections, start=None, end=None, exclude=None):
+        """
+        Boolean mask of the flights passing every filter.
+
+        `selections` maps a dimension of FILTERS to the values kept (all
+        values when empty); `start` and `end` bound the dates (inclusive).
+        The filter on `exclude` is ignored, so a chart of that dimension
+        shows every value the other filters allow.
+        """
+        n = len(self)
+        lo = 0 if start is None else int(np.searchsorted(
+            self.day, (pd.Timestamp(start) - self.first_day).days, "left"))
+        hi = n if end is None else int(np.searchsorted(
+            self.day, (pd.Timestamp(end) - self.first_day).days, "right"))
+        # only the bytes covering the date range are combined
+        first, last = lo // 8, -(-hi // 8)
+
+        packed = None
+        for dimension, selected in selections.items():
+            if not selected or dimension == exclude:
+                continue
+            bits = np.bitwise_or.reduce(
+                self.bitmaps[dimension][self._rows(dimension, selected),
+                                        first:last], axis=0)
+            packed = bits if packed is None else packed & bits
+
+        mask = np.zeros(n, dtype=bool)
+        if packed is None:
+            mask[lo:hi] = True
+        elif hi > lo:
+            end_bit = min(last * 8, n)
+            mask[first * 8:end_bit] = np.unpackbits(
+                packed, count=end_bit - first * 8).view(bool)
+            mask[first * 8:lo] = False
+            mask[hi:] = False
+        return mask
+
+    def _aggregate(self, codes, size, mask):
+        """Flights and mean delays per code among the `mask`ed flights."""
+        codes = codes[mask]
+        result = {"flights": np.bincount(codes, minlength=size)}
+        for column in ("dep_delay", "arr_delay"):
+            delay = getattr(self, column)[mask]
+            known = ~np.isnan(delay)
+            total = np.bincount(codes[known], weights=delay[known],
+                                minlength=size)
+            n = np.bincount(codes[known], minlength=size)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result[f"avg_{column}"] = np.where(n > 0, total / n, np.nan)
+        return pd.DataFrame(result)
+
+    def by(self, dimension, mask):
+        """Flights and mean delays per value of `dimension`, busiest first."""
+        values = self.values[dimension]
+        result = self._aggregate(self.codes[dimension], len(values), mask)
+        result.insert(0, dimension, values)
+        result = result[result["flights"] > 0]
+        return result.sort_values("flights", ascending=False,
+                                  kind="stable").reset_index(drop=True)
+
+    def daily(self, mask):
+        """Flights and mean delays per date."""
+        n_days = int(self.day.max()) + 1 if len(self) else 0
+        result = self._aggregate(self.day, n_days, mask)
+        result.insert(0, "date", self.first_day + pd.to_timedelta(
+            np.arange(n_days), unit="D"))
+        return result[result["flights"] > 0].reset_index(drop=True)
+
+    def totals(self, mask):
+        """Flights and mean delays over all the `mask`ed flights."""
+        return self._aggregate(np.zeros(len(self), dtype=np.int8), 1,
+                               mask).iloc[0]
+
+
+def get_flight_columns(path=db.DB_PATH):
+    """
+    Process-wide `FlightColumns` of the database at `path`, shared by all
+    sessions and reloaded when `flights` changes.
+    """
+    path = os.path.abspath(path)
+    version = table_versions.versions(path, ["flights"])
+    with _lock:
+        cached = _cache.get(path)
+        if cached is None or cached[0] != version:
+            conn = db.connect(path)
+            try:
+                cached = _cache[path] = (version, FlightColumns(conn))
+            finally:
+                conn.close()
+    return cached[1]
@@ -0,0 +1,441 @@
+"""
+In-memory aggregate cube of `flights`, for the charts of the dashboard.
+
+`flights` (joined to `planes` for the seats) is grouped once by every
+combination of DIMENSIONS that occurs; each of these cells holds the
+MEASURES summed over its flights. The dimensions are dictionary-encoded:
+every dimension keeps its distinct values once and the cells hold small
+integer codes into them, so selecting and re-grouping cells are NumPy
+operations on a few arrays:
+
+    cube = get_flight_cube(path)
+    cube.slice("origin", "JFK").rollup("month")
+    cube.dice(origin=NYC_ORIGINS, dest="LAX").rollup("carrier")
+
+The functions at the bottom answer the aggregates of the pages from the
+cube, one DataFrame per chart.
+"""
+import concurrent.futures
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import db
+import dimensions
+import table_versions
+from queries import DELAY_BUCKET, DELAY_CATEGORIES, NYC_ORIGINS
+
+DIMENSIONS = ("origin", "dest", "carrier", "year", "month", "day", "weekday",
+              "hour", "delay_bucket")
+# sums (`*_sum`) and counts of flights; `*_n` count the non-missing values
+MEASURES = ("flights", "dep_delay_sum", "dep_delay_n", "dep_delayed",
+            "arr_delay_sum", "arr_delay_n", "arr_delayed", "distance_sum",
+            "distance_n", "seats", "seated_flights")
+# the cube changes when one of these does
+TABLES = ["flights", "planes"]
+
+_cache = {}
+# held while a cube is built; readers of `_cache` never wait on it
+_build_lock = threading.Lock()
+# the background build of each database, see `prefetch`
+_pending = {}
+_pending_lock = threading.Lock()
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="flight-cube")
+
+
+def _read_cells(conn):
+    """One row per occurring combination of the dimensions, with MEASURES."""
+    cells = pd.read_sql_query(f"""
+        SELECT f.origin, f.dest, f.carrier, f.year, f.month, f.day,
+               CAST(f.dep_time / 100 AS INTEGER) AS hour,
+               {DELAY_BUCKET} AS delay_bucket,
+               COUNT(*) AS flights,
+               TOTAL(f.dep_delay) AS dep_delay_sum,
+               COUNT(f.dep_delay) AS dep_delay_n,
+               TOTAL(f.dep_delay > 0) AS dep_delayed,
+               TOTAL(f.arr_delay) AS arr_delay_sum,
+               COUNT(f.arr_delay) AS arr_delay_n,
+               TOTAL(f.arr_delay > 0) AS arr_delayed,
+               TOTAL(f.distance) AS distance_sum,
+               COUNT(f.distance) AS distance_n,
+               TOTAL(p.seats) AS seats,
+               COUNT(p.tailnum) AS seated_flights
+        FROM flights f
+        LEFT JOIN (SELECT tailnum, MAX(seats) AS seats
+                   FROM planes GROUP BY tailnum) p ON f.tailnum = p.tailnum
+        -- by position: `hour` would name the scheduled hour of flights
+        GROUP BY 1, 2, 3, 4, 5, 6, 7, 8
+    """, conn)
+    # Monday is 0; the day of the week follows from the date, so it adds
+    # no cells
+    dates = pd.to_datetime(cells[["year", "month", "day"]], errors="coerce")
+    cells["weekday"] = dates.dt.dayofweek
+    return cells
+
+
+class FlightCube:
+    """
+    Dictionary-encoded cells of the flights cube, see the module docstring.
+
+    `values[d]` holds the distinct values of dimension `d`, `codes[d]` the
+    index into it of every cell and `measures` the (cell, measure) sums.
+    """
+
+    def __init__(self, values, codes, measures):
+        self.values = values
+        self.codes = codes
+        self.measures = measures
+
+    @classmethod
+    def from_connection(cls, conn):
+        cells = _read_cells(conn)
+        values, codes = {}, {}
+        for dimension in DIMENSIONS:
+            index, uniques = pd.factorize(cells[dimension], sort=True,
+                                          use_na_sentinel=False)
+            codes[dimension] = index.astype(np.min_scalar_type(len(uniques)))
+            values[dimension] = np.asarray(uniques)
+        # the sums of a cell are whole minutes, miles and seats, which
+        # float32 holds exactly; roll-ups add up in float64
+        measures = cells[list(MEASURES)].to_numpy(np.float32)
+        return cls(values, codes, measures)
+
+    def __len__(self):
+        return len(self.measures)
+
+    def _wanted(self, dimension, selection):
+        """Boolean table over the values of `dimension` that are selected."""
+        if isinstance(selection, (str, int, np.integer)):
+            selection = [selection]
+        values = pd.Index(self.values[dimension])
+        wanted = np.zeros(len(values), dtype=bool)
+        positions = values.get_indexer(list(selection))
+        wanted[positions[positions >= 0]] = True
+        return wanted
+
+    def dice(self, **selections):
+        """
+        The cells whose dimensions take the given value or one of the given
+        values, e.g. `dice(origin=("JFK", "LGA"), month=1)`.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        for dimension, selection in selections.items():
+            keep &= self._wanted(dimension, selection)[self.codes[dimension]]
+        return FlightCube(self.values,
+                          {d: codes[keep] for d, codes in self.codes.items()},
+                          self.measures[keep])
+
+    def slice(self, dimension, value):
+        """The cells with a single value of `dimension`."""
+        return self.dice(**{dimension: [value]})
+
+    def rollup(self, *dimensions, measures=MEASURES):
+        """
+        MEASURES summed per combination of `dimensions` that occurs (over
+        all cells without dimensions), as a DataFrame.
+        """
+        columns = [MEASURES.index(measure) for measure in measures]
+        if not dimensions:
+            totals = self.measures[:, columns].sum(axis=0, dtype=np.float64)
+            result = pd.DataFrame([totals], columns=list(measures))
+        else:
+            sizes = [len(self.values[d]) for d in dimensions]
+            keys = np.ravel_multi_index(
+                [self.codes[d].astype(np.int64) for d in dimensions], sizes)
+            groups, inverse = np.unique(keys, return_inverse=True)
+            result = pd.DataFrame({
+                d: self.values[d][codes] for d, codes in
+                zip(dimensions, np.unravel_index(groups, sizes))})
+            for measure, column in zip(measures, columns):
+                result[measure] = np.bincount(
+                    inverse, weights=self.measures[:, column],
+                    minlength=len(groups))
+        for measure in measures:
+            if not measure.endswith("_sum"):
+                result[measure] = result[measure].astype(np.int64)
+        return result
+
+
+def average(df, measure):
+    """Mean of `measure` ('dep_delay', ...) per row of a roll-up; NaN if none."""
+    n = df[f"{measure}_n"]
+    return (df[f"{measure}_sum"] / n).where(n > 0)
+
+
+def _current(path):
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == table_versions.versions(path,
+                                                                   TABLES):
+        return cached[1]
+    return None
+
+
+def get_flight_cube(path=db.DB_PATH):
+    """
+    Process-wide `FlightCube` of the database at `path`, rebuilt when
+    `flights` or `planes` changes.
+    """
+    path = os.path.abspath(path)
+    cube = _current(path)
+    if cube is not None:
+        return cube
+    with _build_lock:
+        # built by another thread while this one waited
+        cube = _current(path)
+        if cube is None:
+            version = table_versions.versions(path, TABLES)
+            conn = db.connect(path)
+            try:
+                cube = FlightCube.from_connection(conn)
+            finally:
+                conn.close()
+            _cache[path] = (version, cube)
+    return cube
+
+
+def is_ready(path=db.DB_PATH):
+    """Whether the cube of the current data is built; never waits."""
+    return _current(os.path.abspath(path)) is not None
+
+
+def prefetch(path=db.DB_PATH):
+    """Build the cube in a background thread unless it is ready or queued."""
+    path = os.path.abspath(path)
+    with _pending_lock:
+        future = _pending.get(path)
+        if is_ready(path) or (future is not None and not future.done()):
+            return
+        _pending[path] = _executor.submit(get_flight_cube, path)
+
+
+def _top(df, column, n, ascending=False):
+    return (df.sort_values(column, ascending=ascending, na_position="last",
+                           kind="stable")
+              .head(n).reset_index(drop=True))
+
+
+#######################################################
+# MAIN DASHBOARD
+#######################################################
+
+AIRPORT_NAMES = {"JFK": "John F. Kennedy (JFK)", "LGA": "LaGuardia (LGA)",
+                 "EWR": "Newark Liberty (EWR)"}
+
+TIMES_OF_DAY = [("Early Morning (5-8)", 5, 8), ("Morning (9-12)", 9, 12),
+                ("Afternoon (13-16)", 13, 16), ("Evening (17-20)", 17, 20)]
+NIGHT = "Night (21-4)"
+
+
+def summary(path=db.DB_PATH):
+    """Flights from NYC and the % of delayed and of missing arrivals."""
+    t = get_flight_cube(path).dice(origin=NYC_ORIGINS).rollup().iloc[0]
+    return pd.DataFrame([{
+        "total_flights": t["flights"],
+        "delay_arrival_percentage":
+            round(100 * t["arr_delayed"] / t["arr_delay_n"], 2)
+            if t["arr_delay_n"] else np.nan,
+        "missing_arrival_percentage":
+            round(100 * (t["flights"] - t["arr_delay_n"]) / t["flights"], 2)
+            if t["flights"] else np.nan,
+    }])
+
+
+def top_destinations(n=10, path=db.DB_PATH):
+    """The `n` destinations with the most flights from NYC, with names."""
+    per_dest = get_flight_cube(path).dice(origin=NYC_ORIGINS).rollup(
+        "dest", measures=["flights"])
+    top = _top(per_dest.rename(columns={"flights": "flight_count"}),
+               "flight_count", n)
+    top["dest_name"] = dimensions.get_dimensions(path).airport_names(
+        top["dest"]).values
+    return top
+
+
+def airport_volume(path=db.DB_PATH):
+    """Flights with a known plane, their seats and destinations per NYC airport."""
+    cube = get_flight_cube(path).dice(origin=NYC_ORIGINS)
+    per_route = cube.rollup("origin", "dest",
+                            measures=["seated_flights", "seats"])
+    per_route = per_route[per_route["seated_flights"] > 0]
+    volume = per_route.groupby("origin", as_index=False).agg(
+        flights_count=("seated_flights", "sum"), seats_sum=("seats", "sum"),
+        destinations_count=("dest", "nunique"))
+    volume.insert(1, "airport_name", volume["origin"].map(AIRPORT_NAMES))
+    volume = volume.rename(columns={"origin": "airport"})
+    return _top(volume, "flights_count", len(volume))
+
+
+def time_of_day_label(hour):
+    """The TIMES_OF_DAY label of a departure hour (NIGHT outside them)."""
+    for label, first, last in TIMES_OF_DAY:
+        if first <= hour <= last:
+            return label
+    return NIGHT
+
+
+def time_of_day(path=db.DB_PATH):
+    """Flights and % delayed arrivals per time of day of the departure."""
+    per_hour = get_flight_cube(path).dice(origin=NYC_ORIGINS).rollup(
+        "hour", measures=["flights", "arr_delayed", "arr_delay_n"])
+    per_hour = per_hour.dropna(subset=["hour"])
+    labels = [label for label, _, _ in TIMES_OF_DAY] + [NIGHT]
+    per_hour["time_of_day"] = pd.Categorical(
+        per_hour["hour"].map(time_of_day_label), categories=labels, ordered=True)
+    per_time = per_hour.groupby("time_of_day", observed=True).sum(
+        numeric_only=True)
+    return pd.DataFrame({
+        "time_of_day": per_time.index.astype(str),
+        "flight_count": per_time["flights"].values,
+        "delay_percentage": (100 * per_time["arr_delayed"]
+                             / per_time["arr_delay_n"]).round(2).values,
+    })
+
+
+def average_distances(airports, path=db.DB_PATH):
+    """Mean distance per (origin, dest) from one or several NYC airports."""
+    per_route = get_flight_cube(path).dice(origin=airports).rollup(
+        "origin", "dest", measures=["distance_sum", "distance_n"])
+    per_route["Distance"] = average(per_route, "distance")
+    return per_route[["origin", "dest", "Distance"]]
+
+
+def delay_distribution(airports, path=db.DB_PATH):
+    """
+    Flights per arrival delay category from `airports`, in percent of all
+    known arrivals from NYC.
+    """
+    cube = get_flight_cube(path).dice(origin=NYC_ORIGINS)
+    known = cube.rollup(measures=["arr_delay_n"])["arr_delay_n"][0]
+    counts = cube.dice(origin=airports).rollup(
+        "delay_bucket", measures=["flights"])
+    counts = dict(zip(counts["delay_bucket"], counts["flights"]))
+    rows = [{"delay_category": category,
+             "flight_count": counts.get(category, 0),
+             "percentage": round(100 * counts.get(category, 0) / known, 2)
+             if known else np.nan}
+            for category, _ in DELAY_CATEGORIES]
+    return pd.DataFrame(rows)
+
+
+#######################################################
+# FLIGHT ROUTES
+#######################################################
+
+def route_stats(origin, dest, path=db.DB_PATH):
+    t = get_flight_cube(path).dice(origin=origin, dest=dest).rollup()
+    return pd.DataFrame({
+        "flight_count": t["flights"],
+        "avg_dep_delay": average(t, "dep_delay"),
+        "avg_arr_delay": average(t, "arr_delay"),
+        "avg_distance": average(t, "distance"),
+    })
+
+
+def weekly_trend(origin, dest, path=db.DB_PATH):
+    """Flights per day of the week (`week_number`, Monday is 0)."""
+    per_day = get_flight_cube(path).dice(origin=origin, dest=dest).rollup(
+        "weekday", measures=["flights"])
+    per_day = per_day.dropna(subset=["weekday"])
+    return pd.DataFrame({"week_number": per_day["weekday"].astype(int),
+                         "flight_count": per_day["flights"]})
+
+
+def monthly_trend(origin, dest, path=db.DB_PATH):
+    per_month = get_flight_cube(path).dice(origin=origin, dest=dest).rollup(
+        "month", measures=["flights"])
+    return per_month.rename(columns={"flights": "flight_count"})
+
+
+def flight_capacity(origin, dest, path=db.DB_PATH):
+    """Seats per month, over the flights with a known plane."""
+    per_month = get_flight_cube(path).dice(origin=origin, dest=dest).rollup(
+        "month", measures=["seats", "seated_flights"])
+    per_month = per_month[per_month["seated_flights"] > 0]
+    return pd.DataFrame({"month": per_month["month"],
+                         "total_capacity": per_month["seats"]})
+
+
+def delayed_flights(origin, dest, path=db.DB_PATH):
+    """% of departures delayed per month."""
+    per_month = get_flight_cube(path).dice(origin=origin, dest=dest).rollup(
+        "month", measures=["flights", "dep_delayed"])
+    return pd.DataFrame({
+        "month": per_month["month"],
+        "delay_percentage": (100 * per_month["dep_delayed"]
+                             / per_month["flights"]).round(2),
+    })
+
+
+def top_airlines(origin, dest, n=5, path=db.DB_PATH):
+    per_carrier = get_flight_cube(path).dice(origin=origin, dest=dest).rollup(
+        "carrier", measures=["flights"])
+    return _top(per_carrier.rename(columns={"flights": "flight_count"}),
+                "flight_count", n)
+
+
+def top_delayed_airlines(origin, dest, n=5, path=db.DB_PATH):
+    """Carriers with the most delayed departures, in % of the route's flights."""
+    per_carrier = get_flight_cube(path).dice(origin=origin, dest=dest).rollup(
+        "carrier", measures=["flights", "dep_delayed"])
+    total = per_carrier["flights"].sum()
+    per_carrier = per_carrier[per_carrier["dep_delayed"] > 0]
+    delayed = pd.DataFrame({
+        "carrier": per_carrier["carrier"],
+        "delayed_flights": per_carrier["dep_delayed"],
+        "delay_percentage": (100 * per_carrier["dep_delayed"]
+                             / total).round(2),
+    })
+    return _top(delayed, "delayed_flights", n)
+
+
+#######################################################
+# DATE ANALYSIS
+#######################################################
+
+def _day(year, month, day, path):
+    return get_flight_cube(path).dice(year=year, month=month, day=day,
+                                      origin=NYC_ORIGINS)
+
+
+def day_stats(year, month, day, path=db.DB_PATH):
+    t = _day(year, month, day, path).rollup()
+    return pd.DataFrame({
+        "flight_count": t["flights"],
+        "avg_dep_delay": average(t, "dep_delay"),
+        "avg_arr_delay": average(t, "arr_delay"),
+    })
+
+
+def day_airlines(year, month, day, path=db.DB_PATH):
+    per_carrier = _day(year, month, day, path).rollup(
+        "carrier", measures=["flights"])
+    per_carrier.insert(1, "airline_name", dimensions.get_dimensions(
+        path).airline_names(per_carrier["carrier"]).values)
+    return _top(per_carrier.rename(columns={"flights": "flight_count"}),
+                "flight_count", len(per_carrier))
+
+
+def day_delayed_airlines(year, month, day, n=10, path=db.DB_PATH):
+    per_carrier = _day(year, month, day, path).rollup(
+        "carrier", measures=["arr_delay_sum", "arr_delay_n"])
+    delayed = pd.DataFrame({
+        "carrier": per_carrier["carrier"],
+        "airline_name": dimensions.get_dimensions(path).airline_names(
+            per_carrier["carrier"]).values,
+        "avg_arr_delay": average(per_carrier, "arr_delay"),
+    })
+    return _top(delayed, "avg_arr_delay", n)
+
+
+def day_top_destinations(year, month, day, n=10, path=db.DB_PATH):
+    per_dest = _day(year, month, day, path).rollup(
+        "dest", measures=["flights"])
+    per_dest.insert(1, "airport_name", dimensions.get_dimensions(
+        path).airport_names(per_dest["dest"]).values)
+    # destinations missing from `airports` are left out, as before
+    per_dest = per_dest.dropna(subset=["airport_name"])
+    return _top(per_dest.rename(columns={"flights": "flight_count"}),
+                "flight_count", n)
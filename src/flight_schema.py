@@ -0,0 +1,93 @@
+import warnings
+
+import pandas as pd
+
+# Compact dtypes for the columns of the flights and weather tables. Columns
+# not listed here (aggregates, names, coordinates) are left as loaded.
+# HHMM times, delays and air time are nullable because of missing values.
+COLUMN_DTYPES = {
+    "year": "Int16",
+    "month": "Int8",
+    "day": "Int8",
+    "hour": "Int8",
+    "minute": "Int8",
+    "dep_time": "Int16",
+    "sched_dep_time": "Int16",
+    "dep_delay": "Int16",
+    "arr_time": "Int16",
+    "sched_arr_time": "Int16",
+    "arr_delay": "Int16",
+    "air_time": "Int16",
+    "flight": "Int16",
+    "distance": "Int16",
+    "carrier": "category",
+    "origin": "category",
+    "dest": "category",
+    "tailnum": "category",
+    "airline_name": "category",
+    "time_hour": "datetime64[ns]",
+    "temp": "float32",
+    "dewp": "float32",
+    "humid": "float32",
+    "wind_dir": "float32",
+    "wind_speed": "float32",
+    "wind_gust": "float32",
+    "precip": "float32",
+    "pressure": "float32",
+    "visib": "float32",
+}
+
+# Equivalent dtypes when loading with the pyarrow backend
+ARROW_DTYPES = {
+    "Int8": "int8[pyarrow]",
+    "Int16": "int16[pyarrow]",
+    "float32": "float[pyarrow]",
+    "datetime64[ns]": "timestamp[ns][pyarrow]",
+    "category": "category",
+}
+
+
+def to_datetime(series):
+    """Convert `time_hour` (epoch seconds stored as REAL, or text) to datetimes."""
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_datetime(series, unit="s")
+    return pd.to_datetime(series)
+
+
+def apply_schema(df, dtype_backend=None):
+    """
+    Cast the known columns of `df` to their compact dtypes in place.
+
+    A column whose values do not fit the target dtype (e.g. fractional
+    delays after an update) is left unchanged rather than rounded, with a
+    warning naming the column.
+    """
+    for column, dtype in COLUMN_DTYPES.items():
+        if column not in df.columns:
+            continue
+        if dtype_backend == "pyarrow":
+            dtype = ARROW_DTYPES[dtype]
+        try:
+            if column == "time_hour":
+                df[column] = to_datetime(df[column]).astype(dtype)
+            else:
+                df[column] = df[column].astype(dtype)
+        except (TypeError, ValueError, OverflowError) as error:
+            warnings.warn(f"Column {column!r} kept as {df[column].dtype}, "
+                          f"its values do not fit {dtype}: {error}",
+                          stacklevel=2)
+    return df
+
+
+def read_typed(query, conn, params=None, dtype_backend=None):
+    """
+    Run `query` and return the result with compact dtypes applied.
+
+    `dtype_backend="pyarrow"` loads through Arrow-backed columns instead of
+    NumPy nullable ones.
+    """
+    kwargs = {"params": params}
+    if dtype_backend is not None:
+        kwargs["dtype_backend"] = dtype_backend
+    df = pd.read_sql_query(query, conn, **kwargs)
+    return apply_schema(df, dtype_backend)
@@ -1,56 +1,32 @@
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from geopy.distance import geodesic
-import matplotlib.pyplot as plt
-from timezonefinder import TimezoneFinder
-import seaborn as sns
+import functools
 import math
-import sqlite3
+import db
 import numpy as np
-from plotly.subplots import make_subplots
 import datetime
-from timezonefinder import TimezoneFinder
-import pytz
+import pandas as pd
+import streaming
+import ingest
+from flight_schema import read_typed
+import weather_join
+import weather_cube
+import wind
+import plane_speed
+import delay_bins
+import dimensions
+import flight_cube
+import table_versions
+
+# The plotting and geo libraries (matplotlib, seaborn, plotly, geopy,
+# timezonefinder, pytz) are imported where they are used, and the analysis
+# below only runs as a script, so importing this module stays cheap.
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    import plotly.express as px
+    import plotly.graph_objects as go
+    import seaborn as sns
+    from plotly.subplots import make_subplots
 
 # =============== Data processing for airports.csv ===============
-# read airports.csv
-df = pd.read_csv("../data/airports.csv")
-
-# # descriptive statistics and data preprocessing
-# print("first 5 rows of the dataset:\n", df.head())  # display first few rows
-# print("dataset information:")
-# df.info()  # display dataset information
-
-# print("descriptive statistics:\n", df.describe())  # display descriptive statistics
-# print("missing values in each column:\n", df.isnull().sum())  # check for missing values
-
-# # display unique time zones and their corresponding tz values
-# unique_tz_mapping = df[["tzone", "tz"]].dropna().drop_duplicates()
-# print(unique_tz_mapping)
-
-# inferring missing values instead of deleting them
-tf = TimezoneFinder()
-df["tzone"] = df.apply(
-    lambda row: (
-        tf.timezone_at(lng=row["lon"], lat=row["lat"])
-        if pd.isnull(row["tzone"])
-        else row["tzone"]
-    ),
-    axis=1,
-)
-# update tz values based on the inferred tzone
-tz_mapping_dynamic = dict(
-    df[["tzone", "tz"]].dropna().drop_duplicates().values)
-df["tz"] = df.apply(
-    lambda row: (
-        tz_mapping_dynamic.get(row["tzone"], row["tz"])
-        if pd.isnull(row["tz"])
-        else row["tz"]
-    ),
-    axis=1,
-)
-
 # infer dst based on the most common dst setting per tzone
 
 
@@ -65,149 +41,200 @@ def infer_dst_from_tzone(tzone):
         return 'N'
 
 
-df["dst"] = df.apply(
-    lambda row: row["dst"] if pd.notnull(
-        row["dst"]) else infer_dst_from_tzone(row["tzone"]),
-    axis=1
-)
-
-# # check for missing values after inference
-# print("missing values after inference:\n", df.isnull().sum())
-# print(df[df["tz"].isnull()])
-# print(df[df["tzone"] == "America/Boise"][["tzone", "tz"]].dropna().drop_duplicates()) # check for missing values in America/Boise
-df.loc[df["tzone"] == "America/Boise", "tz"] = - \
-    7  # fix missing values in America/Boise
-# print("missing values after final fix:\n", df.isnull().sum())
-
-df.loc[df['tz'] == 8, 'tz'] = -8  # fix incorrect tz value
-
-# convert altitude to meters
-df["alt_meters"] = df["alt"] * 0.3048
-df["tz"] = df["tz"].astype("Int64")  # convert tz to integer
-# df.info()
-
-# explore relationships within the dataset
-# print(df.describe()) # display descriptive statistics
-# scatter plot: altitude vs latitude
-plt.figure(figsize=(10, 6))
-plt.scatter(df["lat"], df["alt_meters"], alpha=0.5, color="blue")
-
-plt.xlabel("Latitude")
-plt.ylabel("Altitude (meters)")
-plt.title("Scatter Plot: Airport Altitude vs Latitude")
-plt.grid(True)
-
-# plt.show()
-
-# print(df["dst"].unique()) # display unique values in 'dst' column
-# print(df["tzone"].unique()) # display unique values in 'tzone' column
-# print(df["tz"].unique()) # display unique values in 'tz' column
-
-# countplot: number of airports in each time zone
-plt.figure(figsize=(10, 6))
-sns.countplot(x=df["tzone"], hue=df["tzone"], palette="coolwarm", legend=False)
-# sns.countplot(x=df["tz"], hue=df["tz"], palette="coolwarm", legend=False)
-plt.xlabel("Time Zone")
-plt.xticks(rotation=25, ha='right', fontsize=6)
-plt.ylabel("Number of Airports")
-plt.title("Number of Airports in Each Time Zone")
-plt.grid(True)
-# plt.show()
-
-# find airports that do not observe daylight saving time, later visualizing these airports on a map
-df_no_dst = df[df["dst"] == "N"]
-
-plt.figure(figsize=(10, 6))
-sns.scatterplot(x=df_no_dst["lon"], y=df_no_dst["lat"], color="red")
-
-plt.xlabel("Longitude")
-plt.ylabel("Latitude")
-plt.title("Airports That Do NOT Observe DST")
-
-# plt.show()
-
-
-# =============== Part 1,2 ===============
-# visualizations
-# plot global airport distribution, with color coded by 'alt' (altitude)
-fig_global = px.scatter_geo(df,
+@functools.lru_cache(maxsize=1)
+def load_airports(path="../data/airports.csv"):
+    """Read airports.csv and infer its missing tzone, tz and dst values."""
+    from timezonefinder import TimezoneFinder
+
+    # read airports.csv
+    df = pd.read_csv(path)
+
+    # # descriptive statistics and data preprocessing
+    # print("first 5 rows of the dataset:\n", df.head())  # display first few rows
+    # print("dataset information:")
+    # df.info()  # display dataset information
+
+    # print("descriptive statistics:\n", df.describe())  # display descriptive statistics
+    # print("missing values in each column:\n", df.isnull().sum())  # check for missing values
+
+    # # display unique time zones and their corresponding tz values
+    # unique_tz_mapping = df[["tzone", "tz"]].dropna().drop_duplicates()
+    # print(unique_tz_mapping)
+
+    # inferring missing values instead of deleting them
+    tf = TimezoneFinder()
+    df["tzone"] = df.apply(
+        lambda row: (
+            tf.timezone_at(lng=row["lon"], lat=row["lat"])
+            if pd.isnull(row["tzone"])
+            else row["tzone"]
+        ),
+        axis=1,
+    )
+    # update tz values based on the inferred tzone
+    tz_mapping_dynamic = dict(
+        df[["tzone", "tz"]].dropna().drop_duplicates().values)
+    df["tz"] = df.apply(
+        lambda row: (
+            tz_mapping_dynamic.get(row["tzone"], row["tz"])
+            if pd.isnull(row["tz"])
+            else row["tz"]
+        ),
+        axis=1,
+    )
+
+    df["dst"] = df.apply(
+        lambda row: row["dst"] if pd.notnull(
+            row["dst"]) else infer_dst_from_tzone(row["tzone"]),
+        axis=1
+    )
+
+    # # check for missing values after inference
+    # print("missing values after inference:\n", df.isnull().sum())
+    # print(df[df["tz"].isnull()])
+    # print(df[df["tzone"] == "America/Boise"][["tzone", "tz"]].dropna().drop_duplicates()) # check for missing values in America/Boise
+    df.loc[df["tzone"] == "America/Boise", "tz"] = - \
+        7  # fix missing values in America/Boise
+    # print("missing values after final fix:\n", df.isnull().sum())
+
+    df.loc[df['tz'] == 8, 'tz'] = -8  # fix incorrect tz value
+
+    # convert altitude to meters
+    df["alt_meters"] = df["alt"] * 0.3048
+    df["tz"] = df["tz"].astype("Int64")  # convert tz to integer
+    # df.info()
+    return df
+
+
+if __name__ == "__main__":
+    df = load_airports().copy()
+
+    # explore relationships within the dataset
+    # print(df.describe()) # display descriptive statistics
+    # scatter plot: altitude vs latitude
+    plt.figure(figsize=(10, 6))
+    plt.scatter(df["lat"], df["alt_meters"], alpha=0.5, color="blue")
+
+    plt.xlabel("Latitude")
+    plt.ylabel("Altitude (meters)")
+    plt.title("Scatter Plot: Airport Altitude vs Latitude")
+    plt.grid(True)
+
+    # plt.show()
+
+    # print(df["dst"].unique()) # display unique values in 'dst' column
+    # print(df["tzone"].unique()) # display unique values in 'tzone' column
+    # print(df["tz"].unique()) # display unique values in 'tz' column
+
+    # countplot: number of airports in each time zone
+    plt.figure(figsize=(10, 6))
+    sns.countplot(x=df["tzone"], hue=df["tzone"], palette="coolwarm", legend=False)
+    # sns.countplot(x=df["tz"], hue=df["tz"], palette="coolwarm", legend=False)
+    plt.xlabel("Time Zone")
+    plt.xticks(rotation=25, ha='right', fontsize=6)
+    plt.ylabel("Number of Airports")
+    plt.title("Number of Airports in Each Time Zone")
+    plt.grid(True)
+    # plt.show()
+
+    # find airports that do not observe daylight saving time, later visualizing these airports on a map
+    df_no_dst = df[df["dst"] == "N"]
+
+    plt.figure(figsize=(10, 6))
+    sns.scatterplot(x=df_no_dst["lon"], y=df_no_dst["lat"], color="red")
+
+    plt.xlabel("Longitude")
+    plt.ylabel("Latitude")
+    plt.title("Airports That Do NOT Observe DST")
+
+    # plt.show()
+
+
+    # =============== Part 1,2 ===============
+    # visualizations
+    # plot global airport distribution, with color coded by 'alt' (altitude)
+    fig_global = px.scatter_geo(df,
+                                lat="lat", lon="lon",
+                                hover_name="name",
+                                color="alt_meters",  # color by altitude
+                                title="Global Airport Distribution (Colored by Altitude)",
+                                projection="natural earth",
+                                color_continuous_scale="Viridis",  # Choose color scale
+                                # Set color legend title
+                                labels={"alt_meters": "Altitude (m)"}
+                                )
+
+    # fig_global.show()
+
+
+    # plot US airport distribution, with color coded by 'alt' (altitude)
+    # use scatter_geo funcion, scope="usa"
+    fig_us = px.scatter_geo(df,
                             lat="lat", lon="lon",
                             hover_name="name",
                             color="alt_meters",  # color by altitude
-                            title="Global Airport Distribution (Colored by Altitude)",
-                            projection="natural earth",
-                            color_continuous_scale="Viridis",  # Choose color scale
-                            # Set color legend title
+                            title="us airport distribution (colored by altitude)",
+                            scope="usa",
+                            color_continuous_scale="Viridis",
                             labels={"alt_meters": "Altitude (m)"}
                             )
+    # fig_us.show()
+
+    # analyze the distances between JFK and airports in the file
+    R = 6378.1370  # in kilometeres
+    jfk_data = df[df["faa"] == "JFK"]
+    jfk_loc = [jfk_data["lat"].iloc[0], jfk_data["lon"].iloc[0]]
+    df["geo_dist"] = None
+    df["euc_dist"] = None
+    for index, airport in df.iterrows():
+        lat_scale = 111.32  # 1 degree of latitude ≈ 111.32 km
+        lon_scale = 111.32 * math.cos(
+            math.radians((airport["lat"] + jfk_loc[0]) / 2)
+        )  # Adjust for longitude
+        lat_diff_km = abs(airport["lat"] - jfk_loc[0]) * lat_scale
+        lon_diff_km = abs(airport["lon"] - jfk_loc[1]) * lon_scale
+        euc_distance = math.sqrt(lat_diff_km**2 + lon_diff_km**2)
+        lat1 = math.radians(jfk_loc[0])
+        lon1 = math.radians(jfk_loc[1])
+        lat2 = math.radians(airport["lat"])
+        lon2 = math.radians(airport["lon"])
+        dlat = lat2 - lat1
+        dlon = lon2 - lon1
+        exp_one = (2 * math.sin(dlat / 2) * math.cos(dlon / 2)) ** 2
+        exp_two = (2 * math.cos((lat1 + lat2) / 2) * math.sin(dlon / 2)) ** 2
+        geo_distance = R * math.sqrt(exp_one + exp_two)
+        # Store distances
+        df.at[index, "euc_dist"] = euc_distance
+        df.at[index, "geo_dist"] = geo_distance
+
+    # print(df.loc[df["euc_dist"].idxmax()])
+
+    plt.figure(figsize=(10, 6))
+    plt.hist(df["euc_dist"], bins=30, alpha=0.5, color="blue")
+
+    plt.xlabel("Euclidean distance")
+    plt.ylabel("Count")
+    plt.title("Distribution of the euclidean distances between the eirports and JFK")
+    plt.grid(True)
 
-# fig_global.show()
-
-
-# plot US airport distribution, with color coded by 'alt' (altitude)
-# use scatter_geo funcion, scope="usa"
-fig_us = px.scatter_geo(df,
-                        lat="lat", lon="lon",
-                        hover_name="name",
-                        color="alt_meters",  # color by altitude
-                        title="us airport distribution (colored by altitude)",
-                        scope="usa",
-                        color_continuous_scale="Viridis",
-                        labels={"alt_meters": "Altitude (m)"}
-                        )
-# fig_us.show()
-
-# analyze the distances between JFK and airports in the file
-R = 6378.1370  # in kilometeres
-jfk_data = df[df["faa"] == "JFK"]
-jfk_loc = [jfk_data["lat"].iloc[0], jfk_data["lon"].iloc[0]]
-df["geo_dist"] = None
-df["euc_dist"] = None
-for index, airport in df.iterrows():
-    lat_scale = 111.32  # 1 degree of latitude ≈ 111.32 km
-    lon_scale = 111.32 * math.cos(
-        math.radians((airport["lat"] + jfk_loc[0]) / 2)
-    )  # Adjust for longitude
-    lat_diff_km = abs(airport["lat"] - jfk_loc[0]) * lat_scale
-    lon_diff_km = abs(airport["lon"] - jfk_loc[1]) * lon_scale
-    euc_distance = math.sqrt(lat_diff_km**2 + lon_diff_km**2)
-    lat1 = math.radians(jfk_loc[0])
-    lon1 = math.radians(jfk_loc[1])
-    lat2 = math.radians(airport["lat"])
-    lon2 = math.radians(airport["lon"])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    exp_one = (2 * math.sin(dlat / 2) * math.cos(dlon / 2)) ** 2
-    exp_two = (2 * math.cos((lat1 + lat2) / 2) * math.sin(dlon / 2)) ** 2
-    geo_distance = R * math.sqrt(exp_one + exp_two)
-    # Store distances
-    df.at[index, "euc_dist"] = euc_distance
-    df.at[index, "geo_dist"] = geo_distance
-
-# print(df.loc[df["euc_dist"].idxmax()])
-
-plt.figure(figsize=(10, 6))
-plt.hist(df["euc_dist"], bins=30, alpha=0.5, color="blue")
-
-plt.xlabel("Euclidean distance")
-plt.ylabel("Count")
-plt.title("Distribution of the euclidean distances between the eirports and JFK")
-plt.grid(True)
-
-# plt.show()
+    # plt.show()
 
-plt.figure(figsize=(10, 6))
-plt.hist(df["geo_dist"], bins=30, alpha=0.5, color="blue")
+    plt.figure(figsize=(10, 6))
+    plt.hist(df["geo_dist"], bins=30, alpha=0.5, color="blue")
 
-plt.xlabel("Geodesic distance")
-plt.ylabel("Count")
-plt.title("Distribution of the geodesic distances between the eirports and JFK")
-plt.grid(True)
+    plt.xlabel("Geodesic distance")
+    plt.ylabel("Count")
+    plt.title("Distribution of the geodesic distances between the eirports and JFK")
+    plt.grid(True)
 
-# plt.show()
+    # plt.show()
 
 
 def plot_multiple_flight_routes(faa_codes):
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    df = load_airports()
     nyc_airport = df[df["faa"] == "EWR"]
     if nyc_airport.empty:
         print("Error: No airport found for EWR.")
@@ -276,8 +303,9 @@ def plot_multiple_flight_routes(faa_codes):
 # database_path
 db_path = "../flights_database.db"
 
-# transform calculate_geo_distance function to a function that can be used in SQL queries
-
+# set to a row count (e.g. streaming.DEFAULT_CHUNKSIZE) to run the full-table
+# analyses below in chunks, keeping peak memory bounded by the chunk size
+STREAM_CHUNKSIZE = None
 
 def compute_geo_distance(lat1, lon1, lat2, lon2):
     R = 6378.1370
@@ -291,199 +319,179 @@ def compute_geo_distance(lat1, lon1, lat2, lon2):
     return geo_distance
 
 
-# connect to the database
-with sqlite3.connect(db_path) as conn:
-    cursor = conn.cursor()
+# compute_geo_distance is also available in SQL as geo_distance (see db.py),
+# so the comparison per route runs entirely inside SQLite
+def compare_route_distances():
+    with db.connect(db_path) as conn:
+        return pd.read_sql_query("""
+            SELECT f.origin, f.dest, COUNT(*) AS num_flights,
+                   AVG(f.distance) * 1.60934 AS db_distance_km,
+                   AVG(geo_distance(a1.lat, a1.lon, a2.lat, a2.lon))
+                       AS geo_distance_km
+            FROM flights AS f
+            JOIN airports AS a1 ON f.origin = a1.faa
+            JOIN airports AS a2 ON f.dest = a2.faa
+            GROUP BY f.origin, f.dest
+        """, conn)
 
-    # query the first 200 flights with origin and destination airport coordinates
+
+# print(compare_route_distances())
+
+
+if __name__ == "__main__":
+    # connect to the database
+    with db.connect(db_path) as conn:
+        cursor = conn.cursor()
+
+        # query the first 200 flights with origin and destination airport coordinates
+        cursor.execute("""
+            SELECT f.origin, f.dest, f.distance, a1.lat, a1.lon, a2.lat, a2.lon
+            FROM flights AS f
+            JOIN airports AS a1 ON f.origin = a1.faa
+            JOIN airports AS a2 ON f.dest = a2.faa
+            LIMIT 200;
+        """)
+        flights_data = cursor.fetchall()
+
+    # calculate the geo and database distances for each flight
+    geo_distances = []
+    db_distances = []
+    indices = []
+
+    for i, (origin, dest, db_distance, lat1, lon1, lat2, lon2) in enumerate(flights_data):
+        geo_distance = compute_geo_distance(lat1, lon1, lat2, lon2)
+        geo_distances.append(geo_distance)
+        db_distances.append(db_distance * 1.60934)  # convert miles to kilometers
+        indices.append(i)
+
+    # plot the computed and database distances for the first 200 flights
+    plt.figure(figsize=(12, 6))
+    plt.plot(indices, geo_distances, label="Calculated Distance (km)", linestyle="-")
+    plt.plot(indices, db_distances, label="Database Distance (km)", linestyle="--")
+    plt.xlabel("Flight Index")
+    plt.ylabel("Distance (km)")
+    plt.title("Comparison of Computed vs. Database Flight Distances (First 200 Flights)")
+    plt.legend()
+    # plt.show()
+
+
+    # extract NYC airports
     cursor.execute("""
-        SELECT f.origin, f.dest, f.distance, a1.lat, a1.lon, a2.lat, a2.lon
-        FROM flights AS f
-        JOIN airports AS a1 ON f.origin = a1.faa
-        JOIN airports AS a2 ON f.dest = a2.faa
-        LIMIT 200;
+        SELECT DISTINCT origin FROM flights;
     """)
-    flights_data = cursor.fetchall()
-
-# calculate the geo and database distances for each flight
-geo_distances = []
-db_distances = []
-indices = []
-
-for i, (origin, dest, db_distance, lat1, lon1, lat2, lon2) in enumerate(flights_data):
-    geo_distance = compute_geo_distance(lat1, lon1, lat2, lon2)
-    geo_distances.append(geo_distance)
-    db_distances.append(db_distance * 1.60934)  # convert miles to kilometers
-    indices.append(i)
-
-# plot the computed and database distances for the first 200 flights
-plt.figure(figsize=(12, 6))
-plt.plot(indices, geo_distances, label="Calculated Distance (km)", linestyle="-")
-plt.plot(indices, db_distances, label="Database Distance (km)", linestyle="--")
-plt.xlabel("Flight Index")
-plt.ylabel("Distance (km)")
-plt.title("Comparison of Computed vs. Database Flight Distances (First 200 Flights)")
-plt.legend()
-# plt.show()
-
-
-# extract NYC airports
-cursor.execute("""
-    SELECT DISTINCT origin FROM flights;
-""")
-unique_origins = [row[0] for row in cursor.fetchall()]
-
-query = f"""
-    SELECT * FROM airports
-    WHERE faa IN ({', '.join(['?'] * len(unique_origins))});
-    """
-df_unique_origins = pd.read_sql_query(query, conn, params=unique_origins)
+    unique_origins = [row[0] for row in cursor.fetchall()]
 
-# print(df_unique_origins)
-conn.close()
+    query = f"""
+        SELECT * FROM airports
+        WHERE faa IN ({', '.join(['?'] * len(unique_origins))});
+        """
+    df_unique_origins = pd.read_sql_query(query, conn, params=unique_origins)
+
+    # print(df_unique_origins)
+    conn.close()
 
 # analyse flights per day
 # retrieve the number of flights per day for a specific NYC airport
 
 
-def plot_flight_destinations(month, day, airport):
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
+def flight_destinations(month, day, airport):
+    """The number of flights to each destination, from the flight cube."""
+    per_dest = flight_cube.get_flight_cube(db_path).dice(
+        month=month, day=day, origin=airport).rollup("dest", measures=["flights"])
+    return per_dest.sort_values("flights", ascending=False, kind="stable")
 
-        # query the number of flights to each destination from the specified airport
-        cursor.execute("""
-            SELECT dest, COUNT(*) AS flight_count
-            FROM flights
-            WHERE month = ? AND day = ? AND origin = ?
-            GROUP BY dest
-            ORDER BY flight_count DESC;
-        """, (month, day, airport))
 
-        results = cursor.fetchall()
+def plot_flight_destinations(month, day, airport, show=True):
+    import matplotlib.pyplot as plt
 
-    destinations = [row[0] for row in results]
-    flight_counts = [row[1] for row in results]
+    per_dest = flight_destinations(month, day, airport)
+    destinations = per_dest["dest"].tolist()
+    flight_counts = per_dest["flights"].tolist()
 
-    plt.figure(figsize=(12, 6))
+    fig = plt.figure(figsize=(12, 6))
     plt.bar(destinations, flight_counts, color="skyblue")
     plt.xlabel("Destination Airport")
     plt.ylabel("Number of Flights")
     plt.title(f"Flights from {airport} on {month}/{day}")
     plt.xticks(rotation=90)
-    plt.show()
+    if show:
+        plt.show()
+    return fig
 
 
 # plot_flight_destinations(1, 1, "JFK")  # plot the flight destinations for JFK on January 1st
-conn.close()
 
 # retrieve flight statistics
 
 
 def get_flight_statistics(month, day, airport):
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-
-        # statistics for total flights
-        cursor.execute("""
-            SELECT COUNT(*) FROM flights
-            WHERE month = ? AND day = ? AND origin = ?;
-        """, (month, day, airport))
-        total_flights = cursor.fetchone()[0]
-
-        # statistics for unique destinations
-        cursor.execute("""
-            SELECT COUNT(DISTINCT dest) FROM flights
-            WHERE month = ? AND day = ? AND origin = ?;
-        """, (month, day, airport))
-        unique_destinations = cursor.fetchone()[0]
-
-        # find the most visited destination
-        cursor.execute("""
-            SELECT dest, COUNT(*) AS flight_count
-            FROM flights
-            WHERE month = ? AND day = ? AND origin = ?
-            GROUP BY dest
-            ORDER BY flight_count DESC
-            LIMIT 1;
-        """, (month, day, airport))
-        most_visited = cursor.fetchone()
-
-        statistics = {
-            "total_flights": total_flights,
-            "unique_destinations": unique_destinations,
-            "most_visited": most_visited[0] if most_visited else None,
-            "most_visited_count": most_visited[1] if most_visited else 0
-        }
+    # one roll-up of the flight cube answers all three statistics
+    per_dest = flight_cube.get_flight_cube(db_path).dice(
+        month=month, day=day, origin=airport).rollup("dest", measures=["flights"])
+    most_visited = per_dest.nlargest(1, "flights")
+
+    statistics = {
+        "total_flights": int(per_dest["flights"].sum()),
+        "unique_destinations": len(per_dest),
+        "most_visited": most_visited["dest"].iloc[0] if len(most_visited) else None,
+        "most_visited_count": int(most_visited["flights"].iloc[0]) if len(most_visited) else 0
+    }
 
     return statistics
 
 
 # get flight statistics for JFK on January 1st
-stats = get_flight_statistics(1, 1, "JFK")
+if __name__ == "__main__":
+    stats = get_flight_statistics(1, 1, "JFK")
 # print(stats)
 # conn.close()
 
 
-def average_delay_per_carrier_plot():
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
+def average_delay_per_carrier():
+    """Average departure delay per carrier, from the flight cube."""
+    per_carrier = flight_cube.get_flight_cube(db_path).rollup(
+        "carrier", measures=["dep_delay_sum", "dep_delay_n"])
+    return pd.DataFrame({
+        "carrier": per_carrier["carrier"],
+        "name": dimensions.get_dimensions(db_path).airline_names(
+            per_carrier["carrier"]).values,
+        "dep_delay": flight_cube.average(per_carrier, "dep_delay"),
+    })
 
-        # query the number of flights to each destination from the specified airport
-        cursor.execute("""SELECT AVG(f.dep_delay), f.carrier, al.name 
-            FROM flights f 
-            JOIN airlines al ON f.carrier = al.carrier 
-            GROUP BY f.carrier""")
 
-        results = cursor.fetchall()
+def average_delay_per_carrier_plot(show=True):
+    import matplotlib.pyplot as plt
 
-    plt.figure(figsize=(12, 6))
-    plt.bar([x[2] for x in results], [x[0] for x in results], color="skyblue")
+    per_carrier = average_delay_per_carrier()
+
+    fig = plt.figure(figsize=(12, 6))
+    plt.bar(per_carrier["name"], per_carrier["dep_delay"], color="skyblue")
     plt.xlabel("Airlines")
     plt.ylabel("Average delay")
     plt.title("Average delay for each airline")
     plt.xticks(rotation=45)
     plt.grid(True)
-    plt.show()
-    conn.close()
+    if show:
+        plt.show()
+    return fig
 
 # average_delay_per_carrier_plot()
 
 
 def delays_month_destination(months, destination):
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        query = f"""
-        SELECT COUNT(*)
-        FROM flights
-        WHERE dest = '{destination}' AND month IN {months} AND arr_delay > 0
-        """
-        results = conn.execute(query).fetchone()[0]
-    conn.close()
-    return results
+    """Number of delayed arrivals at `destination` in the given months."""
+    delayed = flight_cube.get_flight_cube(db_path).dice(
+        dest=destination, month=months).rollup(measures=["arr_delayed"])
+    return int(delayed["arr_delayed"][0])
 
 # print(delays_month_destination((1,2,3), 'ORD'))
 
 
-def bins_distance_delay():
-    conn = sqlite3.connect(db_path)
-    # Define the bins
-    bins = range(0, 3001, 200)
+def bins_distance_delay(width=200):
+    import matplotlib.pyplot as plt
 
-    # Query the database
-    query = """
-    SELECT distance, arr_delay
-    FROM flights
-    """
-    df = pd.read_sql_query(query, conn)
-
-    # Bin the distances
-    df['distance_bins'] = pd.cut(df['distance'], bins)
-
-    # Group by the bins and calculate the mean arrival delay
-    grouped = df.groupby('distance_bins')['arr_delay'].mean().reset_index()
-
-    # Extract the midpoint of each bin for plotting
-    grouped['bin_midpoint'] = grouped['distance_bins'].apply(lambda x: x.mid)
+    # Mean arrival delay per distance bin, binned and aggregated in SQL
+    grouped = delay_bins.distance_delay_bins(width, path=db_path)
 
     # Plot the scatter plot
     plt.scatter(grouped['bin_midpoint'], grouped['arr_delay'])
@@ -492,37 +500,20 @@ def bins_distance_delay():
     plt.title('Average Arrival Delay by Distance Bin')
     plt.grid(True)
     plt.show()
-    conn.close()
 
 # bins_distance_delay()
 
 
-def bins_distance_delay_per_carrier():
-    conn = sqlite3.connect(db_path)
-    # Define the bins
-    bins = range(0, 3001, 200)
-
-    # Query the database
-    query = """
-    SELECT distance, arr_delay, carrier
-    FROM flights
-    """
-    df = pd.read_sql_query(query, conn)
-
-    # Bin the distances
-    df['distance_bins'] = pd.cut(df['distance'], bins)
-
-    # Group by both distance_bins and carrier, and calculate the mean arrival delay
-    grouped = df.groupby(['distance_bins', 'carrier'])[
-        'arr_delay'].mean().reset_index()
+def bins_distance_delay_per_carrier(width=200, carriers=None, show=True):
+    import matplotlib.pyplot as plt
 
-    # Extract the midpoint of each bin for plotting
-    grouped['bin_midpoint'] = grouped['distance_bins'].apply(lambda x: x.mid)
+    # Mean arrival delay per distance bin and carrier, binned in SQL
+    grouped = delay_bins.distance_delay_bins(
+        width, carriers, by_carrier=True, path=db_path)
 
     # Filter carriers with at least 10 bins with data
-    non_missing_counts = grouped.groupby('carrier')['arr_delay'].apply(
-        lambda x: x.notna().sum()).reset_index(name='n_non_missing')
-    filtered_carriers = non_missing_counts[non_missing_counts['n_non_missing'] >= 10]['carrier']
+    bins_per_carrier = grouped['carrier'].value_counts()
+    filtered_carriers = bins_per_carrier[bins_per_carrier >= 10].index
 
     # Filter the original DataFrame to include only the selected carriers
     grouped_filtered = grouped[grouped['carrier'].isin(filtered_carriers)]
@@ -556,39 +547,49 @@ def bins_distance_delay_per_carrier():
         axes[j].axis('off')
 
     plt.tight_layout()  # Adjust layout to prevent overlap
-    plt.show()
-    conn.close()
+    if show:
+        plt.show()
+    return fig
 
 # bins_distance_delay_per_carrier()
 
 
-def top_manufacturers_to_destiantion(destination):
-    with sqlite3.connect(db_path) as conn:
-        query = f"""
-            SELECT manufacturer, COUNT(*) AS num_flights
-            FROM (
-                SELECT tailnum
-                FROM flights
-                WHERE dest = '{destination}'
-            ) f
-            JOIN (
-                SELECT manufacturer, tailnum
-                FROM planes
-            ) p
-            ON f.tailnum = p.tailnum
-            GROUP BY manufacturer
-            ORDER BY COUNT(*) DESC
-            LIMIT 5
+def top_manufacturers(destination, n=5):
+    """Flights to `destination` per plane manufacturer, the `n` largest."""
+    conn = db.connect(db_path)
+    try:
+        query = """
+            SELECT tailnum, COUNT(*) AS num_flights
+            FROM flights
+            WHERE dest = ? AND tailnum IS NOT NULL
+            GROUP BY tailnum
         """
-        df = pd.read_sql(query, conn).set_index("manufacturer")
+        df = pd.read_sql(query, conn, params=(destination,))
+    finally:
+        conn.close()
 
-    plt.figure(figsize=(12, 6))
+    # planes are joined through the shared dimension cache
+    planes = dimensions.get_dimensions(db_path)
+    df["manufacturer"] = planes.plane_attribute(df["tailnum"], "manufacturer")
+    return (df.groupby("manufacturer", observed=True)["num_flights"].sum()
+              .sort_values(ascending=False)
+              .head(n)
+              .to_frame())
+
+
+def top_manufacturers_to_destiantion(destination, show=True):
+    import matplotlib.pyplot as plt
+
+    df = top_manufacturers(destination)
+
+    fig = plt.figure(figsize=(12, 6))
     plt.bar(df.index, df["num_flights"], color="skyblue")
     plt.xlabel("Manufacturer")
     plt.ylabel("Number of Flights")
     plt.title(f"Top 5 Manufacturers for Destination {destination}")
-    plt.show()
-    conn.close()
+    if show:
+        plt.show()
+    return fig
 
 # top_manufacturers_to_destiantion("ATL")
 
@@ -596,63 +597,38 @@ def top_manufacturers_to_destiantion(destination):
 
 
 def flights_between_cities(origin, destination):
-    ny_airports = {"JFK", "LGA", "EWR"}
-    with sqlite3.connect(db_path) as conn:
-        if origin not in ny_airports:
-            raise ValueError("Origin airport must be from a New York.")
-
-        query = f"""
-            SELECT COUNT(*) AS count
-            FROM airports
-            WHERE faa = '{destination}'
-        """
-        if pd.read_sql(query, conn).iloc[0, 0] == 0:
-            raise ValueError("Destination airport is not the database.")
-
-        query = f"""
-            SELECT type, COUNT(*) AS num_flights
-            FROM (
-                SELECT tailnum
-                FROM flights
-                WHERE dest = '{destination}'
-                AND origin = '{origin}'
-            ) f
-            JOIN (
-                SELECT type, tailnum
-                FROM planes
-            ) p
-            ON f.tailnum = p.tailnum
-            GROUP BY type
-        """
-
-        return pd.read_sql(query, conn).set_index("type")
-    conn.close()
+    ny_airports = set(dimensions.NYC_AIRPORTS)
+    dims = dimensions.get_dimensions(db_path)
+    if origin not in ny_airports:
+        raise ValueError("Origin airport must be from a New York.")
 
-# print(flights_between_cities("JFK", "ATL").to_dict()["num_flights"])
+    if destination not in dims.airports.index:
+        raise ValueError("Destination airport is not the database.")
 
-
-# GROUP BY `tailnum` the flights and compute for each of them the average speed.
-# Add the avg. speed to the `planes`
-def compute_avg_speed_and_update_db():
-    with sqlite3.connect(db_path) as conn:
-        query_tailnum = """
-            SELECT tailnum, AVG(distance*1.0/air_time) AS avg_speed
+    with db.connect(db_path) as conn:
+        query = """
+            SELECT tailnum, COUNT(*) AS num_flights
             FROM flights
-            WHERE air_time > 0
+            WHERE dest = ? AND origin = ? AND tailnum IS NOT NULL
             GROUP BY tailnum
         """
+        df = pd.read_sql(query, conn, params=(destination, origin))
+    conn.close()
 
-        tailnum_speed_df = pd.read_sql_query(query_tailnum, conn)
-        tailnum_speed_df['avg_speed'] = tailnum_speed_df['avg_speed'].round(2)
+    df["type"] = dims.plane_attribute(df["tailnum"], "type")
+    return df.groupby("type", observed=True)["num_flights"].sum().to_frame()
 
-        print(tailnum_speed_df)
+# print(flights_between_cities("JFK", "ATL").to_dict()["num_flights"])
 
-        cur = conn.cursor()
-        for _, row in tailnum_speed_df.iterrows():
-            # cur.execute("UPDATE planes SET speed = ? WHERE tailnum = ?",
-            #             (row['avg_speed'], row['tailnum']))
-            print(
-                f"UPDATE planes SET speed = {row['avg_speed']} WHERE tailnum = {row['tailnum']}")
+
+# GROUP BY `tailnum` the flights and compute for each of them the average speed.
+# Add the avg. speed to the `planes` (only planes with new flights unless full)
+def compute_avg_speed_and_update_db(full=False):
+    with db.connect(db_path) as conn:
+        refreshed = plane_speed.update_plane_speeds(conn, full=full)
+        print(f"Updated the average speed of {refreshed} planes")
+        print(plane_speed.speed_by(conn, by=["type", "model"]))
+    return refreshed
 
 
 # compute_avg_speed_and_update_db()
@@ -716,10 +692,85 @@ def calculate_compass_bearing(pointA, pointB):
 # print(
 #     f"The initial bearing from Schiphol Airport to Berlin Brandenburg Airport is {bearing:.1f}°")
 
+def add_bearing_columns(df_flights, df_weather, df_airports):
+    """
+    Attach origin wind direction, route bearing and inner product label.
+
+    `df_flights` needs `flight_rowid`; `df_weather` is the weather of those
+    flights from the flight-weather mapping (`weather_join.weather_for_flights`).
+    """
+    # 1) The observation nearest to the departure, from the mapping; flights
+    #    without one within the tolerance keep a NaN wind direction
+    df_flights = pd.merge(
+        df_flights,
+        df_weather[["flight_rowid", "wind_dir"]],
+        on="flight_rowid",
+        how="left"
+    )
+
+    # 2) Merge with df_airports to get lat/lon for the origin airport
+    df_flights = pd.merge(
+        df_flights,
+        df_airports[["faa", "lat", "lon"]],
+        left_on="origin",
+        right_on="faa",
+        how="left"
+    )
+    df_flights.rename(
+        columns={"lat": "lat_origin", "lon": "lon_origin"}, inplace=True)
+    df_flights.drop("faa", axis=1, inplace=True)
+
+    # 3) Merge with df_airports to get lat/lon for the destination airport
+    df_flights = pd.merge(
+        df_flights,
+        df_airports[["faa", "lat", "lon"]],
+        left_on="dest",
+        right_on="faa",
+        how="left"
+    )
+    df_flights.rename(
+        columns={"lat": "lat_dest", "lon": "lon_dest"}, inplace=True)
+    df_flights.drop("faa", axis=1, inplace=True)
+
+    df_flights['bearing'] = wind.route_bearings(
+        df_flights['lat_origin'], df_flights['lon_origin'],
+        df_flights['lat_dest'], df_flights['lon_dest'])
+
+    # cos of the angle between the two directions (see inner_product_angle)
+    ip = np.cos(np.radians(df_flights['wind_dir'] - df_flights['bearing']))
+    # flights without an observation within the tolerance get no label
+    inner_products = np.select([ip >= 0, ip < 0], ['positive', 'negative'],
+                               default=None)
+
+    df_flights['innerProd'] = inner_products
+
+    return df_flights
+
+
+def iter_bearing_chunks(chunksize):
+    """Yield `generate_bearing_df` row blocks, reading flights in chunks."""
+    weather_join.ensure_flight_weather(db_path)
+    with db.connect(db_path) as conn:
+        query_flights = ("SELECT rowid AS flight_rowid, flight, origin, dest, "
+                         "time_hour FROM flights")
+        df_airports = pd.read_sql_query(
+            "SELECT faa, lat, lon FROM airports", conn)
+
+        for chunk in streaming.iter_chunks(conn, query_flights, chunksize):
+            df_weather = weather_join.weather_for_flights(
+                conn, chunk["flight_rowid"], columns=["wind_dir"])
+            yield add_bearing_columns(chunk, df_weather, df_airports)
+
+
 def generate_bearing_df():
-    with sqlite3.connect(db_path) as conn:
-        query_flights = "SELECT flight, origin, dest, time_hour FROM flights"
-        query_weather = "SELECT origin, wind_dir, time_hour FROM weather"
+    """
+    Bearings of all flights in one frame; use `iter_bearing_chunks` to hold
+    only one chunk in memory.
+    """
+    weather_join.ensure_flight_weather(db_path)
+    with db.connect(db_path) as conn:
+        query_flights = ("SELECT rowid AS flight_rowid, flight, origin, dest, "
+                         "time_hour FROM flights")
         query_airports = "SELECT faa, lat, lon FROM airports"
 
         cur = conn.cursor()
@@ -729,127 +780,118 @@ def generate_bearing_df():
         df_flights = pd.DataFrame(rows_flights, columns=[
                                   x[0] for x in cur.description])
 
-        cur.execute(query_weather)
-        rows_weather = cur.fetchall()
-        df_weather = pd.DataFrame(rows_weather, columns=[
-                                  x[0] for x in cur.description])
+        df_weather = weather_join.weather_for_flights(conn,
+                                                      columns=["wind_dir"])
 
         cur.execute(query_airports)
         rows_airports = cur.fetchall()
         df_airports = pd.DataFrame(rows_airports, columns=[
                                    x[0] for x in cur.description])
 
-        # 1) Merge df_flights and df_weather on origin/time_hour
-        df_flights = pd.merge(
-            df_flights,
-            df_weather,
-            on=["origin", "time_hour"],
-            how="inner"
-        )
+        df_flights = add_bearing_columns(df_flights, df_weather, df_airports)
 
-        # 2) Merge with df_airports to get lat/lon for the origin airport
-        df_flights = pd.merge(
-            df_flights,
-            df_airports[["faa", "lat", "lon"]],
-            left_on="origin",
-            right_on="faa",
-            how="left"
-        )
-        df_flights.rename(
-            columns={"lat": "lat_origin", "lon": "lon_origin"}, inplace=True)
-        df_flights.drop("faa", axis=1, inplace=True)
-
-        # 3) Merge with df_airports to get lat/lon for the destination airport
-        df_flights = pd.merge(
-            df_flights,
-            df_airports[["faa", "lat", "lon"]],
-            left_on="dest",
-            right_on="faa",
-            how="left"
-        )
-        df_flights.rename(
-            columns={"lat": "lat_dest", "lon": "lon_dest"}, inplace=True)
-        df_flights.drop("faa", axis=1, inplace=True)
+    # Return the constructed DataFrame instead of an empty string
+    return df_flights
 
-        bearings = []
-        inner_products = []
 
-        for _, row in df_flights.iterrows():
-            origin_coords = (row['lat_origin'], row['lon_origin'])
-            dest_coords = (row['lat_dest'], row['lon_dest'])
-            bearing = calculate_compass_bearing(origin_coords, dest_coords)
-            bearings.append(bearing)
+if __name__ == "__main__":
+    # Example case (in streaming mode only the first chunk is materialized)
+    if STREAM_CHUNKSIZE is None:
+        df_flights_bearing = generate_bearing_df()
+    else:
+        df_flights_bearing = next(iter_bearing_chunks(STREAM_CHUNKSIZE))
+    df_flights_bearing_small = df_flights_bearing.copy().dropna().head(5)
+    # print(df_flights_bearing_small)
+
+    # Example case: Show polar histogram ofthe first 5 pairs of directions to see if the inner product is affected by the direction of the plane (in air) and direction of the wind.
+    for idx, row in df_flights_bearing_small.iterrows():
+        # Create 1x2 subplot layout
+        fig = make_subplots(
+            rows=1, cols=2,
+            specs=[[{"type": "polar"}, {"type": "polar"}]],
+            # these become annotations
+            subplot_titles=("Wind Direction", "Bearing")
+        )
 
-        df_flights['bearing'] = bearings
+        # First polar histogram (Wind Direction)
+        fig.add_trace(
+            go.Barpolar(
+                r=[1],
+                theta=[row["wind_dir"]],
+                name="Wind Dir"
+            ),
+            row=1, col=1
+        )
 
-        for _, row in df_flights.iterrows():
-            ip = inner_product_angle(row['wind_dir'], row['bearing'])
-            inner_products.append('positive' if ip >= 0 else 'negative')
+        # Second polar histogram (Bearing)
+        fig.add_trace(
+            go.Barpolar(
+                r=[1],
+                theta=[row["bearing"]],
+                name="Bearing"
+            ),
+            row=1, col=2
+        )
 
-        df_flights['innerProd'] = inner_products
+        # Adjust layout (including the main figure title if you want)
+        fig.update_layout(
+            polar=dict(
+                radialaxis=dict(range=[0, 1.2], showticklabels=False, ticks="")
+            ),
+            polar2=dict(
+                radialaxis=dict(range=[0, 1.2], showticklabels=False, ticks="")
+            ),
+            showlegend=False,
+            title={
+                "text": f"From {row['origin']} to {row['dest']}. I.P. {row['innerProd']}",
+                "x": 0.5,
+                "y": 0.95
+            },
+            margin=dict(t=100)
+        )
 
-    # Return the constructed DataFrame instead of an empty string
-    return df_flights
+        # Move each subplot title (annotation) higher
+        # Increase the y-value as needed (e.g., +0.04, +0.05, etc.)
+        for annotation in fig.layout.annotations:
+            annotation.y += 0.05
 
+        # fig.show()
 
-# Example case
-df_flights_bearing = generate_bearing_df()
-df_flights_bearing_small = df_flights_bearing.copy().dropna().head(5)
-# print(df_flights_bearing_small)
 
-# Example case: Show polar histogram ofthe first 5 pairs of directions to see if the inner product is affected by the direction of the plane (in air) and direction of the wind.
-for idx, row in df_flights_bearing_small.iterrows():
-    # Create 1x2 subplot layout
-    fig = make_subplots(
-        rows=1, cols=2,
-        specs=[[{"type": "polar"}, {"type": "polar"}]],
-        # these become annotations
-        subplot_titles=("Wind Direction", "Bearing")
-    )
+# Store route bearing, headwind and crosswind (knots) on `flights` in one
+# vectorized pass; only flights added since the last run are computed
+def update_wind_columns(full=False):
+    with db.connect(db_path) as conn:
+        cube = weather_cube.ensure_weather_cube(conn, db_path)
+        return wind.update_wind_components(conn, cube, full)
 
-    # First polar histogram (Wind Direction)
-    fig.add_trace(
-        go.Barpolar(
-            r=[1],
-            theta=[row["wind_dir"]],
-            name="Wind Dir"
-        ),
-        row=1, col=1
-    )
 
-    # Second polar histogram (Bearing)
-    fig.add_trace(
-        go.Barpolar(
-            r=[1],
-            theta=[row["bearing"]],
-            name="Bearing"
-        ),
-        row=1, col=2
-    )
+# update_wind_columns()
 
-    # Adjust layout (including the main figure title if you want)
-    fig.update_layout(
-        polar=dict(
-            radialaxis=dict(range=[0, 1.2], showticklabels=False, ticks="")
-        ),
-        polar2=dict(
-            radialaxis=dict(range=[0, 1.2], showticklabels=False, ticks="")
-        ),
-        showlegend=False,
-        title={
-            "text": f"From {row['origin']} to {row['dest']}. I.P. {row['innerProd']}",
-            "x": 0.5,
-            "y": 0.95
-        },
-        margin=dict(t=100)
-    )
 
-    # Move each subplot title (annotation) higher
-    # Increase the y-value as needed (e.g., +0.04, +0.05, etc.)
-    for annotation in fig.layout.annotations:
-        annotation.y += 0.05
+def delay_vs_headwind(bin_width=10, chunksize=None):
+    """
+    Mean arrival delay per headwind bin, read from the stored wind columns.
 
-    # fig.show()
+    With `chunksize` (or STREAM_CHUNKSIZE) the flights are read in chunks
+    folded into a `streaming.GroupedMean`.
+    """
+    query = """
+        SELECT headwind, arr_delay
+        FROM flights
+        WHERE headwind IS NOT NULL AND arr_delay IS NOT NULL
+    """
+    chunksize = chunksize or STREAM_CHUNKSIZE
+    per_bin = streaming.GroupedMean("headwind_bin", "arr_delay")
+    with db.connect(db_path) as conn:
+        if chunksize is None:
+            chunks = [read_typed(query, conn)]
+        else:
+            chunks = streaming.iter_chunks(conn, query, chunksize, typed=True)
+        for df in chunks:
+            df["headwind_bin"] = np.floor(df["headwind"] / bin_width) * bin_width
+            per_bin.update(df)
+    return per_bin.result()
 
 
 # =============== Part 4 ===============
@@ -871,33 +913,48 @@ def compute_air_time(sched_dep, sched_arr):
 
 
 # Missing values handling
-with sqlite3.connect(db_path) as conn:
-    df_flights = pd.read_sql_query("SELECT * FROM flights", conn)
-
-# Check missing values before filling
-missing_counts = df_flights.isnull().sum()
-# print("Flights table missing values before filling:", missing_counts)
-
-# Fill missing values in 'dep_time' and 'arr_time' with 'sched_dep_time' and 'sched_arr_time'
-df_flights['dep_time'] = df_flights['dep_time'].fillna(
-    df_flights['sched_dep_time'])
-df_flights['arr_time'] = df_flights['arr_time'].fillna(
-    df_flights['sched_arr_time'])
-
-# Fill missing values in 'dep_delay' and 'arr_delay' with 0 (assuming missing indicates no delay)
-df_flights['dep_delay'] = df_flights['dep_delay'].fillna(0)
-df_flights['arr_delay'] = df_flights['arr_delay'].fillna(0)
-
-# Fill missing values in 'tailnum' with "Unknown"
-df_flights['tailnum'] = df_flights['tailnum'].fillna("Unknown")
-
-# Fill missing values in 'air_time' using the computed difference from scheduled times
-df_flights['air_time'] = df_flights.apply(
-    lambda row: compute_air_time(row['sched_dep_time'], row['sched_arr_time'])
-    if pd.isnull(row['air_time']) else row['air_time'],
-    axis=1
-)
-conn.close()
+def fill_missing_values(df_flights):
+    """Fill missing times, delays, tailnums and air times in a flights frame."""
+    # Fill missing values in 'dep_time' and 'arr_time' with 'sched_dep_time' and 'sched_arr_time'
+    df_flights['dep_time'] = df_flights['dep_time'].fillna(
+        df_flights['sched_dep_time'])
+    df_flights['arr_time'] = df_flights['arr_time'].fillna(
+        df_flights['sched_arr_time'])
+
+    # Fill missing values in 'dep_delay' and 'arr_delay' with 0 (assuming missing indicates no delay)
+    df_flights['dep_delay'] = df_flights['dep_delay'].fillna(0)
+    df_flights['arr_delay'] = df_flights['arr_delay'].fillna(0)
+
+    # Fill missing values in 'tailnum' with "Unknown"
+    df_flights['tailnum'] = df_flights['tailnum'].fillna("Unknown")
+
+    # Fill missing values in 'air_time' using the computed difference from scheduled times
+    df_flights['air_time'] = df_flights.apply(
+        lambda row: compute_air_time(
+            row['sched_dep_time'], row['sched_arr_time'])
+        if pd.isnull(row['air_time']) else row['air_time'],
+        axis=1
+    )
+    return df_flights
+
+
+if __name__ == "__main__":
+    if STREAM_CHUNKSIZE is None:
+        with db.connect(db_path) as conn:
+            df_flights = pd.read_sql_query("SELECT * FROM flights", conn)
+
+        # Check missing values before filling
+        missing_counts = df_flights.isnull().sum()
+        # print("Flights table missing values before filling:", missing_counts)
+
+        df_flights = fill_missing_values(df_flights)
+        conn.close()
+    else:
+        # Only the per-column missing counts are kept, the filled chunks are dropped
+        with db.connect(db_path) as conn:
+            missing_counts = streaming.fold_null_counts(
+                streaming.iter_chunks(conn, "SELECT * FROM flights", STREAM_CHUNKSIZE))
+        conn.close()
 
 # Check missing values after filling
 # print("Flights table missing values after filling:", df_flights.isnull().sum())
@@ -906,26 +963,24 @@ conn.close()
 
 
 def find_duplicate_flights():
-    with sqlite3.connect(db_path) as conn:
-        query = """
-            SELECT year, month, day, origin, dest, sched_dep_time,carrier,tailnum , COUNT(*) AS duplicate_count
-            FROM flights
-            GROUP BY year, month, day, origin, dest, sched_dep_time, carrier,tailnum
-            HAVING duplicate_count > 1;
-        """
-        duplicates = pd.read_sql_query(query, conn)
+    with db.connect(db_path) as conn:
+        # back-fills the hashed natural key once, afterwards only new rows;
+        # duplicates are then looked up through its unique index
+        ingest.ensure_natural_key(conn)
+        duplicates = ingest.find_duplicate_flights(conn)
     return duplicates
 
 
-duplicate_flights = find_duplicate_flights()
-# print("Duplicate flights:", duplicate_flights)
-# prin duplicate flights 2023-1-10 JFK BOS 840 YX N725MQ
-# print(df_flights[(df_flights['year'] == 2023) & (df_flights['month'] == 1) & (df_flights['day'] == 10) & (df_flights['origin'] == 'JFK') & (df_flights['dest'] == 'BOS')& (df_flights['sched_dep_time'] == 840) & (df_flights['carrier'] == 'YX')])
+if __name__ == "__main__":
+    duplicate_flights = find_duplicate_flights()
+    # print("Duplicate flights:", duplicate_flights)
+    # prin duplicate flights 2023-1-10 JFK BOS 840 YX N725MQ
+    # print(df_flights[(df_flights['year'] == 2023) & (df_flights['month'] == 1) & (df_flights['day'] == 10) & (df_flights['origin'] == 'JFK') & (df_flights['dest'] == 'BOS')& (df_flights['sched_dep_time'] == 840) & (df_flights['carrier'] == 'YX')])
 
 # covert to datetime objects
 
 
-def flights_with_dtime_objects():
+def convert_to_dtime_objects(flights):
     def parse_dtime(year, month, day, num):
         # If the time value is missing, return a missing value indicator.
         if pd.isna(num):
@@ -933,17 +988,12 @@ def flights_with_dtime_objects():
 
         # If the time is 2400, consider it as midnight of the next day.
         if num == 2400:
-            return datetime.datetime(year=year, month=month, day=day) + datetime.timedelta(days=1)
+            return datetime.datetime(year=int(year), month=int(month), day=int(day)) + datetime.timedelta(days=1)
 
         # Split the number into hours and minutes.
         hours, minutes = divmod(num, 100)
 
-        return datetime.datetime(year=year, month=month, day=day, hour=int(hours % 24), minute=int(minutes))
-
-    # Connect to the database and load the flights table
-    with sqlite3.connect(db_path) as conn:
-        query = "SELECT * FROM flights"
-        flights = pd.read_sql(query, conn)
+        return datetime.datetime(year=int(year), month=int(month), day=int(day), hour=int(hours % 24), minute=int(minutes))
 
     # Convert time columns to datetime objects using the helper function
     flights["dep_time"] = flights.apply(lambda row: parse_dtime(
@@ -957,27 +1007,48 @@ def flights_with_dtime_objects():
 
     # Convert delay and air_time fields into timedelta objects
     flights["dep_delay"] = flights["dep_delay"].apply(
-        lambda delay: datetime.timedelta(minutes=delay) if not pd.isna(delay) else pd.NA)
+        lambda delay: datetime.timedelta(minutes=float(delay)) if not pd.isna(delay) else pd.NA)
     flights["arr_delay"] = flights["arr_delay"].apply(
-        lambda delay: datetime.timedelta(minutes=delay) if not pd.isna(delay) else pd.NA)
+        lambda delay: datetime.timedelta(minutes=float(delay)) if not pd.isna(delay) else pd.NA)
     flights["air_time"] = flights["air_time"].apply(lambda air_time: datetime.timedelta(
-        minutes=air_time) if not pd.isna(air_time) else pd.NA)
+        minutes=float(air_time)) if not pd.isna(air_time) else pd.NA)
 
     return flights
 
 
-# Example usage:
-df_with_dtime = flights_with_dtime_objects()
-# print(df_with_dtime.head())
+def iter_flights_with_dtime_objects(chunksize):
+    """Yield the flights table in chunks with datetime/timedelta columns."""
+    with db.connect(db_path) as conn:
+        query = "SELECT * FROM flights"
+        for chunk in streaming.iter_chunks(conn, query, chunksize,
+                                           typed=True):
+            yield convert_to_dtime_objects(chunk)
+
+
+def flights_with_dtime_objects():
+    """
+    The flights table with datetime/timedelta columns in one frame; use
+    `iter_flights_with_dtime_objects` to hold only one chunk in memory.
+    """
+    # Connect to the database and load the flights table
+    with db.connect(db_path) as conn:
+        query = "SELECT * FROM flights"
+        flights = read_typed(query, conn)
+
+    return convert_to_dtime_objects(flights)
+
+
+if __name__ == "__main__":
+    # Example usage (in streaming mode only the first chunk is materialized):
+    if STREAM_CHUNKSIZE is None:
+        df_with_dtime = flights_with_dtime_objects()
+    else:
+        df_with_dtime = next(iter_flights_with_dtime_objects(STREAM_CHUNKSIZE))
+    # print(df_with_dtime.head())
 
 #####################################################################
 # Checking whether the dat in flights is in order (Part 4)
 #####################################################################
-with sqlite3.connect('../flights_database.db') as conn:
-    df = pd.read_sql('SELECT * FROM flights', conn)
-
-df = df.copy()
-
 fix_count = {
     'dep_time': 0, 'dep_delay': 0, 'arr_time': 0, 'arr_delay': 0, 'air_time': 0
 }
@@ -1053,76 +1124,97 @@ def fix_air_time(df):
             fix_count['air_time'] += 1
 
 
-fix_times_if_else(df, 'dep_time', 'sched_dep_time', 'dep_delay')
-fix_times_if_else(df, 'arr_time', 'sched_arr_time', 'arr_delay')
+def repair_flight_times(df):
+    """Apply the time and air_time fixes to a flights frame, counting them."""
+    fix_times_if_else(df, 'dep_time', 'sched_dep_time', 'dep_delay')
+    fix_times_if_else(df, 'arr_time', 'sched_arr_time', 'arr_delay')
 
-fix_air_time(df)
+    fix_air_time(df)
+    return df
 
-# # ADDITIONAL PART : ADD THE UPDATED TIMES TO THE FLIGHTS DATABASE
 
+def iter_repaired_flights(chunksize):
+    """Yield the flights table in repaired chunks."""
+    with db.connect(db_path) as conn:
+        # untyped: the values (and the time_hour key) are written back as
+        # SQL parameters by add_updated_times_to_db
+        query = 'SELECT * FROM flights'
+        for chunk in streaming.iter_chunks(conn, query, chunksize):
+            yield repair_flight_times(chunk)
 
-def add_updated_times_to_db():
-    conn = sqlite3.connect('/content/flights_database.db')
-    conn.execute("PRAGMA busy_timeout = 30000")
-    cur = conn.cursor()
 
-    unique_time_hours = df['time_hour'].unique().tolist()
-    unique_flights = df['flight'].unique().tolist()
+if __name__ == "__main__":
+    if STREAM_CHUNKSIZE is None:
+        with db.connect(db_path) as conn:
+            df = pd.read_sql('SELECT * FROM flights', conn)
 
-    select_all_query = f"""
-    SELECT time_hour, flight, dep_time, sched_dep_time, dep_delay, arr_time, sched_arr_time, arr_delay, air_time
-    FROM flights
-    WHERE time_hour IN ({','.join('?'*len(unique_time_hours))})
-    AND flight IN ({','.join('?'*len(unique_flights))})
-    """
-    params = unique_time_hours + unique_flights
-    cur.execute(select_all_query, params)
-    rows = cur.fetchall()
-
-    flights_dict = {(r[0], r[1]): r[2:] for r in rows}
-
-    update_queries = []
-
-    for row in df.itertuples(index=False):
-        key = (row.time_hour, row.flight)
-        if key in flights_dict:
-            current_values = flights_dict[key]
-            if any(value is None or value == "" for value in current_values):
-                update_query = f"""
-                    UPDATE flights
-                    SET dep_time = '{row.dep_time}',
-                        sched_dep_time = '{row.sched_dep_time}',
-                        dep_delay = '{row.dep_delay}',
-                        arr_time = '{row.arr_time}',
-                        sched_arr_time = '{row.sched_arr_time}',
-                        arr_delay = '{row.arr_delay}',
-                        air_time = '{row.air_time}'
-                    WHERE time_hour = '{row.time_hour}' AND flight = '{row.flight}';
-                    """
-                update_queries.append(update_query)
+        df = repair_flight_times(df.copy())
+    else:
+        # fix_count is folded over the chunks; nothing is kept in memory
+        df = None
+        for _ in iter_repaired_flights(STREAM_CHUNKSIZE):
+            pass
 
-    conn.close()
+# # ADDITIONAL PART : ADD THE UPDATED TIMES TO THE FLIGHTS DATABASE
 
-    # Database was open a second time, because of a persisting 'database is locked' error.
-    conn = sqlite3.connect('/content/flights_database.db')
+
+def add_updated_times_to_db(frames=None):
+    """Write the repaired times of flights with a missing value; returns how many."""
+    # By default the repaired chunks are generated again one at a time
+    if frames is None:
+        frames = iter_repaired_flights(
+            STREAM_CHUNKSIZE or streaming.DEFAULT_CHUNKSIZE)
+
+    columns = ['dep_time', 'sched_dep_time', 'dep_delay', 'arr_time',
+               'sched_arr_time', 'arr_delay', 'air_time']
+
+    conn = db.connect(db_path)
     conn.execute("PRAGMA busy_timeout = 30000")
-    conn.execute("PRAGMA journal_mode = WAL")
     cur = conn.cursor()
 
-    update_script = "\n".join(update_queries)
+    updates = []
+
+    for frame in frames:
+        unique_time_hours = frame['time_hour'].unique().tolist()
+        unique_flights = frame['flight'].unique().tolist()
+
+        select_all_query = f"""
+        SELECT time_hour, flight, {', '.join(columns)}
+        FROM flights
+        WHERE time_hour IN ({','.join('?'*len(unique_time_hours))})
+        AND flight IN ({','.join('?'*len(unique_flights))})
+        """
+        params = unique_time_hours + unique_flights
+        cur.execute(select_all_query, params)
+        rows = cur.fetchall()
+
+        flights_dict = {(r[0], r[1]): r[2:] for r in rows}
+
+        for row in frame.itertuples(index=False):
+            key = (row.time_hour, row.flight)
+            if key in flights_dict:
+                current_values = flights_dict[key]
+                if any(value is None or value == "" for value in current_values):
+                    # NaN is written as NULL, not as the text 'nan'
+                    values = [getattr(row, column) for column in columns]
+                    updates.append(
+                        [None if pd.isna(value) else value for value in values]
+                        + [row.time_hour, row.flight])
 
     try:
-        # Execute all updates in one go.
-        conn.executescript(update_script)
-        conn.commit()
+        # Execute all updates in one transaction
+        with table_versions.recording(conn, ["flights"]):
+            conn.executemany(f"""
+                UPDATE flights
+                SET {', '.join(f'{column} = ?' for column in columns)}
+                WHERE time_hour = ? AND flight = ?
+            """, updates)
         print("All updates executed successfully.")
-    except Exception as e:
-        conn.rollback()
-        print("Error during batch update:", e)
     finally:
         conn.close()
+    return len(updates)
 
-# add_updated_times_to_db()
+# add_updated_times_to_db([df])
 
 
 ############################################
@@ -1130,7 +1222,9 @@ def add_updated_times_to_db():
 ############################################
 def find_tzone_from_coords():
     '''The function takes the rows with empty tzones and uses the coordinates to find the tzone and insert back to the table'''
-    con = sqlite3.connect(db_path)
+    from timezonefinder import TimezoneFinder
+
+    con = db.connect(db_path)
 
     airports_df = pd.read_sql("SELECT * FROM airports", con)
 
@@ -1138,6 +1232,7 @@ def find_tzone_from_coords():
 
     tf = TimezoneFinder()
 
+    found = []
     for idx, row in airports_df[airports_df['tzone'].isnull()].iterrows():
         lat = row['lat']
         lon = row['lon']
@@ -1148,18 +1243,21 @@ def find_tzone_from_coords():
         found_tzone = tf.timezone_at(lng=lon, lat=lat)
 
         if found_tzone:
-            airports_df.at[idx, 'tzone'] = found_tzone
-        else:
-            pass
+            found.append((found_tzone, row['faa']))
 
-    airports_df.to_sql('airports', con, if_exists='replace', index=False)
+    # only the filled rows are written; the table (and its indexes) stays
+    with con:
+        con.executemany("UPDATE airports SET tzone = ? WHERE faa = ?", found)
 
     con.close()
+    return len(found)
 
 # find_tzone_from_coords()
 
 
 def convert_to_local_time(row):
+    import pytz
+
     try:
         if pd.isnull(row["arr_time"]) or pd.isnull(row["tzone"]):
             return None
@@ -1189,20 +1287,21 @@ def convert_to_local_time(row):
         return None
 
 
-con = sqlite3.connect(db_path)
+if __name__ == "__main__":
+    con = db.connect(db_path)
 
-airports_df = pd.read_sql("SELECT faa, lat, lon, tzone FROM airports", con)
-flights_df = pd.read_sql(
-    "SELECT year, month, day, arr_time, dest FROM flights", con)
+    airports_df = pd.read_sql("SELECT faa, lat, lon, tzone FROM airports", con)
+    flights_df = read_typed(
+        "SELECT year, month, day, arr_time, dest FROM flights", con)
 
-merged_df = flights_df.merge(
-    airports_df, left_on="dest", right_on="faa", how="left")
+    merged_df = flights_df.merge(
+        airports_df, left_on="dest", right_on="faa", how="left")
 
-merged_df = merged_df.dropna(subset=["lat", "lon"])
+    merged_df = merged_df.dropna(subset=["lat", "lon"])
 
-merged_df = merged_df.reset_index(drop=True)
+    merged_df = merged_df.reset_index(drop=True)
 
-merged_df["local_arr_time"] = merged_df.apply(convert_to_local_time, axis=1)
+    merged_df["local_arr_time"] = merged_df.apply(convert_to_local_time, axis=1)
 
-con.close()
-# merged_df.head(10)
+    con.close()
+    # merged_df.head(10)
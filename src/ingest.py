@@ -0,0 +1,148 @@
+import pandas as pd
+
+import db
+import table_versions
+
+# Columns that identify a scheduled flight (see Part 4 of the report: the
+# flight number and time_hour are not precise enough on their own)
+NATURAL_KEY_COLUMNS = ["year", "month", "day", "origin", "dest",
+                       "sched_dep_time", "carrier", "tailnum"]
+
+INTEGER_KEY_COLUMNS = ["year", "month", "day", "sched_dep_time"]
+
+
+def natural_keys(df):
+    """
+    Return a signed 64-bit hash of the natural key columns for every row.
+
+    Numeric columns are normalised to integers first, so 840 and 840.0 give
+    the same key; missing values (e.g. tailnum) hash as "<NA>".
+    """
+    parts = []
+    for column in NATURAL_KEY_COLUMNS:
+        values = df[column]
+        if column in INTEGER_KEY_COLUMNS:
+            values = pd.to_numeric(values).astype("Int64")
+        parts.append(values.astype("string").fillna("<NA>"))
+
+    key_strings = parts[0].str.cat(parts[1:], sep="|")
+    hashes = pd.util.hash_pandas_object(key_strings, index=False)
+    return hashes.to_numpy().view("int64")
+
+
+def ensure_natural_key(conn):
+    """
+    Add and back-fill `flights.natural_key`, backed by a unique index.
+
+    Rows whose key is already taken by an earlier row (the duplicates found
+    in Part 4) keep a NULL key and are recorded in `flight_duplicates`, so
+    the unique index can be built and duplicates stay queryable.
+    """
+    if "natural_key" not in db.table_columns(conn, "flights"):
+        conn.execute("ALTER TABLE flights ADD COLUMN natural_key INTEGER")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS flight_duplicates (
+            flight_rowid INTEGER PRIMARY KEY,
+            natural_key INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_flight_duplicates_key
+        ON flight_duplicates(natural_key)
+    """)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_flights_natural_key
+        ON flights(natural_key)
+    """)
+
+    # only rows inserted without a key (new rows or a fresh table)
+    missing = pd.read_sql_query(f"""
+        SELECT rowid AS flight_rowid, {', '.join(NATURAL_KEY_COLUMNS)}
+        FROM flights
+        WHERE natural_key IS NULL
+          AND rowid NOT IN (SELECT flight_rowid FROM flight_duplicates)
+        ORDER BY rowid
+    """, conn)
+    if missing.empty:
+        return 0
+
+    missing["natural_key"] = natural_keys(missing)
+    taken = _lookup_keys(conn, missing["natural_key"])
+    is_duplicate = (missing["natural_key"].duplicated()
+                    | missing["natural_key"].isin(taken))
+
+    keyed = missing.loc[~is_duplicate, ["natural_key", "flight_rowid"]]
+    duplicates = missing.loc[is_duplicate, ["flight_rowid", "natural_key"]]
+    with table_versions.recording(conn, ["flights"]):
+        conn.executemany(
+            "UPDATE flights SET natural_key = ? WHERE rowid = ?",
+            keyed.itertuples(index=False, name=None))
+        conn.executemany(
+            "INSERT OR IGNORE INTO flight_duplicates VALUES (?, ?)",
+            duplicates.itertuples(index=False, name=None))
+    return len(missing)
+
+
+def insert_flights(conn, df):
+    """
+    Insert flight rows with their natural key, skipping already loaded ones.
+
+    Because of `INSERT OR IGNORE` on the unique key, loading the same
+    source twice is a no-op. Returns the number of rows actually inserted.
+    """
+    ensure_natural_key(conn)
+    columns = [c for c in db.table_columns(conn, "flights")
+               if c in df.columns and c != "natural_key"]
+    rows = df[columns].astype(object).where(df[columns].notna(), None)
+    rows["natural_key"] = natural_keys(df)
+
+    placeholders = ", ".join(["?"] * (len(columns) + 1))
+    before = conn.total_changes
+    with table_versions.recording(conn, ["flights"]):
+        conn.executemany(
+            f"INSERT OR IGNORE INTO flights ({', '.join(columns)}, natural_key) "
+            f"VALUES ({placeholders})",
+            rows.itertuples(index=False, name=None))
+    return conn.total_changes - before
+
+
+def load_flights_csv(conn, path, chunksize=50_000):
+    """Idempotently load a flights CSV file in chunks, returning rows added."""
+    inserted = 0
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        inserted += insert_flights(conn, chunk)
+    return inserted
+
+
+def _lookup_keys(conn, keys):
+    """Return which of `keys` are present, using the unique index."""
+    keys = [int(k) for k in keys]
+    found = set()
+    # stay well below SQLite's bound parameter limit
+    for start in range(0, len(keys), 900):
+        batch = keys[start:start + 900]
+        found.update(row[0] for row in conn.execute(
+            f"SELECT natural_key FROM flights WHERE natural_key IN "
+            f"({', '.join(['?'] * len(batch))})", batch))
+    return found
+
+
+def existing_keys(conn, df):
+    """Return the natural keys of `df` rows that are already in `flights`."""
+    return _lookup_keys(conn, natural_keys(df))
+
+
+def find_duplicate_flights(conn):
+    """
+    List duplicated flights with their number of copies.
+
+    Only the recorded duplicates are visited, each resolved through the
+    natural key index, instead of aggregating the whole table.
+    """
+    return pd.read_sql_query(f"""
+        SELECT {', '.join('f.' + c for c in NATURAL_KEY_COLUMNS)},
+               COUNT(*) + 1 AS duplicate_count
+        FROM flight_duplicates d
+        JOIN flights f ON f.natural_key = d.natural_key
+        GROUP BY d.natural_key
+    """, conn)
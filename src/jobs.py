@@ -0,0 +1,247 @@
+"""
+Background jobs for the analyses too heavy to run inside a Streamlit rerun.
+
+A job is submitted from a page (pages/5_Jobs.py) and runs in a worker
+process, so it neither blocks the session nor holds the GIL of the server.
+The jobs and their progress are kept in this module, shared by all sessions
+and reruns; the worker reports its progress over a queue that a thread of
+the server process reads. Jobs run one at a time in submission order, so
+two of them never write the database at once.
+
+Every job writes its result to the database. The shared caches are keyed on
+the versions of the tables they read (table_versions.py), so they reload by
+themselves after a job changed `flights`, `planes` or `airports`.
+"""
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+
+import db
+import streaming
+import table_versions
+
+_jobs = {}
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_executor = None
+_queue = None
+
+# set in the worker process by `_init_worker`
+_progress_queue = None
+
+
+# ----------------------------
+# Jobs, run in the worker process with a `progress(done, total)` callback
+# ----------------------------
+def _count(table):
+    import flights
+
+    conn = db.connect(flights.db_path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def wind_columns(progress, full=False):
+    """`flights.update_wind_columns`, the wind columns of the Delay page."""
+    import flights
+
+    progress(0, 1)
+    processed = flights.update_wind_columns(full=full)
+    progress(1, 1)
+    return f"Computed the wind components of {processed:,} flights"
+
+
+def repair_times(progress, chunksize=streaming.DEFAULT_CHUNKSIZE):
+    """Part 4 time repair (`flights.add_updated_times_to_db`)."""
+    import flights
+
+    total = _count("flights")
+
+    def frames():
+        done = 0
+        progress(done, total)
+        for frame in flights.iter_repaired_flights(chunksize):
+            yield frame
+            done += len(frame)
+            progress(done, total)
+
+    updated = flights.add_updated_times_to_db(frames())
+    return f"Repaired the times of {updated:,} flights"
+
+
+def plane_speeds(progress, full=False):
+    """`flights.compute_avg_speed_and_update_db`."""
+    import flights
+
+    progress(0, 1)
+    refreshed = flights.compute_avg_speed_and_update_db(full=full)
+    progress(1, 1)
+    return f"Updated the average speed of {refreshed:,} planes"
+
+
+def airport_timezones(progress):
+    """`flights.find_tzone_from_coords`."""
+    import flights
+
+    progress(0, 1)
+    found = flights.find_tzone_from_coords()
+    progress(1, 1)
+    return f"Found the time zone of {found:,} airports"
+
+
+# name: (label, function, where the result goes)
+JOBS = {
+    "wind": ("Wind components", wind_columns,
+             "Route bearing, headwind and crosswind of the flights added "
+             "since the last run, written to `flights` for the Delay "
+             "Analysis page."),
+    "time_repair": ("Repair flight times", repair_times,
+                    "Fills in missing departure, arrival and air times in "
+                    "`flights`."),
+    "plane_speeds": ("Average plane speeds", plane_speeds,
+                     "Average speed of every plane with new flights, written "
+                     "to `planes.avg_speed`."),
+    "timezones": ("Airport time zones", airport_timezones,
+                  "Time zone of the airports without one, from their "
+                  "coordinates, written to `airports.tzone`."),
+}
+
+
+# ----------------------------
+# Worker process
+# ----------------------------
+def _init_worker(queue):
+    global _progress_queue
+    _progress_queue = queue
+
+
+def _run(job_id, name, path, params):
+    import flights
+
+    flights.db_path = path
+    _progress_queue.put((job_id, "running", None))
+    # the jobs write anyway; caches see their changes per table
+    table_versions.install(path)
+
+    def progress(done, total):
+        _progress_queue.put((job_id, "progress", (done, total)))
+
+    return JOBS[name][1](progress, **params)
+
+
+# ----------------------------
+# Server process
+# ----------------------------
+def _listen(queue):
+    """Apply the messages of the workers to the jobs."""
+    while True:
+        job_id, kind, value = queue.get()
+        with _lock:
+            job = _jobs.get(job_id)
+            if job is None:
+                continue
+            if kind == "running" and job["status"] == "queued":
+                job.update(status="running", started=time.time())
+            elif job["status"] == "running":
+                job["done"], job["total"] = value
+
+
+def _get_executor():
+    global _executor, _queue
+    if _queue is None:
+        # spawned workers start without the server's SQLite connections
+        context = multiprocessing.get_context("spawn")
+        _queue = context.Queue()
+        threading.Thread(target=_listen, args=(_queue,), name="job-progress",
+                         daemon=True).start()
+    if _executor is None:
+        _executor = concurrent.futures.ProcessPoolExecutor(
+            1, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(_queue,))
+    return _executor
+
+
+def _finished(job_id, future):
+    global _executor
+    with _lock:
+        job = _jobs[job_id]
+        job["finished"] = time.time()
+        if future.cancelled():
+            job["status"] = "cancelled"
+            return
+        error = future.exception()
+        if error is None:
+            job.update(status="done", result=future.result())
+        else:
+            job.update(status="failed", error="".join(
+                traceback.format_exception_only(type(error), error)).strip())
+            if isinstance(error, concurrent.futures.BrokenExecutor):
+                # a new pool is started for the next job
+                _executor = None
+
+
+def submit(name, path=db.DB_PATH, **params):
+    """
+    Queue the job `name` of JOBS with keyword `params`; returns its id.
+
+    While a job of the same name is queued or running, its id is returned
+    instead of queueing it again.
+    """
+    if name not in JOBS:
+        raise ValueError(f"Unknown job {name!r}, use one of {list(JOBS)}")
+    path = os.path.abspath(path)
+    with _lock:
+        for job in _jobs.values():
+            if job["name"] == name and job["status"] in ("queued", "running"):
+                return job["id"]
+        job_id = next(_ids)
+        _jobs[job_id] = {
+            "id": job_id, "name": name, "label": JOBS[name][0],
+            "params": params, "status": "queued", "submitted": time.time(),
+            "started": None, "finished": None, "done": 0, "total": 0,
+            "result": None, "error": None, "future": None,
+        }
+        future = _get_executor().submit(_run, job_id, name, path, params)
+        _jobs[job_id]["future"] = future
+    future.add_done_callback(lambda f: _finished(job_id, f))
+    return job_id
+
+
+def cancel(job_id):
+    """Cancel a job that has not started; returns whether it was cancelled."""
+    with _lock:
+        future = _jobs[job_id]["future"]
+    return future.cancel()
+
+
+def _snapshot(job):
+    return {key: value for key, value in job.items() if key != "future"}
+
+
+def get(job_id):
+    """Snapshot of one job (see `jobs`)."""
+    with _lock:
+        return _snapshot(_jobs[job_id])
+
+
+def jobs():
+    """
+    Snapshots of all jobs, newest first: id, name, label, params, status
+    (queued, running, done, failed or cancelled), submitted, started and
+    finished times, done and total of the progress, result and error.
+    """
+    with _lock:
+        return [_snapshot(job) for job in reversed(_jobs.values())]
+
+
+def active():
+    """Whether a job is queued or running."""
+    with _lock:
+        return any(job["status"] in ("queued", "running")
+                   for job in _jobs.values())
@@ -1,19 +1,23 @@
 import streamlit as st
-import sqlite3
-import altair as alt
 import pandas as pd
 import os
-import plotly.graph_objects as go
-import plotly.express as px
+import dimensions
+import flight_cube
+import queries
+import query_cache
+import warmup
+from widgets import airport_selectbox, export_button
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '..',
                        '..', "flights_database.db")
 
 
-def load_data(query):
-    with sqlite3.connect(DB_PATH) as conn:
-        df = pd.read_sql_query(query, conn)
-    return df
+def load_data(query, typed=False):
+    # results are shared by all sessions, see query_cache.py
+    return query_cache.read_sql(query, DB_PATH, typed)
+
+
+warmup.start(DB_PATH)
 
 
 st.markdown(
@@ -28,34 +32,8 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# Queries for weekly and monthly flight trends
-query_weekly_trend = """
-SELECT strftime('%W', date(year || '-' || month || '-' || day)) AS week_number, COUNT(*) AS flight_count
-FROM flights
-WHERE origin = '{origin}' AND dest = '{dest}'
-GROUP BY week_number
-ORDER BY week_number;
-"""
-
-query_monthly_trend = """
-SELECT month, COUNT(*) AS flight_count
-FROM flights
-WHERE origin = '{origin}' AND dest = '{dest}'
-GROUP BY month
-ORDER BY month;
-"""
-
-
 def plot_weekly_trend(origin, dest):
-    query_weekly_trend = f"""
-    SELECT strftime('%w', date(year || '-' || month || '-' || day)) AS week_number, COUNT(*) AS flight_count
-    FROM flights
-    WHERE origin = '{origin}' AND dest = '{dest}'
-    GROUP BY week_number
-    ORDER BY week_number;
-    """
-
-    df_weekly = load_data(query_weekly_trend)
+    df_weekly = flight_cube.weekly_trend(origin, dest, DB_PATH)
 
     if df_weekly.empty:
         st.warning("No weekly trend data available for this route.")
@@ -97,8 +75,7 @@ def plot_weekly_trend(origin, dest):
 
 
 def plot_monthly_trend(origin, dest):
-    df_monthly = load_data(
-        query_monthly_trend.format(origin=origin, dest=dest))
+    df_monthly = flight_cube.monthly_trend(origin, dest, DB_PATH)
 
     if df_monthly.empty:
         st.warning("No monthly trend data available for this route.")
@@ -144,18 +121,7 @@ def plot_monthly_trend(origin, dest):
 
 
 def plot_flight_capacity_per_month(origin, dest):
-    query_flight_capacity = f"""
-    SELECT 
-        f.month,
-        SUM(p.seats) AS total_capacity
-    FROM flights f
-    JOIN planes p ON f.tailnum = p.tailnum
-    WHERE f.origin = '{origin}' AND f.dest = '{dest}'
-    GROUP BY f.month
-    ORDER BY f.month;
-    """
-
-    df_capacity = load_data(query_flight_capacity)
+    df_capacity = flight_cube.flight_capacity(origin, dest, DB_PATH)
 
     if df_capacity.empty:
         st.warning("No capacity data available for this route.")
@@ -187,16 +153,7 @@ def plot_flight_capacity_per_month(origin, dest):
 
 
 def plot_delayed_flights_percentage(origin, dest):
-    query_delayed_flights = f"""
-    SELECT month, 
-           ROUND(100.0 * SUM(CASE WHEN dep_delay > 0 THEN 1 ELSE 0 END) / COUNT(*), 2) AS delay_percentage
-    FROM flights
-    WHERE origin = '{origin}' AND dest = '{dest}'
-    GROUP BY month
-    ORDER BY month;
-    """
-
-    df_delay_percentage = load_data(query_delayed_flights)
+    df_delay_percentage = flight_cube.delayed_flights(origin, dest, DB_PATH)
 
     if df_delay_percentage.empty:
         st.warning("No delay data available for this route.")
@@ -240,40 +197,14 @@ def plot_delayed_flights_percentage(origin, dest):
 
 
 def plot_top_airlines(origin, dest):
-    query_top_airlines = f"""
-    SELECT carrier, COUNT(*) AS flight_count
-    FROM flights
-    WHERE origin = '{origin}' AND dest = '{dest}'
-    GROUP BY carrier
-    ORDER BY flight_count DESC
-    LIMIT 5;
-    """
-
-    df_top_airlines = load_data(query_top_airlines)
+    df_top_airlines = flight_cube.top_airlines(origin, dest, path=DB_PATH)
 
     if df_top_airlines.empty:
         st.warning("No airline data available for this route.")
         return
 
-    airline_names = {
-        "UA": "United Airlines",
-        "DL": "Delta Air Lines",
-        "B6": "JetBlue Airways",
-        "AA": "American Airlines",
-        "NK": "Spirit Airlines",
-        "WN": "Southwest Airlines",
-        "AS": "Alaska Airlines",
-        "YX": "Republic Airways (Regional)",
-        "9E": "Endeavor Air (Delta Connection)",
-        "HA": "Hawaiian Airlines",
-        "G4": "Allegiant Air",
-        "MQ": "Envoy Air (American Eagle)",
-        "OO": "SkyWest Airlines",
-        "F9": "Frontier Airlines"
-    }
-
-    df_top_airlines["airline_name"] = df_top_airlines["carrier"].map(
-        airline_names).fillna(df_top_airlines["carrier"])
+    df_top_airlines["airline_name"] = dimensions.get_dimensions(
+        DB_PATH).airline_names(df_top_airlines["carrier"])
 
     fig = px.bar(
         df_top_airlines,
@@ -292,43 +223,15 @@ def plot_top_airlines(origin, dest):
 
 
 def plot_top_delayed_airlines(origin, dest):
-    query_top_delayed_airlines = f"""
-    SELECT carrier, 
-           COUNT(*) AS delayed_flights, 
-           ROUND(100.0 * COUNT(*) / (SELECT COUNT(*) FROM flights WHERE origin = '{origin}' AND dest = '{dest}'), 2) AS delay_percentage
-    FROM flights
-    WHERE origin = '{origin}' AND dest = '{dest}'
-    AND dep_delay > 0  -- Only count delayed flights
-    GROUP BY carrier
-    ORDER BY delayed_flights DESC
-    LIMIT 5;
-    """
-
-    df_top_delayed_airlines = load_data(query_top_delayed_airlines)
+    df_top_delayed_airlines = flight_cube.top_delayed_airlines(
+        origin, dest, path=DB_PATH)
 
     if df_top_delayed_airlines.empty:
         st.warning("No delay data available for this route.")
         return
 
-    airline_names = {
-        "UA": "United Airlines",
-        "DL": "Delta Air Lines",
-        "B6": "JetBlue Airways",
-        "AA": "American Airlines",
-        "NK": "Spirit Airlines",
-        "WN": "Southwest Airlines",
-        "AS": "Alaska Airlines",
-        "YX": "Republic Airways (Regional)",
-        "9E": "Endeavor Air (Delta Connection)",
-        "HA": "Hawaiian Airlines",
-        "G4": "Allegiant Air",
-        "MQ": "Envoy Air (American Eagle)",
-        "OO": "SkyWest Airlines",
-        "F9": "Frontier Airlines"
-    }
-
-    df_top_delayed_airlines["airline_name"] = df_top_delayed_airlines["carrier"].map(
-        airline_names).fillna(df_top_delayed_airlines["carrier"])
+    df_top_delayed_airlines["airline_name"] = dimensions.get_dimensions(
+        DB_PATH).airline_names(df_top_delayed_airlines["carrier"])
 
     fig = px.bar(
         df_top_delayed_airlines,
@@ -396,56 +299,42 @@ st.markdown(
 
 st.sidebar.header("Select Route")
 
-airport_query = """
-SELECT faa, name
-FROM airports
-WHERE faa IN ('JFK', 'LGA', 'EWR')
-ORDER BY faa;
-"""
-df_airports = load_data(airport_query)
-
-airport_list = df_airports.apply(
-    lambda row: f"{row['faa']} - {row['name']}", axis=1
-).tolist()
-faa_mapping = dict(zip(airport_list, df_airports["faa"]))
-
-origin_selection = st.sidebar.selectbox(
-    "Choose Departure Airport (Origin)", options=airport_list, index=0
-)
-origin = faa_mapping[origin_selection]
-
-dest_query = """
-SELECT faa, name
-FROM airports
-ORDER BY faa;
-"""
-df_dest_airports = load_data(dest_query)
-
-dest_airport_list = df_dest_airports.apply(
-    lambda row: f"{row['faa']} - {row['name']}", axis=1
-).tolist()
-dest_faa_mapping = dict(zip(dest_airport_list, df_dest_airports["faa"]))
-
-dest_selection = st.sidebar.selectbox(
-    "Choose Arrival Airport (Destination)", options=dest_airport_list, index=1
-)
-dest = dest_faa_mapping[dest_selection]
+df_airports = load_data(queries.query_route_origins)
+
+origin = airport_selectbox(
+    "Choose Departure Airport (Origin)", df_airports["faa"], index=0)
+
+# only destinations with flights from the chosen origin are offered
+route_index = dimensions.get_route_index(DB_PATH)
+dest_order = st.sidebar.radio(
+    "Sort destinations by", ["Traffic", "Code"], horizontal=True)
+served_destinations = route_index.destinations(
+    origin, sort_by=dest_order.lower())
+if not served_destinations:
+    st.warning(f"No flights depart from {origin}.")
+    st.stop()
+
+dest = airport_selectbox(
+    "Choose Arrival Airport (Destination)", served_destinations, index=0,
+    searchable=True)
+if dest is None:
+    st.stop()
+with st.sidebar.expander("Export flights"):
+    export_button({"origin": origin, "dest": dest}, "route")
+
+# plotly is imported once the route is picked; the sidebar shows first
+import plotly.express as px
+import plotly.graph_objects as go
 
 st.write(f"### Selected Route: {origin} \u27a1 {dest}")
 
 st.markdown("---")
 
-route_query = f"""
-SELECT 
-    COUNT(*) as flight_count,
-    AVG(dep_delay) as avg_dep_delay,
-    AVG(arr_delay) as avg_arr_delay,
-    AVG(distance) as avg_distance
-FROM flights
-WHERE origin = '{origin}'
-  AND dest = '{dest}';
-"""
-df_route_stats = load_data(route_query)
+if route_index.flight_count(origin, dest) == 0:
+    # empty route, answered from the index without querying flights
+    df_route_stats = pd.DataFrame()
+else:
+    df_route_stats = flight_cube.route_stats(origin, dest, DB_PATH)
 
 if df_route_stats.empty or df_route_stats["flight_count"][0] == 0:
     st.warning("No flights found for the selected route.")
@@ -489,14 +378,7 @@ else:
         st.markdown("<div>", unsafe_allow_html=True)
         st.subheader("Flight Route Map")
 
-        route_query = f"""
-        SELECT a1.lat AS origin_lat, a1.lon AS origin_lon, 
-               a2.lat AS dest_lat, a2.lon AS dest_lon, 
-            a2.tzone AS dest_tzone
-        FROM airports a1
-        JOIN airports a2 ON a1.faa = '{origin}' AND a2.faa = '{dest}'
-        """
-        route_data = load_data(route_query)
+        route_data = load_data(queries.query_route_coordinates(origin, dest))
 
         if not route_data.empty:
             origin_lat = route_data["origin_lat"].iloc[0]
@@ -670,15 +552,13 @@ else:
 
     st.markdown("---")
 
-    hist_query = f"""
-    SELECT dep_delay
-    FROM flights
-    WHERE origin = '{origin}' AND dest = '{dest}'
-      AND dep_delay IS NOT NULL
-    """
-    df_hist = load_data(hist_query)
+    df_hist = load_data(
+        queries.query_route_dep_delays(origin, dest), typed=True)
 
     if not df_hist.empty:
+        # only this chart uses altair, so it is imported on first use
+        import altair as alt
+
         chart = (
             alt.Chart(df_hist)
             .mark_bar(color="#4682B4")
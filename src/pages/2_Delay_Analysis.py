@@ -1,13 +1,19 @@
-import math
 import streamlit as st
 import pandas as pd
-import sqlite3
+import db
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from textwrap import dedent
 import os
+import weather_join
+import weather_cube
+import wind
+import dimensions
+import prefix_sums
+import queries
+import query_cache
+import table_versions
+import warmup
+from widgets import airport_selectbox, export_button, flight_picker
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "..",
                        "..", "flights_database.db")
@@ -91,13 +97,27 @@ st.markdown("""
 
 
 def get_connection():
-    return sqlite3.connect(DB_PATH)
+    return db.connect(DB_PATH)
+
+
+def run_query(query, typed=False):
+    # results are shared by all sessions, see query_cache.py
+    return query_cache.read_sql(query, DB_PATH, typed)
+
+
+warmup.start(DB_PATH)
 
 
-def run_query(query):
+@st.cache_resource(max_entries=1)
+def get_weather_cube(weather_version):
+    """
+    Memory-mapped hourly weather per NYC origin of the `weather` table at
+    `weather_version` (table_versions.versions), shared by all sessions.
+    """
     conn = get_connection()
     try:
-        return pd.read_sql_query(query, conn)
+        return weather_cube.ensure_weather_cube(
+            conn, DB_PATH, weather_version=weather_version)
     finally:
         conn.close()
 
@@ -115,19 +135,9 @@ analysis_mode = st.radio(
 
 st.sidebar.header("Filters")
 
-nyc_airports_query = """
-SELECT DISTINCT faa, name
-FROM airports
-WHERE faa IN ('JFK', 'LGA', 'EWR')
-"""
-nyc_airports = run_query(nyc_airports_query)
-
-date_range_query = """
-SELECT MIN(year || '-' || PRINTF('%02d', month) || '-' || PRINTF('%02d', day)) as min_date,
-       MAX(year || '-' || PRINTF('%02d', month) || '-' || PRINTF('%02d', day)) as max_date
-FROM flights
-"""
-date_range = run_query(date_range_query)
+nyc_airports = run_query(queries.query_nyc_airports)
+
+date_range = run_query(queries.query_date_range)
 min_date = datetime.strptime(date_range['min_date'][0], '%Y-%m-%d').date()
 max_date = datetime.strptime(date_range['max_date'][0], '%Y-%m-%d').date()
 
@@ -140,35 +150,24 @@ start_date_str = start_date.strftime('%Y-%m-%d')
 end_date_str = end_date.strftime('%Y-%m-%d')
 
 
+# plotly loads after the filters are on screen
+import plotly.graph_objects as go
+
 # AIRPORT ANALYSIS MODE
 if analysis_mode == "Airport Analysis":
     st.sidebar.subheader("Airport Selection")
-    origin_airport = st.sidebar.selectbox(
-        "Select Airport", nyc_airports['faa'],
-        format_func=lambda x: f"{x} - {nyc_airports[nyc_airports['faa'] == x]['name'].values[0]}")
-
-    # Query for airport data
-    airport_query = f"""
-    SELECT
-        f.year, f.month, f.day,
-        f.dep_time, f.dep_delay,
-        f.arr_delay, f.carrier,
-        f.origin, f.dest,
-        f.distance,
-        al.name as airline_name
-    FROM
-        flights f
-    JOIN
-        airlines al ON f.carrier = al.carrier
-    WHERE
-        f.origin = '{origin_airport}'
-        AND date(f.year || '-' || PRINTF('%02d', f.month) || '-' || PRINTF('%02d', f.day))
-            BETWEEN date('{start_date_str}') AND date('{end_date_str}')
-    """
-
-    airport_data = run_query(airport_query)
-
-    if airport_data.empty:
+    origin_airport = airport_selectbox("Select Airport", nyc_airports['faa'])
+    with st.sidebar.expander("Export flights"):
+        export_button({"origin": origin_airport, "start": start_date_str,
+                       "end": end_date_str}, "delay_airport")
+
+    # metrics of any date range from the cumulative daily sums; the charts
+    # get one row per day and at most five destinations from the database
+    airport_metrics = prefix_sums.get_prefix_sums(DB_PATH).kpis(
+        "origin", origin_airport, start_date, end_date)
+    total_flights = airport_metrics['total_flights']
+
+    if total_flights == 0:
         st.warning(
             f"No flights found for {origin_airport} in the selected date range.")
     else:
@@ -178,15 +177,9 @@ if analysis_mode == "Airport Analysis":
             st.markdown("<div>", unsafe_allow_html=True)
             st.subheader("Airport Metrics")
 
-            total_flights = len(airport_data)
-            avg_dep_delay = airport_data['dep_delay'].mean(
-            ) if not airport_data['dep_delay'].empty else 0
-            avg_arr_delay = airport_data['arr_delay'].mean(
-            ) if not airport_data['arr_delay'].empty else 0
-            delayed_flights = airport_data[airport_data['dep_delay']
-                                           > 15].shape[0]
-            delay_rate = (delayed_flights / total_flights) * \
-                100 if total_flights > 0 else 0
+            avg_dep_delay = np.nan_to_num(airport_metrics['avg_dep_delay'])
+            avg_arr_delay = np.nan_to_num(airport_metrics['avg_arr_delay'])
+            delay_rate = airport_metrics['delay_rate']
 
             is_avg_dep_delay = avg_dep_delay > 0
             is_avg_arr_delay = avg_arr_delay > 0
@@ -204,14 +197,11 @@ if analysis_mode == "Airport Analysis":
             st.markdown("<div>", unsafe_allow_html=True)
             st.subheader("Daily Delay Distribution")
 
-            # Group by date and calculate average delays
-            daily_delays = airport_data.copy()
+            # Average delays per day, grouped in the database
+            daily_delays = run_query(queries.query_airport_daily_delays(
+                origin_airport, start_date_str, end_date_str))
             daily_delays['date'] = pd.to_datetime(
                 daily_delays[['year', 'month', 'day']])
-            daily_delays = daily_delays.groupby('date').agg({
-                'dep_delay': 'mean',
-                'arr_delay': 'mean'
-            }).reset_index()
 
             fig_daily = go.Figure()
             fig_daily.add_trace(go.Bar(
@@ -255,37 +245,17 @@ if analysis_mode == "Airport Analysis":
         delay_column = 'dep_delay' if delay_type == "Departure Delays" else 'arr_delay'
         chart_color = '#1E3A8A' if delay_type == "Departure Delays" else '#E1A95F'
 
-        top_delayed_destinations = (
-            airport_data.groupby(['dest'])
-            .agg({
-                delay_column: ['mean', 'count'],
-                'airline_name': 'first'
-            })
-            .reset_index()
-        )
-
-        top_delayed_destinations.columns = [
-            'dest', 'avg_delay', 'flight_count', 'airline_name']
-
-        top_delayed_destinations = top_delayed_destinations[
-            top_delayed_destinations['flight_count'] >= 10]
-
-        top_delayed_destinations = top_delayed_destinations.sort_values(
-            'avg_delay', ascending=False).head(5)
+        # destinations with at least 10 flights, highest mean delay first
+        top_delayed_destinations = run_query(
+            queries.query_airport_delayed_destinations(
+                origin_airport, start_date_str, end_date_str, delay_column))
 
         if not top_delayed_destinations.empty:
-            airports_query = f"""
-            SELECT faa, name 
-            FROM airports 
-            WHERE faa IN ({', '.join([f"'{dest}'" for dest in top_delayed_destinations['dest']])})
-            """
-            destination_airports = run_query(airports_query)
+            airport_names = dimensions.get_dimensions(DB_PATH).airport_names(
+                top_delayed_destinations['dest']).fillna('Unknown Airport')
 
-            airport_names = dict(
-                zip(destination_airports['faa'], destination_airports['name']))
-
-            top_delayed_destinations['airport_name'] = top_delayed_destinations['dest'].map(
-                lambda code: f"{code} - {airport_names.get(code, 'Unknown Airport')}")
+            top_delayed_destinations['airport_name'] = (
+                top_delayed_destinations['dest'].astype(str) + " - " + airport_names)
 
             fig_top_delays = go.Figure()
 
@@ -347,37 +317,51 @@ if analysis_mode == "Airport Analysis":
 elif analysis_mode == "Specific Route Analysis":
     st.sidebar.subheader("Route Selection")
 
-    dest_airports_query = """
-    SELECT DISTINCT a.faa, a.name, a.tzone
-    FROM airports a
-    JOIN flights f ON a.faa = f.dest
-    WHERE f.origin IN ('JFK', 'LGA', 'EWR')
-    ORDER BY a.name
-    """
-    dest_airports = run_query(dest_airports_query)
-
-    origin_airport = st.sidebar.selectbox(
-        "Departure Airport",
-        nyc_airports['faa'],
-        format_func=lambda x: f"{x} - {nyc_airports[nyc_airports['faa'] == x]['name'].values[0]}")
-
-    dest_airport = st.sidebar.selectbox(
-        "Arrival Airport",
-        dest_airports['faa'],
-        format_func=lambda x: f"{x} - {dest_airports[dest_airports['faa'] == x]['name'].values[0]}"
-    )
-
-    dest_tzone = dest_airports[dest_airports['faa']
-                               == dest_airport]['tzone'].values[0]
+    origin_airport = airport_selectbox("Departure Airport", nyc_airports['faa'])
+
+    # destinations served from the chosen origin, from the shared route
+    # index; those missing from `airports` (e.g. SJU) have no coordinates
+    # or time zone, and the route query joins airports
+    known_airports = dimensions.get_dimensions(DB_PATH).airports.index
+    destinations = [
+        dest for dest in
+        dimensions.get_route_index(DB_PATH).destinations(origin_airport)
+        if dest in known_airports]
+    if not destinations:
+        st.warning(f"No destinations with airport data from {origin_airport}.")
+        st.stop()
+    dest_airport = airport_selectbox("Arrival Airport", destinations,
+                                     searchable=True)
+    if dest_airport is None:
+        st.stop()
+    with st.sidebar.expander("Export flights"):
+        export_button({"origin": origin_airport, "dest": dest_airport,
+                       "start": start_date_str, "end": end_date_str},
+                      "delay_route")
+
+    dest_tzone = dimensions.get_dimensions(
+        DB_PATH).airports.at[dest_airport, 'tzone']
+
+    # the wind columns are filled by the Wind components job (jobs.py)
+    conn = get_connection()
+    try:
+        wind_ready = wind.has_wind_columns(conn)
+    finally:
+        conn.close()
+    wind_columns = ("f.route_bearing, f.headwind, f.crosswind" if wind_ready
+                    else "NULL AS route_bearing, NULL AS headwind, "
+                         "NULL AS crosswind")
 
     # Query for Route data
     route_query = f"""
     SELECT
+        f.rowid AS flight_rowid,
         f.year, f.month, f.day,
         f.dep_time, f.sched_dep_time, f.dep_delay,
         f.arr_time, f.sched_arr_time, f.arr_delay,
         f.carrier, f.flight, f.tailnum, f.origin, f.dest,
         f.air_time, f.distance,
+        {wind_columns},
         al.name as airline_name,
         orig.name as origin_name, orig.lat as origin_lat, orig.lon as origin_lon,
         dest.name as dest_name, dest.lat as dest_lat, dest.lon as dest_lon,
@@ -398,24 +382,10 @@ elif analysis_mode == "Specific Route Analysis":
     ORDER BY
         f.year, f.month, f.day, f.dep_time
     """
-    route_data = run_query(route_query)
-
-    # Query for weather data
-    weather_query = f"""
-    SELECT
-        w.origin, w.year, w.month, w.day, w.hour,
-        w.temp, w.dewp, w.humid, w.wind_dir, w.wind_speed, w.wind_gust,
-        w.precip, w.pressure, w.visib
-    FROM
-        weather w
-    WHERE
-        w.origin = '{origin_airport}'
-        AND date(w.year || '-' || PRINTF('%02d', w.month) || '-' || PRINTF('%02d', w.day))
-            BETWEEN date('{start_date_str}') AND date('{end_date_str}')
-    ORDER BY
-        w.year, w.month, w.day, w.hour
-    """
-    weather_data = run_query(weather_query)
+    route_data = run_query(route_query, typed=True)
+    if not wind_ready:
+        st.info("Headwind and crosswind are not computed yet: run the "
+                "*Wind components* job on the Background Jobs page.")
 
     if route_data.empty:
         st.warning(
@@ -427,14 +397,12 @@ elif analysis_mode == "Specific Route Analysis":
             st.markdown("<div>", unsafe_allow_html=True)
             st.subheader("Route Metrics")
 
-            total_flights = len(route_data)
-            avg_dep_delay = route_data['dep_delay'].mean(
-            ) if not route_data['dep_delay'].empty else 0
-            avg_arr_delay = route_data['arr_delay'].mean(
-            ) if not route_data['arr_delay'].empty else 0
-            delayed_flights = route_data[route_data['dep_delay'] > 15].shape[0]
-            delay_rate = (delayed_flights / total_flights) * \
-                100 if total_flights > 0 else 0
+            route_metrics = prefix_sums.get_prefix_sums(DB_PATH).kpis(
+                "route", (origin_airport, dest_airport), start_date, end_date)
+            total_flights = route_metrics['total_flights']
+            avg_dep_delay = np.nan_to_num(route_metrics['avg_dep_delay'])
+            avg_arr_delay = np.nan_to_num(route_metrics['avg_arr_delay'])
+            delay_rate = route_metrics['delay_rate']
 
             message_dep = "Average Departure Delay" if avg_dep_delay > 0 else "Average Early Departure"
             message_arr = "Average Arrival Delay" if avg_arr_delay > 0 else "Average Early Arrival"
@@ -573,292 +541,222 @@ elif analysis_mode == "Specific Route Analysis":
                 route_data = route_data.sort_values(
                     by=['year', 'month', 'day', 'dep_time'])
 
-            flight_ids = route_data.index.tolist()
+            selected_flight_id = flight_picker(
+                route_data,
+                route_key=(origin_airport, dest_airport,
+                           start_date_str, end_date_str),
+                db_path=DB_PATH)
 
-            flight_labels = []
-            for idx in flight_ids:
-                flight_row = route_data.loc[idx]
+            if selected_flight_id is not None:
+                flight_row = route_data.loc[selected_flight_id]
 
-                flight_date = f"{flight_row['year']}-{flight_row['month']:02d}-{flight_row['day']:02d}"
-
-                dep_time = flight_row.get('dep_time', '')
-                if pd.notna(dep_time) and dep_time != '':
-                    dep_time_str = str(int(dep_time)).zfill(4) if isinstance(
-                        dep_time, (int, float)) else str(dep_time).zfill(4)
-                    dep_time_formatted = f"{dep_time_str[:2]}:{dep_time_str[2:]}"
-                else:
-                    dep_time_formatted = "N/A"
-
-                arr_time = flight_row.get('arr_time', '')
-                if pd.notna(arr_time) and arr_time != '':
-                    arr_time_str = str(int(arr_time)).zfill(4) if isinstance(
-                        arr_time, (int, float)) else str(arr_time).zfill(4)
-                    arr_time_formatted = f"{arr_time_str[:2]}:{arr_time_str[2:]}"
-                else:
-                    arr_time_formatted = "N/A"
-
-                dep_delay = flight_row.get('dep_delay', 0)
-                arr_delay = flight_row.get('arr_delay', 0)
-
-                delay_status = ""
-                if pd.notna(dep_delay) and dep_delay > 15:
-                    delay_status = " [DEPARTURE DELAYED]"
-                elif pd.notna(arr_delay) and arr_delay > 15:
-                    delay_status = " [ARRIVAL DELAYED]"
-
-                label = f"{flight_date} | Flight {flight_row['carrier']}{flight_row['flight']} | "
-                label += f"Dep: {dep_time_formatted} → Arr: {arr_time_formatted} | "
-                label += f"Tail: {flight_row.get('tailnum', 'N/A')}{delay_status}"
-
-                flight_labels.append(label)
-
-            flight_options = dict(zip(flight_labels, flight_ids))
-
-            selected_flight_label = st.selectbox(
-                "Choose a flight to view its wind direction analysis:",
-                options=flight_labels,
-                index=0,
-            )
+                dep_time_str = str(int(flight_row.get('dep_time', 0))).zfill(4)
+                dep_time_formatted = f"{dep_time_str[:2]}:{dep_time_str[2:]}"
 
-            flight_row = route_data.loc[flight_options[selected_flight_label]]
+                arr_time_str = str(int(flight_row.get('arr_time', 0))).zfill(4)
+                arr_time_formatted = f"{arr_time_str[:2]}:{arr_time_str[2:]}"
 
-            dep_time_str = str(int(flight_row.get('dep_time', 0))).zfill(4)
-            dep_time_formatted = f"{dep_time_str[:2]}:{dep_time_str[2:]}"
-
-            arr_time_str = str(int(flight_row.get('arr_time', 0))).zfill(4)
-            arr_time_formatted = f"{arr_time_str[:2]}:{arr_time_str[2:]}"
-
-            flight_date = f"{flight_row['year']}-{flight_row['month']:02d}-{flight_row['day']:02d}"
+                flight_date = f"{flight_row['year']}-{flight_row['month']:02d}-{flight_row['day']:02d}"
 
-            is_delayed = False
-            delay_badge = ""
+                is_delayed = False
+                delay_badge = ""
 
-            if pd.notna(flight_row.get('dep_delay', 0)) and flight_row.get('dep_delay', 0) > 15:
-                is_delayed = True
-                delay_badge = "<span class='delay-badge'>DELAYED</span>"
-            else:
-                delay_badge = "<span class='on-time-badge'>ON TIME</span>"
-
-            st.markdown(f"""
-            <div class="flight-info-card">
-                <h4>Flight {flight_row['carrier']}{flight_row['flight']} {delay_badge}</h4>
-                <div class="flight-detail"><strong>Date:</strong> {flight_date}</div>
-                <div class="flight-detail"><strong>Departure:</strong> {dep_time_formatted} | <strong>Arrival:</strong> {arr_time_formatted}</div>
-            </div>
-            """, unsafe_allow_html=True)
-
-            selected_flight_id = flight_options[selected_flight_label]
-            selected_flight = route_data.loc[selected_flight_id]
-
-            origin_lat = selected_flight['origin_lat'] if 'origin_lat' in selected_flight else origin_lat
-            origin_lon = selected_flight['origin_lon'] if 'origin_lon' in selected_flight else origin_lon
-            dest_lat = selected_flight['dest_lat'] if 'dest_lat' in selected_flight else dest_lat
-            dest_lon = selected_flight['dest_lon'] if 'dest_lon' in selected_flight else dest_lon
-
-            # Get weather data for the selected flight
-            if pd.notna(selected_flight['dep_time']) and selected_flight['dep_time'] != '':
-                if isinstance(selected_flight['dep_time'], (int, float)):
-                    dep_hour = int(selected_flight['dep_time'] // 100)
+                if pd.notna(flight_row.get('dep_delay', 0)) and flight_row.get('dep_delay', 0) > 15:
+                    is_delayed = True
+                    delay_badge = "<span class='delay-badge'>DELAYED</span>"
                 else:
+                    delay_badge = "<span class='on-time-badge'>ON TIME</span>"
+
+                st.markdown(f"""
+                <div class="flight-info-card">
+                    <h4>Flight {flight_row['carrier']}{flight_row['flight']} {delay_badge}</h4>
+                    <div class="flight-detail"><strong>Date:</strong> {flight_date}</div>
+                    <div class="flight-detail"><strong>Departure:</strong> {dep_time_formatted} | <strong>Arrival:</strong> {arr_time_formatted}</div>
+                </div>
+                """, unsafe_allow_html=True)
+
+                selected_flight = route_data.loc[selected_flight_id]
+
+                origin_lat = selected_flight['origin_lat'] if 'origin_lat' in selected_flight else origin_lat
+                origin_lon = selected_flight['origin_lon'] if 'origin_lon' in selected_flight else origin_lon
+                dest_lat = selected_flight['dest_lat'] if 'dest_lat' in selected_flight else dest_lat
+                dest_lon = selected_flight['dest_lon'] if 'dest_lon' in selected_flight else dest_lon
+
+                # Get the weather nearest to the selected flight's departure
+                # from the flight-weather mapping (built by the warm-up); the
+                # weather cube answers until it is current
+                if weather_join.is_current(DB_PATH):
+                    conn = get_connection()
                     try:
-                        dep_hour = int(str(selected_flight['dep_time'])[:2])
-                    except:
-                        dep_hour = 12
-            else:
-                if pd.notna(selected_flight['sched_dep_time']) and selected_flight['sched_dep_time'] != '':
-                    if isinstance(selected_flight['sched_dep_time'], (int, float)):
-                        dep_hour = int(
-                            selected_flight['sched_dep_time'] // 100)
-                    else:
-                        try:
-                            dep_hour = int(
-                                str(selected_flight['sched_dep_time'])[:2])
-                        except:
-                            dep_hour = 12
+                        selected_weather_data = weather_join.weather_for_flights(
+                            conn, [selected_flight['flight_rowid']])
+                    finally:
+                        conn.close()
                 else:
-                    dep_hour = 12
-
-            selected_weather_data = weather_data[
-                (weather_data['year'] == selected_flight['year']) &
-                (weather_data['month'] == selected_flight['month']) &
-                (weather_data['day'] == selected_flight['day'])
-            ]
-
-            if not selected_weather_data.empty and 'hour' in selected_weather_data.columns:
-                selected_weather_data['hour_diff'] = abs(
-                    selected_weather_data['hour'] - dep_hour)
-                min_hour_diff = selected_weather_data['hour_diff'].min()
-                selected_weather_data = selected_weather_data[
-                    selected_weather_data['hour_diff'] == min_hour_diff]
-
-            wind_cols = st.columns(2)
-
-            with wind_cols[0]:
-                def calculate_bearing(lat1, lon1, lat2, lon2):
-                    lat1, lon1, lat2, lon2 = map(
-                        math.radians, [lat1, lon1, lat2, lon2])
-                    dlon = lon2 - lon1
-                    y = math.sin(dlon) * math.cos(lat2)
-                    x = math.cos(lat1) * math.sin(lat2) - \
-                        math.sin(lat1) * math.cos(lat2) * \
-                        math.cos(dlon)
-                    initial_bearing = math.atan2(y, x)
-                    initial_bearing = math.degrees(initial_bearing)
-                    compass_bearing = (initial_bearing + 360) % 360
-                    return compass_bearing
-
-                flight_bearing = calculate_bearing(
-                    origin_lat, origin_lon,
-                    dest_lat, dest_lon
-                )
-
-                if not selected_weather_data.empty:
-                    wind_data = selected_weather_data.dropna(
-                        subset=['wind_dir', 'wind_speed'])
-
-                    if not wind_data.empty:
-                        avg_wind_dir = wind_data['wind_dir'].mean()
-                        avg_wind_speed = wind_data['wind_speed'].mean()
-
-                        wind_flight_angle = (
-                            avg_wind_dir - flight_bearing + 360) % 360
-
-                        is_favorable = (wind_flight_angle < 45) or (
-                            wind_flight_angle > 315)
-
-                        fig_polar = go.Figure()
-
-                        fig_polar.add_trace(go.Scatterpolar(
-                            r=[0, 1],
-                            theta=[flight_bearing, flight_bearing],
-                            mode='lines',
-                            line=dict(color='#4285F4', width=4),
-                            name=f'Flight Direction ({flight_bearing:.1f}°)'
-                        ))
-
-                        fig_polar.add_trace(go.Scatterpolar(
-                            r=[0, avg_wind_speed /
-                                max(wind_data['wind_speed'].max(), 1)],
-                            theta=[avg_wind_dir, avg_wind_dir],
-                            mode='lines',
-                            line=dict(color='#FBBC05', width=4),
-                            name=f'Wind Direction ({avg_wind_dir:.1f}°)'
-                        ))
-
-                        fig_polar.update_layout(
-                            polar=dict(
-                                radialaxis=dict(visible=True, range=[0, 1]),
-                                angularaxis=dict(
-                                    tickmode='array',
-                                    tickvals=[0, 45, 90, 135,
-                                              180, 225, 270, 315],
-                                    ticktext=['N', 'NE', 'E', 'SE',
-                                              'S', 'SW', 'W', 'NW'],
-                                    direction="clockwise",
-                                    rotation=90
-                                )
-                            ),
-                            showlegend=True,
-                            height=400
-                        )
-
-                        st.plotly_chart(fig_polar, use_container_width=True)
+                    departure = weather_join.departure_timestamps(
+                        route_data.loc[[selected_flight_id]]).iloc[0]
+                    cube = get_weather_cube(
+                        table_versions.versions(DB_PATH, ["weather"])[0])
+                    selected_weather_data = cube.lookup(
+                        [origin_airport], [departure])
+
+                wind_cols = st.columns(2)
+
+                with wind_cols[0]:
+                    # bearing and wind components are precomputed on `flights`
+                    flight_bearing = selected_flight['route_bearing']
+                    headwind = selected_flight['headwind']
+                    crosswind = selected_flight['crosswind']
+
+                    if not selected_weather_data.empty:
+                        wind_data = selected_weather_data.dropna(
+                            subset=['wind_dir', 'wind_speed'])
+                        if pd.isna(headwind):
+                            wind_data = wind_data.iloc[0:0]
+
+                        if not wind_data.empty:
+                            avg_wind_dir = wind_data['wind_dir'].mean()
+                            avg_wind_speed = wind_data['wind_speed'].mean()
+
+                            wind_flight_angle = (
+                                avg_wind_dir - flight_bearing + 360) % 360
+
+                            # a tailwind (negative headwind) is favorable
+                            is_favorable = headwind < 0
+
+                            fig_polar = go.Figure()
+
+                            fig_polar.add_trace(go.Scatterpolar(
+                                r=[0, 1],
+                                theta=[flight_bearing, flight_bearing],
+                                mode='lines',
+                                line=dict(color='#4285F4', width=4),
+                                name=f'Flight Direction ({flight_bearing:.1f}°)'
+                            ))
+
+                            fig_polar.add_trace(go.Scatterpolar(
+                                r=[0, avg_wind_speed /
+                                    max(wind_data['wind_speed'].max(), 1)],
+                                theta=[avg_wind_dir, avg_wind_dir],
+                                mode='lines',
+                                line=dict(color='#FBBC05', width=4),
+                                name=f'Wind Direction ({avg_wind_dir:.1f}°)'
+                            ))
+
+                            fig_polar.update_layout(
+                                polar=dict(
+                                    radialaxis=dict(visible=True, range=[0, 1]),
+                                    angularaxis=dict(
+                                        tickmode='array',
+                                        tickvals=[0, 45, 90, 135,
+                                                  180, 225, 270, 315],
+                                        ticktext=['N', 'NE', 'E', 'SE',
+                                                  'S', 'SW', 'W', 'NW'],
+                                        direction="clockwise",
+                                        rotation=90
+                                    )
+                                ),
+                                showlegend=True,
+                                height=400
+                            )
+
+                            st.plotly_chart(fig_polar, use_container_width=True)
+                        else:
+                            st.warning(
+                                "No wind data available for the selected flight.")
                     else:
                         st.warning(
-                            "No wind data available for the selected flight.")
-                else:
-                    st.warning(
-                        "No weather data available for wind direction analysis.")
-
-            with wind_cols[1]:
-                if not wind_data.empty:
-                    wind_impact = "favorable" if is_favorable else "unfavorable"
-                    wind_angle_formatted = f"{wind_flight_angle:.1f}°"
-
-                    st.markdown("""
-                    <style>
-                    .box {
-                        background-color: white;
-                        border-radius: 8px;
-                        padding: 15px;
-                        box-shadow: 0 1px 3px rgba(0,0,0,0.12), 0 1px 2px rgba(0,0,0,0.24);
-                        margin-bottom: 20px; /* Space under each box if you stack them */
-                        height: 100%; /* Make all boxes the same height */
-                    }
-                    .box-title {
-                        font-size: 16px;
-                        color: #5B5B5B;
-                        font-weight: 500;
-                        margin-bottom: 5px;
-                    }
-                    .box-value {
-                        font-size: 24px;
-                        font-weight: 600;
-                        margin-bottom: 5px;
-                    }
-                    .box-subtitle {
-                        font-size: 14px;
-                        color: #5B5B5B;
-                    }
-                    .favorable {
-                        color: #34A853;
-                    }
-                    .unfavorable {
-                        color: #EA4335;
-                    }
-                    </style>
-                    """, unsafe_allow_html=True)
-
-                    # First row
-                    row1_col1, row1_col2 = st.columns(2, gap="medium")
-
-                    # Second row
-                    row2_col1, row2_col2 = st.columns(2, gap="medium")
-
-                    # Place each info-box in its own column to create a 2x2 grid
-                    with row1_col1:
-                        st.markdown(f"""
-                        <div class="box">
-                            <div class="box-title">Flight Direction</div>
-                            <div class="box-value">{flight_bearing:.1f}°</div>
-                            <div class="box-subtitle">Where the flight is heading to</div>
-                        </div>
-                        """, unsafe_allow_html=True)
+                            "No weather data available for wind direction analysis.")
 
-                    with row1_col2:
-                        st.markdown(f"""
-                        <div class="box">
-                            <div class="box-title">Wind Direction</div>
-                            <div class="box-value">{avg_wind_dir:.1f}°</div>
-                            <div class="box-subtitle">Where the wind is going to</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                    with row2_col1:
-                        st.markdown(f"""
-                        <div class="box">
-                            <div class="box-title">Wind Speed</div>
-                            <div class="box-value">{avg_wind_speed:.1f} knots</div>
-                            <div class="box-subtitle">Average during flight time</div>
-                        </div>
+                with wind_cols[1]:
+                    if not wind_data.empty:
+                        wind_impact = "favorable" if is_favorable else "unfavorable"
+                        wind_angle_formatted = f"{wind_flight_angle:.1f}°"
+
+                        st.markdown("""
+                        <style>
+                        .box {
+                            background-color: white;
+                            border-radius: 8px;
+                            padding: 15px;
+                            box-shadow: 0 1px 3px rgba(0,0,0,0.12), 0 1px 2px rgba(0,0,0,0.24);
+                            margin-bottom: 20px; /* Space under each box if you stack them */
+                            height: 100%; /* Make all boxes the same height */
+                        }
+                        .box-title {
+                            font-size: 16px;
+                            color: #5B5B5B;
+                            font-weight: 500;
+                            margin-bottom: 5px;
+                        }
+                        .box-value {
+                            font-size: 24px;
+                            font-weight: 600;
+                            margin-bottom: 5px;
+                        }
+                        .box-subtitle {
+                            font-size: 14px;
+                            color: #5B5B5B;
+                        }
+                        .favorable {
+                            color: #34A853;
+                        }
+                        .unfavorable {
+                            color: #EA4335;
+                        }
+                        </style>
                         """, unsafe_allow_html=True)
 
-                    with row2_col2:
-                        # Calculate estimated fuel impact and time impact based on wind conditions
-                        if is_favorable:
-                            fuel_impact = "Expected lower fuel consumption"
-                            icon = "↗️"  # Up arrow for favorable
-                        else:
-                            fuel_impact = "Expected higher fuel consumption"
-                            icon = "↘️"  # Down arrow for unfavorable
-
-                        st.markdown(f"""
-                        <div class="box">
-                            <div class="box-title">Wind Impact</div>
-                            <div class="box-value {wind_impact.lower()}">{wind_impact.capitalize()} {icon}</div>
-                            <div class="box-subtitle">{fuel_impact}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
+                        # First row
+                        row1_col1, row1_col2 = st.columns(2, gap="medium")
+
+                        # Second row
+                        row2_col1, row2_col2 = st.columns(2, gap="medium")
+
+                        # Place each info-box in its own column to create a 2x2 grid
+                        with row1_col1:
+                            st.markdown(f"""
+                            <div class="box">
+                                <div class="box-title">Flight Direction</div>
+                                <div class="box-value">{flight_bearing:.1f}°</div>
+                                <div class="box-subtitle">Where the flight is heading to</div>
+                            </div>
+                            """, unsafe_allow_html=True)
+
+                        with row1_col2:
+                            st.markdown(f"""
+                            <div class="box">
+                                <div class="box-title">Wind Direction</div>
+                                <div class="box-value">{avg_wind_dir:.1f}°</div>
+                                <div class="box-subtitle">Where the wind is coming from</div>
+                            </div>
+                            """, unsafe_allow_html=True)
+
+                        with row2_col1:
+                            st.markdown(f"""
+                            <div class="box">
+                                <div class="box-title">Wind Speed</div>
+                                <div class="box-value">{avg_wind_speed * wind.MPH_TO_KNOTS:.1f} knots</div>
+                                <div class="box-subtitle">Headwind {headwind:+.1f} kn, crosswind {crosswind:+.1f} kn</div>
+                            </div>
+                            """, unsafe_allow_html=True)
+
+                        with row2_col2:
+                            # Calculate estimated fuel impact and time impact based on wind conditions
+                            if is_favorable:
+                                fuel_impact = "Expected lower fuel consumption"
+                                icon = "↗️"  # Up arrow for favorable
+                            else:
+                                fuel_impact = "Expected higher fuel consumption"
+                                icon = "↘️"  # Down arrow for unfavorable
+
+                            st.markdown(f"""
+                            <div class="box">
+                                <div class="box-title">Wind Impact</div>
+                                <div class="box-value {wind_impact.lower()}">{wind_impact.capitalize()} {icon}</div>
+                                <div class="box-subtitle">{fuel_impact}</div>
+                            </div>
+                            """, unsafe_allow_html=True)
 
         else:
             st.warning(
@@ -1,17 +1,16 @@
 import streamlit as st
-import sqlite3
-import pandas as pd
-import altair as alt
 from datetime import datetime
 import os
+import flight_cube
+import queries
+import warmup
+from widgets import export_button
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "flights_database.db")
 
-
-def load_data(query):
-    with sqlite3.connect(DB_PATH) as conn:
-        df = pd.read_sql_query(query, conn)
-    return df
+# the daily aggregates come from the flight cube shared by all sessions,
+# see flight_cube.py
+warmup.start(DB_PATH)
 
 
 st.markdown(
@@ -75,19 +74,7 @@ st.markdown(
 
 
 def most_delayed_airlines(year, month, day):
-    query = f"""
-    SELECT f.carrier, a.name AS airline_name, AVG(f.arr_delay) as avg_arr_delay
-    FROM flights f
-    JOIN airlines a ON f.carrier = a.carrier
-    WHERE f.year = {year}
-      AND f.month = {month}
-      AND f.day = {day}
-      AND f.origin IN ('JFK','LGA','EWR')
-    GROUP BY f.carrier
-    ORDER BY avg_arr_delay DESC
-    LIMIT 10;
-    """
-    df = load_data(query)
+    df = flight_cube.day_delayed_airlines(year, month, day, path=DB_PATH)
     if not df.empty:
         chart = (
             alt.Chart(df)
@@ -104,19 +91,7 @@ def most_delayed_airlines(year, month, day):
 
 
 def top_destinations(year, month, day):
-    query = f"""
-    SELECT f.dest, a.name AS airport_name, COUNT(*) as flight_count
-    FROM flights f
-    JOIN airports a ON f.dest = a.faa
-    WHERE f.year = {year}
-      AND f.month = {month}
-      AND f.day = {day}
-      AND f.origin IN ('JFK','LGA','EWR')
-    GROUP BY f.dest
-    ORDER BY flight_count DESC
-    LIMIT 10;
-    """
-    df = load_data(query)
+    df = flight_cube.day_top_destinations(year, month, day, path=DB_PATH)
     if not df.empty:
         chart = (
             alt.Chart(df)
@@ -141,25 +116,20 @@ selected_date = st.date_input(
     max_value=datetime(2023, 12, 31),
 )
 
+# altair is only needed for the charts below the date picker
+import altair as alt
+
 if selected_date:
     year = selected_date.year
     month = selected_date.month
     day = selected_date.day
 
     st.write(f"**Selected date**: {selected_date.strftime('%Y-%m-%d')}")
+    with st.sidebar.expander("Export flights"):
+        export_button({"origin": queries.NYC_ORIGINS, "start": selected_date,
+                       "end": selected_date}, "date")
 
-    date_query = f"""
-    SELECT 
-        COUNT(*) as flight_count,
-        AVG(dep_delay) as avg_dep_delay,
-        AVG(arr_delay) as avg_arr_delay
-    FROM flights
-    WHERE year = {year}
-      AND month = {month}
-      AND day = {day}
-      AND origin IN ('JFK','LGA','EWR');
-    """
-    df_date_stats = load_data(date_query)
+    df_date_stats = flight_cube.day_stats(year, month, day, DB_PATH)
 
     flight_count = (
         int(df_date_stats["flight_count"][0]) if not df_date_stats.empty else 0
@@ -208,18 +178,7 @@ if selected_date:
                 unsafe_allow_html=True,
             )
 
-        airline_query = f"""
-        SELECT f.carrier, a.name AS airline_name, COUNT(*) as flight_count
-        FROM flights f
-        JOIN airlines a ON f.carrier = a.carrier
-        WHERE f.year = {year}
-          AND f.month = {month}
-          AND f.day = {day}
-          AND f.origin IN ('JFK','LGA','EWR')
-        GROUP BY f.carrier
-        ORDER BY flight_count DESC;
-        """
-        df_airline_date = load_data(airline_query)
+        df_airline_date = flight_cube.day_airlines(year, month, day, DB_PATH)
 
         if not df_airline_date.empty:
             date_bar = (
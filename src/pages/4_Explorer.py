@@ -0,0 +1,175 @@
+import streamlit as st
+import os
+import time
+import dimensions
+import flight_columns
+import queries
+import warmup
+from widgets import export_button
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..",
+                       "..", "flights_database.db")
+
+st.set_page_config(page_title="Flight Explorer",
+                   layout="wide", initial_sidebar_state="expanded")
+
+warmup.start(DB_PATH)
+
+
+st.markdown(
+    """
+<div style="display: flex; align-items: center; margin-bottom: 1rem;">
+    <div style="flex: 5;">
+        <h1>Flight Explorer 🔎</h1>
+        <p>Combine filters on airports, airlines, dates, departure hours and delays. Every chart follows all filters except its own, so you can see what else is in reach.</p>
+    </div>
+</div>
+""",
+    unsafe_allow_html=True,
+)
+
+# the flights columns and their bitmaps are loaded once per process and
+# shared by all sessions, see flight_columns.py
+columns = flight_columns.get_flight_columns(DB_PATH)
+dims = dimensions.get_dimensions(DB_PATH)
+airport_labels = dims.airport_labels
+carriers = columns.options("carrier")
+carrier_labels = dict(zip(carriers, dims.airline_names(carriers)))
+delay_categories = [category for category, _ in queries.DELAY_CATEGORIES]
+
+if len(columns) == 0:
+    st.warning("No flights in the database.")
+    st.stop()
+
+# ----------------------------
+# Filters
+# ----------------------------
+st.sidebar.header("Filters")
+selections = {
+    "origin": st.sidebar.multiselect(
+        "Origin airports", columns.options("origin"),
+        format_func=lambda code: airport_labels.get(code, code)),
+    "dest": st.sidebar.multiselect(
+        "Destination airports", columns.options("dest"),
+        format_func=lambda code: airport_labels.get(code, code)),
+    "carrier": st.sidebar.multiselect(
+        "Airlines", carriers,
+        format_func=lambda code: f"{carrier_labels[code]} ({code})"),
+}
+
+first_day, last_day = columns.first_day.date(), columns.last_day.date()
+date_range = st.sidebar.date_input("Dates", (first_day, last_day),
+                                   min_value=first_day, max_value=last_day)
+start_date, end_date = (date_range if len(date_range) == 2
+                        else (date_range[0], date_range[0]))
+
+first_hour, last_hour = st.sidebar.slider("Departure hour", 0, 24, (0, 24))
+# the full range keeps the flights without a departure time too
+if (first_hour, last_hour) != (0, 24):
+    selections["hour"] = list(range(first_hour, last_hour + 1))
+
+selections["delay_bucket"] = st.sidebar.multiselect(
+    "Arrival delay", delay_categories)
+
+with st.sidebar.expander("Export flights"):
+    export_button({"origin": selections["origin"], "dest": selections["dest"],
+                   "carrier": selections["carrier"],
+                   "hours": selections.get("hour"),
+                   "delay_buckets": selections["delay_bucket"],
+                   "start": start_date, "end": end_date}, "explorer")
+
+# ----------------------------
+# Aggregation
+# ----------------------------
+started = time.perf_counter()
+mask = columns.mask(selections, start_date, end_date)
+totals = columns.totals(mask)
+
+
+def by(dimension):
+    """Per value of `dimension`, under every filter but its own."""
+    return columns.by(dimension, columns.mask(
+        selections, start_date, end_date, exclude=dimension))
+
+
+df_origin = by("origin")
+df_dest = by("dest").head(15)
+df_carrier = by("carrier")
+df_hour = by("hour").dropna(subset=["hour"]).sort_values("hour")
+df_delay = by("delay_bucket").dropna(subset=["delay_bucket"])
+df_daily = columns.daily(mask)
+elapsed_ms = 1000 * (time.perf_counter() - started)
+
+df_origin["label"] = df_origin["origin"].map(
+    lambda code: airport_labels.get(code, code))
+df_dest["label"] = df_dest["dest"].map(
+    lambda code: airport_labels.get(code, code))
+df_carrier["label"] = df_carrier["carrier"].map(carrier_labels)
+df_hour["hour"] = df_hour["hour"].astype(int)
+
+col1, col2, col3 = st.columns(3)
+col1.metric("Flights", f"{int(totals['flights']):,}")
+col2.metric("Avg. Departure Delay", f"{totals['avg_dep_delay']:.1f} min"
+            if totals["flights"] else "N/A")
+col3.metric("Avg. Arrival Delay", f"{totals['avg_arr_delay']:.1f} min"
+            if totals["flights"] else "N/A")
+st.caption(f"{len(columns):,} flights filtered and aggregated in "
+           f"{elapsed_ms:.0f} ms")
+
+st.markdown("---")
+
+# ----------------------------
+# Charts
+# ----------------------------
+# plotly loads after the filters and totals are on screen
+import plotly.express as px
+
+hover = {"avg_dep_delay": ":.1f", "avg_arr_delay": ":.1f"}
+labels = {"flights": "Number of Flights",
+          "avg_dep_delay": "Avg. Departure Delay (min)",
+          "avg_arr_delay": "Avg. Arrival Delay (min)"}
+
+fig_daily = px.line(df_daily, x="date", y="flights", hover_data=hover,
+                    labels=dict(labels, date="Date"),
+                    title="Flights per Day", height=350)
+fig_daily.update_layout(template="plotly_white")
+st.plotly_chart(fig_daily, use_container_width=True)
+
+col_left, col_right = st.columns(2)
+with col_left:
+    fig_origin = px.bar(df_origin, x="label", y="flights", hover_data=hover,
+                        color="avg_dep_delay", labels=dict(labels, label="Origin"),
+                        title="Flights per Origin Airport", height=400)
+    fig_origin.update_layout(template="plotly_white")
+    st.plotly_chart(fig_origin, use_container_width=True)
+
+    fig_hour = px.bar(df_hour, x="hour", y="flights", hover_data=hover,
+                      color="avg_dep_delay",
+                      labels=dict(labels, hour="Departure Hour"),
+                      title="Flights per Departure Hour", height=400)
+    fig_hour.update_layout(template="plotly_white")
+    st.plotly_chart(fig_hour, use_container_width=True)
+
+with col_right:
+    fig_carrier = px.bar(df_carrier, x="flights", y="label", orientation="h",
+                         hover_data=hover, color="avg_arr_delay",
+                         labels=dict(labels, label="Airline"),
+                         title="Flights per Airline", height=400)
+    fig_carrier.update_layout(template="plotly_white",
+                              yaxis=dict(autorange="reversed"))
+    st.plotly_chart(fig_carrier, use_container_width=True)
+
+    fig_delay = px.bar(df_delay, x="delay_bucket", y="flights",
+                       category_orders={"delay_bucket": delay_categories},
+                       labels=dict(labels, delay_bucket="Arrival Delay"),
+                       title="Flights per Arrival Delay Category", height=400)
+    fig_delay.update_layout(template="plotly_white")
+    st.plotly_chart(fig_delay, use_container_width=True)
+
+fig_dest = px.bar(df_dest, x="flights", y="label", orientation="h",
+                  hover_data=hover, color="avg_arr_delay",
+                  labels=dict(labels, label="Destination"),
+                  title="Top 15 Destinations", height=500)
+fig_dest.update_layout(template="plotly_white",
+                       yaxis=dict(autorange="reversed"))
+st.plotly_chart(fig_dest, use_container_width=True)
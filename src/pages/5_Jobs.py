@@ -0,0 +1,95 @@
+import streamlit as st
+import os
+import datetime
+import jobs
+import warmup
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..",
+                       "..", "flights_database.db")
+
+st.set_page_config(page_title="Background Jobs",
+                   layout="wide", initial_sidebar_state="expanded")
+
+warmup.start(DB_PATH)
+
+
+st.markdown(
+    """
+<div style="display: flex; align-items: center; margin-bottom: 1rem;">
+    <div style="flex: 5;">
+        <h1>Background Jobs ⚙️</h1>
+        <p>Run the heavy recomputations in a separate process. You can keep using the dashboard, or leave and come back later; the jobs continue in the background and the charts pick up their results when they finish.</p>
+    </div>
+</div>
+""",
+    unsafe_allow_html=True,
+)
+
+# ----------------------------
+# Submit
+# ----------------------------
+col_job, col_submit = st.columns([3, 1])
+with col_job:
+    name = st.selectbox("Job", list(jobs.JOBS),
+                        format_func=lambda name: jobs.JOBS[name][0])
+    st.caption(jobs.JOBS[name][2])
+
+params = {}
+if name == "plane_speeds":
+    params["full"] = st.checkbox("Recompute every plane", False)
+elif name == "wind":
+    params["full"] = st.checkbox("Recompute every flight", False,
+                                 help="After the weather table changed.")
+
+with col_submit:
+    st.write("")
+    if st.button("Run job", type="primary", use_container_width=True):
+        job_id = jobs.submit(name, DB_PATH, **params)
+        st.toast(f"{jobs.JOBS[name][0]} queued (job {job_id})")
+
+st.markdown("---")
+
+
+# ----------------------------
+# Jobs, refreshed while one is queued or running
+# ----------------------------
+def _time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%H:%M:%S")
+
+
+refreshing = jobs.active()
+
+
+@st.fragment(run_every=2 if refreshing else None)
+def job_list():
+    all_jobs = jobs.jobs()
+    if not all_jobs:
+        st.info("No jobs yet.")
+        return
+    for job in all_jobs:
+        col_label, col_status = st.columns([3, 2])
+        col_label.markdown(f"**{job['label']}** · job {job['id']}, "
+                           f"submitted {_time(job['submitted'])}")
+        if job["status"] == "queued":
+            col_status.write("Queued")
+            if col_status.button("Cancel", key=f"cancel_{job['id']}"):
+                jobs.cancel(job["id"])
+                st.rerun()
+        elif job["status"] == "running":
+            col_status.progress(
+                job["done"] / max(job["total"], 1),
+                text=f"Running: {job['done']:,} of {job['total']:,}")
+        elif job["status"] == "done":
+            started = job["started"] or job["submitted"]
+            col_status.success(f"{job['result']} in "
+                               f"{job['finished'] - started:.0f} s")
+        elif job["status"] == "failed":
+            col_status.error(job["error"])
+        else:
+            col_status.write("Cancelled")
+    if refreshing and not jobs.active():
+        # the last job finished: stop refreshing
+        st.rerun()
+
+
+job_list()
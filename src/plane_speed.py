@@ -0,0 +1,130 @@
+import pandas as pd
+
+import db
+import table_versions
+
+# `planes.speed` is a TEXT column (all zeros), so the computed average goes
+# to its own REAL column
+SPEED_COLUMN = "avg_speed"
+
+GROUP_COLUMNS = ["type", "manufacturer", "model", "engine", "engines"]
+
+
+# planes whose flights were updated or deleted since the previous run,
+# recorded by triggers on the columns the speed is computed from
+STALE_TABLE = "plane_speed_stale"
+_STALE_TRIGGERS = {
+    f"{STALE_TABLE}_update": (
+        "AFTER UPDATE OF tailnum, distance, air_time ON flights",
+        "(OLD.tailnum), (NEW.tailnum)"),
+    f"{STALE_TABLE}_delete": ("AFTER DELETE ON flights", "(OLD.tailnum)"),
+}
+
+
+def _install_stale_triggers(conn):
+    """Create the stale-plane triggers; returns whether they were missing."""
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {STALE_TABLE} "
+                 "(tailnum TEXT PRIMARY KEY)")
+    existing = {name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    if set(_STALE_TRIGGERS) <= existing:
+        return False
+    for name, (event, tailnums) in _STALE_TRIGGERS.items():
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} {event}
+            BEGIN
+                INSERT OR IGNORE INTO {STALE_TABLE} VALUES {tailnums};
+            END
+        """)
+    return True
+
+
+def update_plane_speeds(conn, tailnums=(), full=False):
+    """
+    Write the average speed (miles per minute of air time) of each plane.
+
+    Planes with flights added since the previous run, with flights updated
+    or deleted since (recorded by triggers on `flights`), plus the given
+    `tailnums` are recomputed in one pass over `flights` and written in one
+    transaction; `full`, and the first run, recompute every plane. Returns
+    the number of planes refreshed.
+    """
+    if SPEED_COLUMN not in db.table_columns(conn, "planes"):
+        conn.execute(f"ALTER TABLE planes ADD COLUMN {SPEED_COLUMN} REAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS plane_speed_meta (max_rowid INTEGER)")
+    with conn:
+        # without the triggers, changes since the previous run are unknown
+        full = _install_stale_triggers(conn) or full
+
+    last_rowid = conn.execute(
+        "SELECT MAX(max_rowid) FROM plane_speed_meta").fetchone()[0]
+    if full or last_rowid is None:
+        last_rowid = 0
+    max_rowid = conn.execute("SELECT MAX(rowid) FROM flights").fetchone()[0] or 0
+
+    conn.execute("DROP TABLE IF EXISTS temp.changed_tailnums")
+    conn.execute("CREATE TEMP TABLE changed_tailnums (tailnum TEXT PRIMARY KEY)")
+    conn.execute("DROP TABLE IF EXISTS temp.new_speeds")
+    conn.execute("CREATE TEMP TABLE new_speeds "
+                 "(tailnum TEXT PRIMARY KEY, avg_speed REAL)")
+    with table_versions.recording(conn, ["planes"]):
+        conn.execute("""
+            INSERT OR IGNORE INTO changed_tailnums
+            SELECT DISTINCT tailnum FROM flights
+            WHERE rowid > ? AND tailnum IS NOT NULL
+        """, (last_rowid,))
+        conn.execute(f"""
+            INSERT OR IGNORE INTO changed_tailnums
+            SELECT tailnum FROM {STALE_TABLE} WHERE tailnum IS NOT NULL
+        """)
+        conn.executemany("INSERT OR IGNORE INTO changed_tailnums VALUES (?)",
+                         [(t,) for t in tailnums])
+        refreshed = conn.execute(
+            "SELECT COUNT(*) FROM changed_tailnums").fetchone()[0]
+
+        conn.execute("""
+            INSERT INTO new_speeds
+            SELECT f.tailnum, ROUND(AVG(f.distance * 1.0 / f.air_time), 2)
+            FROM flights f
+            JOIN changed_tailnums c ON c.tailnum = f.tailnum
+            WHERE f.air_time > 0
+            GROUP BY f.tailnum
+        """)
+        # a correlated subquery rather than UPDATE ... FROM (SQLite 3.33+);
+        # planes left without a usable flight get NULL
+        conn.execute(f"""
+            UPDATE planes SET {SPEED_COLUMN} = (
+                SELECT avg_speed FROM new_speeds s
+                WHERE s.tailnum = planes.tailnum)
+            WHERE tailnum IN (SELECT tailnum FROM changed_tailnums)
+        """)
+        conn.execute(f"DELETE FROM {STALE_TABLE}")
+        conn.execute("DELETE FROM plane_speed_meta")
+        conn.execute("INSERT INTO plane_speed_meta VALUES (?)", (max_rowid,))
+    conn.execute("DROP TABLE temp.changed_tailnums")
+    conn.execute("DROP TABLE temp.new_speeds")
+    return refreshed
+
+
+def speed_by(conn, by=("type",)):
+    """
+    Average plane speed per group of `planes` columns (e.g. type, model).
+
+    Each plane counts once, whatever its number of flights.
+    """
+    by = list(by)
+    unknown = [c for c in by if c not in GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f"Cannot group planes by {unknown}")
+    columns = ", ".join(by)
+    return pd.read_sql_query(f"""
+        SELECT {columns},
+               COUNT({SPEED_COLUMN}) AS planes,
+               ROUND(AVG({SPEED_COLUMN}), 2) AS avg_speed,
+               MIN({SPEED_COLUMN}) AS min_speed,
+               MAX({SPEED_COLUMN}) AS max_speed
+        FROM planes
+        WHERE {SPEED_COLUMN} IS NOT NULL
+        GROUP BY {columns}
+        ORDER BY avg_speed DESC
+    """, conn)
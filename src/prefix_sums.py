@@ -0,0 +1,215 @@
+"""
+Cumulative daily sums of the delay KPIs, for any date range in O(1).
+
+For every key of a level (an origin, an (origin, dest) route or an
+(origin, carrier) pair) an array holds, for each day since the first day in
+`flights`, the running totals of MEASURES up to the day before. The totals
+of a date range are then `cumulative[end + 1] - cumulative[start]`.
+
+Flights appended for new days are added to a copy of the totals. Any other
+change (an update or delete of summed flights, or flights added for days
+already summed) is told by a checksum of the summed rows and rebuilds the
+totals from scratch.
+"""
+import os
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+
+import db
+import table_versions
+
+LEVELS = {
+    "origin": ("origin",),
+    "route": ("origin", "dest"),
+    "carrier": ("origin", "carrier"),
+}
+MEASURES = ("flights", "dep_delay_sum", "dep_delay_n", "arr_delay_sum",
+            "arr_delay_n", "dep_delayed_15")
+
+_DATE = "(year * 10000 + month * 100 + day)"
+# the columns the totals are summed from, one text per row for the checksum
+_ROW = ("quote(origin) || ',' || quote(dest) || ',' || quote(carrier) || ','"
+        f" || quote({_DATE}) || ',' || quote(dep_delay) || ',' || quote(arr_delay)")
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _daily_totals(conn, keys, after_rowid):
+    """Totals per key and day of the flights after the row `after_rowid`."""
+    keys = ", ".join(keys)
+    return pd.read_sql_query(f"""
+        SELECT {keys}, {_DATE} AS date,
+               COUNT(*) AS flights,
+               TOTAL(dep_delay) AS dep_delay_sum,
+               COUNT(dep_delay) AS dep_delay_n,
+               TOTAL(arr_delay) AS arr_delay_sum,
+               COUNT(arr_delay) AS arr_delay_n,
+               TOTAL(dep_delay > 15) AS dep_delayed_15
+        FROM flights
+        WHERE rowid > ? AND {_DATE} IS NOT NULL
+        GROUP BY {keys}, date
+    """, conn, params=(after_rowid,))
+
+
+def _checksum(conn, after_rowid, last_rowid):
+    """Checksum of the rows `after_rowid` < rowid <= `last_rowid`."""
+    conn.create_function("crc32", 1, lambda row: zlib.crc32(row.encode()),
+                         deterministic=True)
+    return conn.execute(f"""
+        SELECT TOTAL(crc32({_ROW})) FROM flights
+        WHERE rowid > ? AND rowid <= ?
+    """, (after_rowid, last_rowid)).fetchone()[0]
+
+
+class _Level:
+    """Keys of one level and their cumulative array (key, day + 1, measure)."""
+
+    def __init__(self, keys=(), cumulative=None):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        if cumulative is None:
+            cumulative = np.zeros((0, 1, len(MEASURES)))
+        self.cumulative = cumulative
+
+    def extended(self, daily, key_columns, first_day, n_days):
+        """A new level with the days of `daily` added after the current ones."""
+        keys = self.keys + [key for key in
+                            dict.fromkeys(daily[list(key_columns)].itertuples(
+                                index=False, name=None))
+                            if key not in self.index]
+        index = {key: i for i, key in enumerate(keys)}
+
+        old_keys, old_days = self.cumulative.shape[0], self.cumulative.shape[1]
+        cumulative = np.zeros((len(keys), n_days + 1, len(MEASURES)))
+        cumulative[:old_keys, :old_days] = self.cumulative
+        # the totals so far carry over to the new days
+        cumulative[:old_keys, old_days:] = self.cumulative[:, -1:]
+
+        increments = np.zeros_like(cumulative)
+        rows = [index[key] for key in daily[list(key_columns)].itertuples(
+            index=False, name=None)]
+        days = (pd.to_datetime(daily["date"].astype(str), format="%Y%m%d")
+                - first_day).dt.days.to_numpy()
+        increments[rows, days + 1] = daily[list(MEASURES)].to_numpy()
+        cumulative += np.cumsum(increments, axis=1)
+        return _Level(keys, cumulative)
+
+
+class PrefixSums:
+    """
+    Cumulative daily KPI totals of every level, see the module docstring.
+
+    An instance is never changed once built, so it can be read without a
+    lock; `refreshed` returns a new one.
+    """
+
+    def __init__(self, conn, previous=None):
+        """Sum `flights`, adding to `previous` when it was only appended to."""
+        self.first_day, self.last_date = None, 0
+        self.last_rowid, self.checksum = 0, 0.0
+        self.levels = {level: _Level() for level in LEVELS}
+        if previous is not None and previous._only_appended(conn):
+            self.first_day, self.last_date = previous.first_day, \
+                previous.last_date
+            self.last_rowid, self.checksum = previous.last_rowid, \
+                previous.checksum
+            self.levels = previous.levels
+        self._add_new_rows(conn)
+
+    @property
+    def n_days(self):
+        return self.levels["origin"].cumulative.shape[1] - 1
+
+    def _only_appended(self, conn):
+        """Whether the summed rows are unchanged and the new ones come after."""
+        if self.first_day is None:
+            return False
+        later = conn.execute(f"""
+            SELECT EXISTS (SELECT 1 FROM flights
+                           WHERE rowid > ? AND {_DATE} <= ?)
+        """, (self.last_rowid, self.last_date)).fetchone()[0]
+        return not later and _checksum(conn, 0, self.last_rowid) == \
+            self.checksum
+
+    def _add_new_rows(self, conn):
+        last_rowid = conn.execute(
+            "SELECT IFNULL(MAX(rowid), 0) FROM flights").fetchone()[0]
+        if last_rowid <= self.last_rowid:
+            return
+        daily = {level: _daily_totals(conn, keys, self.last_rowid)
+                 for level, keys in LEVELS.items()}
+        self.checksum += _checksum(conn, self.last_rowid, last_rowid)
+        self.last_rowid = last_rowid
+        dates = daily["origin"]["date"]
+        if dates.empty:
+            return
+        if self.first_day is None:
+            self.first_day = pd.to_datetime(str(dates.min()), format="%Y%m%d")
+        self.last_date = max(self.last_date, int(dates.max()))
+        n_days = (pd.to_datetime(str(self.last_date), format="%Y%m%d")
+                  - self.first_day).days + 1
+        self.levels = {level: self.levels[level].extended(
+            daily[level], LEVELS[level], self.first_day, n_days)
+            for level in LEVELS}
+
+    def refreshed(self, conn):
+        """A new `PrefixSums` of the current `flights`."""
+        return PrefixSums(conn, previous=self)
+
+    def _day(self, date):
+        return (pd.Timestamp(date) - self.first_day).days
+
+    def totals(self, level, key, start, end):
+        """MEASURES summed over the dates `start` to `end` (inclusive)."""
+        summed = self.levels[level]
+        i = summed.index.get(key if isinstance(key, tuple) else (key,))
+        if i is None or self.first_day is None:
+            return dict.fromkeys(MEASURES, 0.0)
+        lo = int(np.clip(self._day(start), 0, self.n_days))
+        hi = int(np.clip(self._day(end) + 1, lo, self.n_days))
+        values = summed.cumulative[i, hi] - summed.cumulative[i, lo]
+        return dict(zip(MEASURES, values))
+
+    def kpis(self, level, key, start, end):
+        """
+        Total flights, average departure and arrival delay and the share of
+        departures delayed by more than 15 minutes (%), over a date range.
+        """
+        t = self.totals(level, key, start, end)
+        flights = int(t["flights"])
+        return {
+            "total_flights": flights,
+            "avg_dep_delay": (t["dep_delay_sum"] / t["dep_delay_n"]
+                              if t["dep_delay_n"] else np.nan),
+            "avg_arr_delay": (t["arr_delay_sum"] / t["arr_delay_n"]
+                              if t["arr_delay_n"] else np.nan),
+            "delay_rate": 100 * t["dep_delayed_15"] / flights if flights else 0.0,
+        }
+
+
+def get_prefix_sums(path=db.DB_PATH):
+    """
+    Process-wide `PrefixSums` of the database at `path`, replaced by an
+    up-to-date one when `flights` changes.
+    """
+    path = os.path.abspath(path)
+    version = table_versions.versions(path, ["flights"])
+    with _lock:
+        cached = _cache.get(path)
+        if cached is None or cached[0] != version:
+            conn = db.connect(path)
+            try:
+                # one read transaction: the rows, max rowid and checksum agree
+                conn.execute("BEGIN")
+                if cached is None:
+                    sums = PrefixSums(conn)
+                else:
+                    sums = cached[1].refreshed(conn)
+            finally:
+                conn.close()
+            cached = _cache[path] = (version, sums)
+    return cached[1]
@@ -0,0 +1,143 @@
+"""
+SQL of the dashboard pages.
+
+The pages and the cache warm-up (warmup.py) build their queries here, so a
+warmed result is found under exactly the query a page runs.
+"""
+
+NYC_ORIGINS = ('JFK', 'LGA', 'EWR')
+
+
+#######################################################
+# MAIN DASHBOARD
+#######################################################
+
+# QUERYING: all airports
+query_airports = """
+    SELECT
+        a.faa, a.name, a.lat, a.lon,
+        CAST(IFNULL(alt, 0) AS INTEGER) as Altitude,
+        tz as Timezone
+    FROM airports a
+    """
+
+query_carriers = "SELECT carrier, name FROM airlines ORDER BY name"
+
+
+# arrival delay categories of the delay distribution (flight_cube.py)
+DELAY_CATEGORIES = [
+    ('On Time', "arr_delay <= 0"),
+    ('Minor (≤15 min)', "arr_delay > 0 AND arr_delay <= 15"),
+    ('Moderate (16-30 min)', "arr_delay > 15 AND arr_delay <= 30"),
+    ('Significant (31-60 min)', "arr_delay > 30 AND arr_delay <= 60"),
+    ('Severe (>60 min)', "arr_delay > 60"),
+]
+# the category of a flight as SQL, NULL when its arrival delay is unknown
+DELAY_BUCKET = "CASE " + " ".join(
+    f"WHEN {condition} THEN '{category}'"
+    for category, condition in DELAY_CATEGORIES) + " END"
+
+
+def dashboard_queries():
+    """The queries of the main dashboard; its aggregates are in flight_cube.py."""
+    return [query_airports, query_carriers]
+
+
+#######################################################
+# FLIGHT ROUTES
+#######################################################
+
+query_route_origins = """
+SELECT faa, name
+FROM airports
+WHERE faa IN ('JFK', 'LGA', 'EWR')
+ORDER BY faa;
+"""
+
+
+def query_route_coordinates(origin, dest):
+    return f"""
+    SELECT a1.lat AS origin_lat, a1.lon AS origin_lon,
+           a2.lat AS dest_lat, a2.lon AS dest_lon,
+        a2.tzone AS dest_tzone
+    FROM airports a1
+    JOIN airports a2 ON a1.faa = '{origin}' AND a2.faa = '{dest}'
+    """
+
+
+def query_route_dep_delays(origin, dest):
+    return f"""
+    SELECT dep_delay
+    FROM flights
+    WHERE origin = '{origin}' AND dest = '{dest}'
+      AND dep_delay IS NOT NULL
+    """
+
+
+def route_bundle(origin, dest):
+    """(query, typed) pairs the Flight Routes page runs for one route."""
+    return [
+        (query_route_coordinates(origin, dest), False),
+        (query_route_dep_delays(origin, dest), True),
+    ]
+
+
+#######################################################
+# DELAY ANALYSIS
+#######################################################
+
+query_nyc_airports = """
+SELECT DISTINCT faa, name
+FROM airports
+WHERE faa IN ('JFK', 'LGA', 'EWR')
+"""
+
+query_date_range = """
+SELECT MIN(year || '-' || PRINTF('%02d', month) || '-' || PRINTF('%02d', day)) as min_date,
+       MAX(year || '-' || PRINTF('%02d', month) || '-' || PRINTF('%02d', day)) as max_date
+FROM flights
+"""
+
+
+def _airport_between(origin, start_date, end_date):
+    """Flights from `origin` between two 'YYYY-MM-DD' dates (inclusive)."""
+    return f"""origin = '{origin}'
+        AND date(year || '-' || PRINTF('%02d', month) || '-' || PRINTF('%02d', day))
+            BETWEEN date('{start_date}') AND date('{end_date}')"""
+
+
+def query_airport_daily_delays(origin, start_date, end_date):
+    return f"""
+    SELECT year, month, day,
+           AVG(dep_delay) as dep_delay,
+           AVG(arr_delay) as arr_delay
+    FROM flights
+    WHERE {_airport_between(origin, start_date, end_date)}
+    GROUP BY year, month, day
+    ORDER BY year, month, day
+    """
+
+
+def query_airport_delayed_destinations(origin, start_date, end_date,
+                                       delay_column, min_flights=10, n=5):
+    """The `n` destinations with the highest mean `delay_column`."""
+    return f"""
+    SELECT dest,
+           AVG({delay_column}) as avg_delay,
+           COUNT({delay_column}) as flight_count
+    FROM flights
+    WHERE {_airport_between(origin, start_date, end_date)}
+    GROUP BY dest
+    HAVING COUNT({delay_column}) >= {min_flights}
+    ORDER BY avg_delay DESC
+    LIMIT {n}
+    """
+
+
+def airport_bundle(origin, start_date, end_date):
+    """The queries of the Airport Analysis mode for one airport and range."""
+    return [query_airport_daily_delays(origin, start_date, end_date),
+            query_airport_delayed_destinations(origin, start_date, end_date,
+                                               'dep_delay'),
+            query_airport_delayed_destinations(origin, start_date, end_date,
+                                               'arr_delay')]
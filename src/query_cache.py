@@ -0,0 +1,204 @@
+import os
+import tempfile
+import threading
+
+import cachetools
+import pandas as pd
+
+import db
+import table_versions
+from flight_schema import read_typed
+
+# Bytes of DataFrames kept in memory; least recently used results go first
+MEMORY_BUDGET = 256 * 2**20
+# Results larger than this are written to Parquet in SPILL_DIR instead of
+# being kept in memory (when SPILL_DIR is set)
+SPILL_THRESHOLD = 32 * 2**20
+SPILL_DIR = None
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+          "spilled": 0}
+# generation of table_versions last swept, per database
+_generations = {}
+
+
+class _Spilled:
+    """A result stored as a Parquet file; it weighs almost nothing in memory."""
+
+    nbytes = 1024
+
+    def __init__(self, df, spill_dir):
+        os.makedirs(spill_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix=".parquet", dir=spill_dir)
+        os.close(fd)
+        df.to_parquet(self.path)
+
+    def load(self):
+        return pd.read_parquet(self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _entry_size(entry):
+    result = entry[1]
+    if isinstance(result, _Spilled):
+        return result.nbytes
+    return int(result.memory_usage(deep=True).sum())
+
+
+class _ResultCache(cachetools.LRUCache):
+    """LRU cache weighed in bytes, counting evictions."""
+
+    def peek(self, key):
+        """The entry under `key`, without making it the most recent."""
+        return cachetools.Cache.__getitem__(self, key)
+
+    def popitem(self):
+        key, entry = super().popitem()
+        _stats["evictions"] += 1
+        if isinstance(entry[1], _Spilled):
+            entry[1].remove()
+        return key, entry
+
+
+_results = _ResultCache(MEMORY_BUDGET, getsizeof=_entry_size)
+
+
+def configure(budget=None, spill_dir=None, spill_threshold=None):
+    """
+    Change the memory budget (bytes) and spilling; cached results that no
+    longer fit are evicted.
+    """
+    global _results, SPILL_DIR, SPILL_THRESHOLD
+    with _lock:
+        if spill_dir is not None:
+            SPILL_DIR = spill_dir
+        if spill_threshold is not None:
+            SPILL_THRESHOLD = spill_threshold
+        if budget is not None:
+            old = _results
+            _results = _ResultCache(budget, getsizeof=_entry_size)
+            # oldest first, so the most recent results survive
+            for key in list(old):
+                _store(key, old[key])
+
+
+def _key(query, path, typed):
+    # the same SQL written with different indentation is the same entry
+    return os.path.abspath(path), " ".join(query.split()), typed
+
+
+def _load(query, path, typed):
+    """The result of `query` and the names of the tables it read."""
+    conn = db.connect(path)
+    try:
+        with table_versions.recording_reads(conn) as tables:
+            # row-level frames are loaded with compact dtypes
+            if typed:
+                df = read_typed(query, conn)
+            else:
+                df = pd.read_sql_query(query, conn)
+        return df, tables
+    finally:
+        conn.close()
+
+
+def _is_current(tokens, current):
+    return all(current.get(table) == token for table, token in tokens.items())
+
+
+def _discard(key):
+    entry = _results.pop(key)
+    if isinstance(entry[1], _Spilled):
+        entry[1].remove()
+
+
+def _sweep(path, generation, current):
+    """
+    Under `_lock`: after a write to the database at `path`, drop the results
+    that read a table that changed. Results of other tables are kept.
+    """
+    if _generations.get(path) == generation:
+        return
+    _generations[path] = generation
+    for key in list(_results):
+        if key[0] == path and not _is_current(_results.peek(key)[0], current):
+            _discard(key)
+            _stats["invalidations"] += 1
+
+
+def _store(key, entry):
+    """Insert under `_lock`; results larger than the budget are not kept."""
+    try:
+        _results[key] = entry
+    except ValueError:
+        if isinstance(entry[1], _Spilled):
+            entry[1].remove()
+
+
+def read_sql(query, path=db.DB_PATH, typed=False):
+    """
+    Result of `query` on the database at `path`, shared by every page,
+    session and thread of the process.
+
+    Each result is computed once and reused until a table it reads changes
+    (see table_versions.py) or it is evicted to stay within `MEMORY_BUDGET`.
+    Callers get their own copy, so they may modify it. `typed` applies the
+    compact dtypes of flight_schema.py; use it for queries returning flight
+    rows, not for aggregates whose aliases reuse column names (an AVG named
+    `dep_delay` does not fit Int16).
+    """
+    key = _key(query, path, typed)
+    generation, current = table_versions.snapshot(path)
+    with _lock:
+        _sweep(key[0], generation, current)
+        cached = _results.get(key)
+        hit = cached is not None and _is_current(cached[0], current)
+        _stats["hits" if hit else "misses"] += 1
+    if hit:
+        result = cached[1]
+        return result.load() if isinstance(result, _Spilled) else result.copy()
+
+    df, tables = _load(query, path, typed)
+    # tokens from before the query ran: a write during it invalidates it
+    tokens = {table: current.get(table) for table in tables or current}
+    entry = (tokens, df)
+    if SPILL_DIR and _entry_size(entry) > SPILL_THRESHOLD:
+        entry = (tokens, _Spilled(df, SPILL_DIR))
+        _stats["spilled"] += 1
+    with _lock:
+        if key in _results:
+            _discard(key)
+        _store(key, entry)
+    return df.copy()
+
+
+def contains(query, path=db.DB_PATH, typed=False):
+    """Whether an up-to-date result of `query` is cached."""
+    current = table_versions.snapshot(path)[1]
+    with _lock:
+        cached = _results.get(_key(query, path, typed))
+    return cached is not None and _is_current(cached[0], current)
+
+
+def stats():
+    """
+    Hits, misses, evictions (for memory), invalidations (after writes),
+    spilled results, entries and bytes in use.
+    """
+    with _lock:
+        return dict(_stats, entries=len(_results), bytes=_results.currsize,
+                    budget=_results.maxsize)
+
+
+def clear():
+    with _lock:
+        for _, result in _results.values():
+            if isinstance(result, _Spilled):
+                result.remove()
+        _results.clear()
@@ -0,0 +1,242 @@
+"""
+Offline report: the charts of every route, NYC airport, destination and
+day as PNG files with an index.html, rendered headless (matplotlib's Agg
+backend).
+
+    python src/report.py                      # into figures/report
+    python src/report.py --out /tmp/report --workers 8
+
+The charts are spread over a pool of worker processes. Each worker loads
+the flight cube and the dimension tables once, when it starts, and
+renders every chart sent to it from them. A chart is fingerprinted by the
+data it plots; when the fingerprint equals the one in the manifest of the
+previous run and the file exists, it is not rendered again.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import pandas as pd
+
+import db
+import delay_bins
+import dimensions
+import flight_cube
+import flights
+from queries import NYC_ORIGINS
+
+REPORT_DIR = os.path.join(os.path.dirname(__file__), "..", "figures",
+                          "report")
+MANIFEST = "manifest.json"
+# bump when the charts change, so that every chart is rendered again
+REPORT_VERSION = 1
+
+SECTIONS = [("overview", "Overview"), ("airport", "NYC Airports"),
+            ("route", "Routes"), ("destination", "Destinations"),
+            ("day", "Days")]
+
+# set in each worker by `_init_worker`
+_out_dir = None
+
+
+def monthly_flights(origin, dest=None):
+    """Flights and mean arrival delay per month from `origin` (to `dest`)."""
+    selection = {"origin": origin}
+    if dest is not None:
+        selection["dest"] = dest
+    per_month = flight_cube.get_flight_cube(flights.db_path).dice(
+        **selection).rollup("month", measures=["flights", "arr_delay_sum",
+                                               "arr_delay_n"])
+    per_month["arr_delay"] = flight_cube.average(per_month, "arr_delay")
+    return per_month[["month", "flights", "arr_delay"]]
+
+
+def plot_monthly_flights(origin, dest=None):
+    import matplotlib.pyplot as plt
+
+    per_month = monthly_flights(origin, dest)
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.bar(per_month["month"], per_month["flights"], color="skyblue")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Number of Flights")
+    ax.set_xticks(range(1, 13))
+    delay_ax = ax.twinx()
+    delay_ax.plot(per_month["month"], per_month["arr_delay"], color="darkred",
+                  marker="o")
+    delay_ax.set_ylabel("Average Arrival Delay (min)")
+    route = origin if dest is None else f"{origin} to {dest}"
+    ax.set_title(f"Flights and arrival delay per month, {route}")
+    fig.tight_layout()
+    return fig
+
+
+# kind of chart: (data it plots, figure), both called with the chart's params
+CHARTS = {
+    "carriers": (flights.average_delay_per_carrier,
+                 lambda: flights.average_delay_per_carrier_plot(show=False)),
+    "distance": (lambda: delay_bins.distance_delay_bins(
+                     by_carrier=True, path=flights.db_path),
+                 lambda: flights.bins_distance_delay_per_carrier(show=False)),
+    "airport": (monthly_flights, plot_monthly_flights),
+    "route": (monthly_flights, plot_monthly_flights),
+    "manufacturers": (
+        flights.top_manufacturers,
+        lambda dest: flights.top_manufacturers_to_destiantion(dest,
+                                                              show=False)),
+    "day": (flights.flight_destinations,
+            lambda month, day, origin: flights.plot_flight_destinations(
+                month, day, origin, show=False)),
+}
+
+
+def report_charts(path=db.DB_PATH):
+    """(kind, params, file) of every chart of the report."""
+    charts = [("carriers", [], "overview/average_delay_per_carrier.png"),
+              ("distance", [], "overview/distance_delay_per_carrier.png")]
+    charts += [("airport", [origin], f"airport/{origin}.png")
+               for origin in NYC_ORIGINS]
+
+    routes = dimensions.get_route_index(path).routes_from(NYC_ORIGINS)
+    charts += [("route", [origin, dest], f"route/{origin}-{dest}.png")
+               for origin, dest in zip(routes["origin"], routes["dest"])]
+    charts += [("manufacturers", [dest], f"destination/{dest}.png")
+               for dest in sorted(routes["dest"].unique())]
+
+    conn = db.connect(path)
+    try:
+        days = conn.execute(
+            "SELECT DISTINCT month, day FROM flights ORDER BY month, day"
+        ).fetchall()
+    finally:
+        conn.close()
+    charts += [("day", [int(month), int(day), origin],
+                f"day/{int(month):02d}-{int(day):02d}_{origin}.png")
+               for month, day in days for origin in NYC_ORIGINS]
+    return charts
+
+
+def fingerprint(kind, params, data):
+    """Hash of the chart version, kind, parameters and plotted data."""
+    digest = hashlib.sha1(
+        json.dumps([REPORT_VERSION, kind, params]).encode())
+    digest.update(pd.util.hash_pandas_object(data).to_numpy().tobytes())
+    digest.update(",".join(map(str, data.columns)).encode())
+    return digest.hexdigest()
+
+
+def _init_worker(path, out_dir):
+    global _out_dir
+    import matplotlib
+    matplotlib.use("Agg")
+
+    _out_dir = out_dir
+    flights.db_path = path
+    # the dataset every chart of this worker is answered from
+    flight_cube.get_flight_cube(path)
+    dimensions.get_dimensions(path)
+
+
+def _render(task):
+    """Render one chart unless its data is unchanged; (file, hash, rendered)."""
+    kind, params, filename, previous = task
+    data, figure = CHARTS[kind]
+    current = fingerprint(kind, params, data(*params))
+    out = os.path.join(_out_dir, filename)
+    if current == previous and os.path.exists(out):
+        return filename, current, False
+
+    import matplotlib.pyplot as plt
+
+    fig = figure(*params)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    fig.savefig(out, dpi=100)
+    plt.close(fig)
+    return filename, current, True
+
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_index(out_dir, filenames):
+    """index.html with every chart, by section."""
+    parts = ["<!DOCTYPE html>", "<html><head><meta charset='utf-8'>",
+             "<title>NYC Flights Report</title></head><body>",
+             "<h1>NYC Flights Report</h1>"]
+    for section, title in SECTIONS:
+        files = sorted(f for f in filenames if f.startswith(section + "/"))
+        if not files:
+            continue
+        parts.append(f"<h2>{title}</h2>")
+        for filename in files:
+            name = html.escape(os.path.splitext(os.path.basename(filename))[0])
+            src = html.escape(filename)
+            parts.append(f"<figure><a href='{src}'><img src='{src}' "
+                         f"alt='{name}' width='600' loading='lazy'></a>"
+                         f"<figcaption>{name}</figcaption></figure>")
+    parts.append("</body></html>")
+    with open(os.path.join(out_dir, "index.html"), "w") as f:
+        f.write("\n".join(parts))
+
+
+def build_report(out_dir=REPORT_DIR, path=db.DB_PATH, workers=None,
+                 force=False):
+    """Render the report into `out_dir`; returns (rendered, skipped)."""
+    out_dir = os.path.abspath(out_dir)
+    path = os.path.abspath(path)
+    os.makedirs(out_dir, exist_ok=True)
+    previous = {} if force else _load_manifest(out_dir)
+    tasks = [(kind, params, filename, previous.get(filename))
+             for kind, params, filename in report_charts(path)]
+
+    manifest, rendered = {}, 0
+    # spawned workers start without the parent's SQLite connections
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(
+            workers, mp_context=context, initializer=_init_worker,
+            initargs=(path, out_dir)) as pool:
+        results = pool.map(_render, tasks, chunksize=16)
+        for done, (filename, current, was_rendered) in enumerate(results, 1):
+            manifest[filename] = current
+            rendered += was_rendered
+            print(f"\r{done:,} / {len(tasks):,} charts", end="",
+                  file=sys.stderr)
+    print(file=sys.stderr)
+
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=0)
+    write_index(out_dir, manifest)
+    return rendered, len(tasks) - rendered
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Render the charts of every route, airport and day.")
+    parser.add_argument("--out", default=REPORT_DIR, help="output directory")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite database")
+    parser.add_argument("--workers", type=int,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true",
+                        help="render every chart, changed or not")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    rendered, skipped = build_report(args.out, args.db, args.workers,
+                                     args.force)
+    print(f"Rendered {rendered:,} charts, {skipped:,} unchanged, in "
+          f"{time.perf_counter() - started:.0f} s; open "
+          f"{os.path.join(args.out, 'index.html')}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Stratified sample of `flights` and estimates with confidence intervals.
+
+The sample keeps SAMPLE_FRACTION of the flights of every (origin, month,
+carrier) stratum, at least MIN_STRATUM_SAMPLE of them, with the size of the
+stratum and of its sample on each row. Counts are estimated with the
+stratified estimator (each sampled flight stands for N_h / n_h flights) and
+shares with the combined ratio estimator; the intervals use their variance
+with the finite population correction.
+"""
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import db
+import dimensions
+import flight_cube
+import table_versions
+
+SAMPLE_TABLE = "flights_sample"
+SAMPLE_QUERY = f"SELECT * FROM {SAMPLE_TABLE}"
+SAMPLE_FRACTION = 0.05
+MIN_STRATUM_SAMPLE = 2
+STRATA = ("origin", "month", "carrier")
+SAMPLE_COLUMNS = ("dest", "dep_delay", "arr_delay", "dep_time", "distance")
+# normal quantile of the two-sided 95% interval
+Z_95 = 1.96
+
+
+def build_sample(conn, fraction=SAMPLE_FRACTION):
+    """(Re)create the sample table from `flights` in one transaction."""
+    strata = ", ".join(STRATA)
+    columns = ", ".join(STRATA + SAMPLE_COLUMNS)
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {SAMPLE_TABLE}")
+        conn.execute(f"""
+            CREATE TABLE {SAMPLE_TABLE} AS
+            SELECT {columns}, stratum_flights,
+                   MIN(stratum_flights,
+                       MAX(?, CAST(stratum_flights * ? AS INTEGER))) AS stratum_sample
+            FROM (
+                SELECT {columns},
+                       ROW_NUMBER() OVER (PARTITION BY {strata}
+                                          ORDER BY random()) AS row_number,
+                       COUNT(*) OVER (PARTITION BY {strata}) AS stratum_flights
+                FROM flights
+            )
+            WHERE row_number <= MAX(?, CAST(stratum_flights * ? AS INTEGER))
+        """, (MIN_STRATUM_SAMPLE, fraction, MIN_STRATUM_SAMPLE, fraction))
+        conn.execute(f"DROP TABLE IF EXISTS {SAMPLE_TABLE}_meta")
+        conn.execute(f"""
+            CREATE TABLE {SAMPLE_TABLE}_meta AS
+            SELECT version AS flights_version, ? AS fraction
+            FROM {table_versions.CHANGES_TABLE} WHERE name = 'flights'
+        """, (fraction,))
+
+
+def _is_current(conn, fraction):
+    try:
+        current = conn.execute(f"""
+            SELECT m.flights_version = c.version AND m.fraction = ?
+            FROM {SAMPLE_TABLE}_meta m
+            JOIN {table_versions.CHANGES_TABLE} c ON c.name = 'flights'
+        """, (fraction,)).fetchone()
+    except sqlite3.OperationalError:
+        return False
+    # drawn by an earlier version with fewer columns
+    columns = set(db.table_columns(conn, SAMPLE_TABLE))
+    return (bool(current and current[0])
+            and set(STRATA + SAMPLE_COLUMNS) <= columns)
+
+
+def is_current(path=db.DB_PATH, fraction=SAMPLE_FRACTION):
+    """Whether the sample was drawn from the current `flights`; only reads."""
+    conn = db.connect(path)
+    try:
+        return _is_current(conn, fraction)
+    finally:
+        conn.close()
+
+
+def ensure_sample(path=db.DB_PATH, fraction=SAMPLE_FRACTION):
+    """Rebuild the sample when `flights` changed since it was drawn."""
+    # the sample records the change counter of flights
+    table_versions.install(path, ["flights"])
+    conn = db.connect(path)
+    try:
+        if not _is_current(conn, fraction):
+            build_sample(conn, fraction)
+    finally:
+        conn.close()
+
+
+def _with_strata(sample):
+    """Number the strata and add the weight and correction of each row."""
+    sample = sample.copy()
+    sample["stratum"] = sample.groupby(list(STRATA), dropna=False).ngroup()
+    n, N = sample["stratum_sample"], sample["stratum_flights"]
+    sample["weight"] = N / n
+    # N_h^2 (1 - n_h/N_h) / n_h, the factor of the within-stratum variance
+    sample["variance_factor"] = N ** 2 * (1 - n / N) / n
+    return sample
+
+
+def _stratum_variance(sample, values):
+    """Σ_h N_h² (1 - f_h) s²_h / n_h of the per-row `values`."""
+    grouped = pd.DataFrame({"stratum": sample["stratum"], "value": values,
+                            "factor": sample["variance_factor"]})
+    per_stratum = grouped.groupby("stratum").agg(
+        s2=("value", "var"), factor=("factor", "first"))
+    # a stratum sampled once has no variance estimate
+    return float((per_stratum["s2"].fillna(0) * per_stratum["factor"]).sum())
+
+
+def estimate_total(sample, y):
+    """(estimate, 95% half-width) of the number of flights where `y` holds."""
+    y = np.asarray(y, dtype=float)
+    total = float((sample["weight"] * y).sum())
+    return total, Z_95 * np.sqrt(_stratum_variance(sample, y))
+
+
+def estimate_ratio(sample, y, x):
+    """(estimate, 95% half-width) of Σy / Σx, e.g. the share of delays."""
+    y, x = np.asarray(y, dtype=float), np.asarray(x, dtype=float)
+    total_x = float((sample["weight"] * x).sum())
+    if total_x == 0:
+        return np.nan, np.nan
+    ratio = float((sample["weight"] * y).sum()) / total_x
+    variance = _stratum_variance(sample, y - ratio * x) / total_x ** 2
+    return ratio, Z_95 * np.sqrt(variance)
+
+
+def estimate_counts(sample, column):
+    """
+    Estimated flights per value of `column`, with 95% half-widths.
+
+    All indicators are computed at once: within a stratum the variance of
+    an indicator with share p is n / (n - 1) p (1 - p).
+    """
+    counts = sample.groupby(["stratum", column], observed=True).size()
+    counts = counts.rename("k").reset_index()
+    strata = sample.groupby("stratum")[
+        ["stratum_sample", "weight", "variance_factor"]].first()
+    counts = counts.join(strata, on="stratum")
+    n = counts["stratum_sample"]
+    p = counts["k"] / n
+    counts["estimate"] = counts["k"] * counts["weight"]
+    counts["variance"] = (counts["variance_factor"] * p * (1 - p)
+                          * n / (n - 1).clip(lower=1))
+    result = counts.groupby(column, observed=True)[["estimate", "variance"]].sum()
+    result["ci"] = Z_95 * np.sqrt(result.pop("variance"))
+    return result.sort_values("estimate", ascending=False)
+
+
+class Estimator:
+    """Estimates of the main dashboard figures from a loaded sample."""
+
+    def __init__(self, sample, origins=dimensions.NYC_AIRPORTS,
+                 path=db.DB_PATH):
+        sample = sample[sample["origin"].isin(list(origins))]
+        self.sample = _with_strata(sample)
+        # for the airport names of the top destinations
+        self.path = path
+
+    def summary(self):
+        """Like `flight_cube.summary`, plus `*_ci` half-widths."""
+        s = self.sample
+        known = s["arr_delay"].notna()
+        delayed, delayed_ci = estimate_ratio(s, s["arr_delay"] > 0, known)
+        missing, missing_ci = estimate_ratio(s, ~known, np.ones(len(s)))
+        # the strata sizes add up to the exact number of flights
+        total = int(s.groupby("stratum")["stratum_flights"].first().sum())
+        return pd.DataFrame([{
+            "total_flights": total,
+            "delay_arrival_percentage": round(100 * delayed, 2),
+            "missing_arrival_percentage": round(100 * missing, 2),
+            "delay_arrival_percentage_ci": round(100 * delayed_ci, 2),
+            "missing_arrival_percentage_ci": round(100 * missing_ci, 2),
+        }])
+
+    def top_destinations(self, n=10):
+        """Like `flight_cube.top_destinations`, plus `flight_count_ci`."""
+        counts = estimate_counts(self.sample, "dest").head(n)
+        top = pd.DataFrame({
+            "dest": counts.index.astype(object),
+            "flight_count": counts["estimate"].round().astype(int).values,
+            "flight_count_ci": counts["ci"].round().astype(int).values,
+        })
+        top["dest_name"] = dimensions.get_dimensions(self.path).airport_names(
+            top["dest"]).values
+        return top
+
+    def delay_distribution(self, airports):
+        """
+        Like `flight_cube.delay_distribution`: flights per delay category
+        from `airports`, in percent of all known arrivals from NYC.
+        """
+        if isinstance(airports, str):
+            airports = [airports]
+        s = self.sample
+        delay = s["arr_delay"]
+        known = delay.notna()
+        selected = s["origin"].isin(list(airports))
+        categories = [
+            ("On Time", delay <= 0),
+            ("Minor (≤15 min)", (delay > 0) & (delay <= 15)),
+            ("Moderate (16-30 min)", (delay > 15) & (delay <= 30)),
+            ("Significant (31-60 min)", (delay > 30) & (delay <= 60)),
+            ("Severe (>60 min)", delay > 60),
+        ]
+        rows = []
+        for category, in_category in categories:
+            y = selected & in_category
+            count, count_ci = estimate_total(s, y)
+            share, share_ci = estimate_ratio(s, y, known)
+            rows.append({"delay_category": category,
+                         "flight_count": int(round(count)),
+                         "percentage": round(100 * share, 2),
+                         "flight_count_ci": int(round(count_ci)),
+                         "percentage_ci": round(100 * share_ci, 2)})
+        return pd.DataFrame(rows)
+
+    def average_distances(self, airports):
+        """
+        Like `flight_cube.average_distances`, from the sampled flights of
+        each route (the distance hardly varies within a route); routes
+        without one are missing.
+        """
+        if isinstance(airports, str):
+            airports = [airports]
+        s = self.sample[self.sample["origin"].isin(list(airports))]
+        per_route = s.groupby(["origin", "dest"], as_index=False,
+                              observed=True)["distance"].mean()
+        return per_route.rename(columns={"distance": "Distance"})
+
+    def time_of_day(self):
+        """Like `flight_cube.time_of_day`, plus `*_ci` half-widths."""
+        s = self.sample
+        hour = s["dep_time"] // 100
+        label = hour.map(flight_cube.time_of_day_label, na_action="ignore")
+        delay = s["arr_delay"]
+        rows = []
+        for time_of_day in [label for label, _, _ in flight_cube.TIMES_OF_DAY
+                            ] + [flight_cube.NIGHT]:
+            selected = label == time_of_day
+            if not selected.any():
+                continue
+            count, count_ci = estimate_total(s, selected)
+            share, share_ci = estimate_ratio(s, selected & (delay > 0),
+                                             selected & delay.notna())
+            rows.append({"time_of_day": time_of_day,
+                         "flight_count": int(round(count)),
+                         "delay_percentage": round(100 * share, 2),
+                         "flight_count_ci": int(round(count_ci)),
+                         "delay_percentage_ci": round(100 * share_ci, 2)})
+        return pd.DataFrame(rows)
@@ -0,0 +1,72 @@
+import pandas as pd
+
+from flight_schema import apply_schema
+
+# Default number of rows held in memory at once when streaming a table
+DEFAULT_CHUNKSIZE = 50_000
+
+
+def iter_chunks(conn, query, chunksize=DEFAULT_CHUNKSIZE, params=None,
+                typed=False):
+    """
+    Yield the result of `query` as DataFrames of at most `chunksize` rows,
+    with the compact dtypes of flight_schema.py when `typed`.
+    """
+    for chunk in pd.read_sql_query(query, conn, params=params,
+                                   chunksize=chunksize):
+        yield apply_schema(chunk) if typed else chunk
+
+
+class GroupedMean:
+    """
+    Mergeable partial aggregate for a grouped mean.
+
+    Each chunk contributes a per-group sum and non-null count; the mean is
+    only taken at the end, so the result matches `groupby(...).mean()` on
+    the full table while only one chunk is held in memory.
+    """
+
+    def __init__(self, by, column):
+        self.by = by
+        self.column = column
+        self.sums = None
+        self.counts = None
+
+    def update(self, chunk):
+        grouped = chunk.groupby(self.by, observed=True)[self.column]
+        self._add(grouped.sum().astype("float64"),
+                  grouped.count().astype("int64"))
+        return self
+
+    def merge(self, other):
+        if other.sums is not None:
+            self._add(other.sums, other.counts)
+        return self
+
+    def _add(self, sums, counts):
+        if self.sums is None:
+            self.sums, self.counts = sums, counts
+        else:
+            self.sums = self.sums.add(sums, fill_value=0)
+            self.counts = self.counts.add(counts, fill_value=0).astype("int64")
+
+    def result(self):
+        """
+        The grouped mean and count of non-null values, like
+        `.agg(["mean", "count"]).reset_index()`.
+        """
+        if self.sums is None:
+            by = [self.by] if isinstance(self.by, str) else list(self.by)
+            return pd.DataFrame(columns=by + ["mean", "count"])
+        means = self.sums / self.counts.where(self.counts > 0)
+        return (pd.DataFrame({"mean": means, "count": self.counts})
+                .sort_index().reset_index())
+
+
+def fold_null_counts(chunks):
+    """Sum `isnull()` counts per column over an iterable of chunks."""
+    total = None
+    for chunk in chunks:
+        counts = chunk.isnull().sum()
+        total = counts if total is None else total.add(counts, fill_value=0)
+    return total.astype(int) if total is not None else pd.Series(dtype=int)
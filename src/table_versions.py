@@ -0,0 +1,230 @@
+"""
+Change tokens of the tables of the flights database, for cache invalidation.
+
+A connection kept open per database runs `PRAGMA data_version`, which only
+changes when another connection committed, so an unchanged database costs
+one pragma per check. After a commit the tokens are read again:
+
+- a counter per table in `table_changes`, bumped by triggers on every
+  insert, update and delete
+- the table's root page and CREATE statement, which change when it is
+  dropped and recreated or altered
+- the identity of the database file, which changes when it is replaced
+
+A cached result is still valid while the tokens of the tables it read are.
+
+Reading tokens never writes to the database. The counters and their
+triggers are a schema change, made by the explicit setup step `install`
+(run by the warm-up, the background jobs and `python src/table_versions.py`);
+on a read-only database, or for tables created since, the token of a table
+changes with every commit instead. The triggers cost one extra row update
+per changed row, so bulk writers wrap their transaction in `recording`,
+which mutes them and bumps the counters once.
+"""
+import argparse
+import contextlib
+import os
+import sqlite3
+import threading
+
+import db
+
+CHANGES_TABLE = "table_changes"
+OPERATIONS = ("INSERT", "UPDATE", "DELETE")
+
+_monitors = {}
+_lock = threading.Lock()
+
+
+def _trigger_name(table, operation):
+    return f"{CHANGES_TABLE}_{table}_{operation.lower()}"
+
+
+def install_triggers(conn, tables):
+    """
+    Count the changes to `tables` in `table_changes`.
+
+    The triggers are (re)created, so tables getting them here may have
+    changed untracked; their counter is bumped as well.
+    """
+    with conn:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0,
+                muted INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        if "muted" not in db.table_columns(conn, CHANGES_TABLE):
+            conn.execute(f"ALTER TABLE {CHANGES_TABLE} "
+                         "ADD COLUMN muted INTEGER NOT NULL DEFAULT 0")
+        for table in tables:
+            conn.execute(f"INSERT OR IGNORE INTO {CHANGES_TABLE} (name) "
+                         "VALUES (?)", (table,))
+            conn.execute(f"UPDATE {CHANGES_TABLE} SET version = version + 1 "
+                         "WHERE name = ?", (table,))
+            for operation in OPERATIONS:
+                name = _trigger_name(table, operation)
+                conn.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+                conn.execute(f"""
+                    CREATE TRIGGER "{name}"
+                    AFTER {operation} ON "{table}"
+                    WHEN (SELECT muted FROM {CHANGES_TABLE}
+                          WHERE name = '{table}') = 0
+                    BEGIN
+                        UPDATE {CHANGES_TABLE} SET version = version + 1
+                        WHERE name = '{table}';
+                    END
+                """)
+
+
+def _untracked(conn):
+    """The tables without change triggers (new, recreated or never set up)."""
+    tables = [name for (name,) in conn.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+    """) if name != CHANGES_TABLE]
+    # triggers of earlier versions count muted writes too: set up again
+    triggers = {name for name, sql in conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+        if "muted" in sql}
+    return [table for table in tables
+            if _trigger_name(table, "DELETE") not in triggers]
+
+
+def install(path=db.DB_PATH, tables=None):
+    """
+    Set up the change counters of those of `tables` (by default every
+    table) that have none yet; returns them. It writes the schema: run it
+    once, and again after creating or recreating tables.
+    """
+    conn = db.connect(path)
+    try:
+        untracked = _untracked(conn)
+        if tables is not None:
+            untracked = [table for table in untracked if table in tables]
+        if untracked:
+            install_triggers(conn, untracked)
+        return untracked
+    finally:
+        conn.close()
+
+
+@contextlib.contextmanager
+def recording(conn, tables):
+    """
+    One transaction on `conn` writing `tables`, counted as one change of
+    each instead of one per row. Nothing is counted for tables not set up.
+    """
+    try:
+        tracked = [name for (name,) in conn.execute(
+            f"SELECT name FROM {CHANGES_TABLE} WHERE name IN "
+            f"({', '.join(['?'] * len(tables))})", list(tables))]
+    except sqlite3.OperationalError:
+        tracked = []
+    marks = ", ".join(["?"] * len(tracked))
+    with conn:
+        if tracked:
+            conn.execute(f"UPDATE {CHANGES_TABLE} SET muted = 1 "
+                         f"WHERE name IN ({marks})", tracked)
+        yield conn
+        if tracked:
+            conn.execute(f"UPDATE {CHANGES_TABLE} "
+                         "SET muted = 0, version = version + 1 "
+                         f"WHERE name IN ({marks})", tracked)
+
+
+@contextlib.contextmanager
+def recording_reads(conn):
+    """Collect the names of the tables read by queries run on `conn`."""
+    tables = set()
+
+    def authorizer(action, table, column, database, source):
+        if action == sqlite3.SQLITE_READ and database in (None, "main"):
+            tables.add(table)
+        return sqlite3.SQLITE_OK
+
+    conn.set_authorizer(authorizer)
+    try:
+        yield tables
+    finally:
+        conn.set_authorizer(None)
+
+
+def _identity(path):
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino
+
+
+class _Monitor:
+    def __init__(self, path):
+        self.identity = _identity(path)
+        self.conn = db.connect(path, check_same_thread=False)
+        self.data_version = None
+        self.generation = 0
+        self.tokens = {}
+
+    def _read_tokens(self):
+        schema = {name: (rootpage, sql) for name, rootpage, sql in
+                  self.conn.execute("""
+                      SELECT name, rootpage, sql FROM sqlite_master
+                      WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+                  """) if name != CHANGES_TABLE}
+        # without triggers, these tables change with every commit
+        untracked = set(_untracked(self.conn))
+        try:
+            counters = dict(self.conn.execute(
+                f"SELECT name, version FROM {CHANGES_TABLE}"))
+        except sqlite3.OperationalError:
+            counters = {}
+        return {table: (self.identity, *schema[table],
+                        self.data_version if table in untracked
+                        else counters.get(table))
+                for table in schema}
+
+    def snapshot(self):
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self.data_version:
+            self.data_version = data_version
+            self.tokens = self._read_tokens()
+            self.generation += 1
+        return self.generation, self.tokens
+
+
+def snapshot(path=db.DB_PATH):
+    """
+    (generation, {table: token}) of the database at `path`.
+
+    The generation grows whenever the tokens were read again, i.e. after
+    another connection committed; the tokens tell which tables changed.
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        monitor = _monitors.get(path)
+        if monitor is None or monitor.identity != _identity(path):
+            if monitor is not None:
+                # the file was replaced: start over on the new one
+                monitor.conn.close()
+            monitor = _monitors[path] = _Monitor(path)
+        return monitor.snapshot()
+
+
+def versions(path=db.DB_PATH, tables=()):
+    """Hashable tokens of `tables`, for keying caches on their contents."""
+    tokens = snapshot(path)[1]
+    return tuple(tokens.get(table) for table in tables)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Set up the change counters the dashboard caches are "
+                    "keyed on.")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite database")
+    args = parser.parse_args(argv)
+    tables = install(args.db)
+    print(f"Change counters set up for {len(tables)} tables"
+          + (f": {', '.join(tables)}" if tables else ""))
+
+
+if __name__ == "__main__":
+    main()
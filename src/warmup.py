@@ -0,0 +1,117 @@
+"""
+Warm the shared caches after a deploy or restart.
+
+Streamlit runs no code before the first session connects, so the dashboard
+and every page call `start`; the first call starts a background thread and
+later calls only return. The thread sets up the change counters the
+caches are keyed on (table_versions.py), draws the sample of the
+approximate mode (sampling.py), matches every flight to its weather
+observation (weather_join.py), builds the in-memory structures most
+charts are answered from (flight_cube.py, prefix_sums.py,
+flight_columns.py), then runs the remaining queries of the most requested
+selections into the shared query cache (query_cache.py):
+
+- the main dashboard
+- the Flight Routes page for the `top_n` busiest routes
+- the Delay Analysis aggregates of each NYC airport for the full year
+"""
+import threading
+
+import db
+import dimensions
+import flight_columns
+import flight_cube
+import prefix_sums
+import queries
+import query_cache
+import sampling
+import table_versions
+import weather_join
+
+TOP_ROUTES = 20
+
+_progress = {"total": 0, "done": 0, "failed": 0, "step": None,
+             "running": False, "finished": False}
+_lock = threading.Lock()
+_thread = None
+
+
+def warmup_plan(path=db.DB_PATH, top_n=TOP_ROUTES):
+    """(step, query, typed) triples to run, in order."""
+    plan = [("Main dashboard", query, False)
+            for query in queries.dashboard_queries()]
+
+    plan.append(("Flight Routes", queries.query_route_origins, False))
+    for origin, dest in dimensions.get_route_index(path).top_routes(top_n):
+        plan += [(f"Flight Routes {origin}-{dest}", query, typed)
+                 for query, typed in queries.route_bundle(origin, dest)]
+
+    plan += [("Delay Analysis", queries.query_nyc_airports, False),
+             ("Delay Analysis", queries.query_date_range, False)]
+    date_range = query_cache.read_sql(queries.query_date_range, path)
+    min_date, max_date = date_range.loc[0, ["min_date", "max_date"]]
+    if min_date is None:
+        return plan
+    for origin in queries.NYC_ORIGINS:
+        plan += [(f"Delay Analysis {origin}", query, False) for query in
+                 queries.airport_bundle(origin, min_date, max_date)]
+    return plan
+
+
+def _update(**values):
+    with _lock:
+        _progress.update(values)
+
+
+def run(path=db.DB_PATH, top_n=TOP_ROUTES):
+    """Run the warm-up plan in the calling thread."""
+    _update(running=True, finished=False, done=0, failed=0,
+            step="Planning")
+    try:
+        plan = warmup_plan(path, top_n)
+    except Exception:
+        _update(running=False, finished=True, step=None, failed=1)
+        return
+    _update(total=len(plan))
+    # the sample first: it answers the approximate mode while the cube builds
+    for step, build in [("Change tracking", table_versions.install),
+                        ("Approximate-mode sample", sampling.ensure_sample),
+                        ("Flight weather", weather_join.ensure_flight_weather),
+                        ("Flight cube", flight_cube.get_flight_cube),
+                        ("Delay Analysis KPIs", prefix_sums.get_prefix_sums),
+                        ("Explorer", flight_columns.get_flight_columns)]:
+        _update(step=step)
+        try:
+            build(path)
+        except Exception:
+            with _lock:
+                _progress["failed"] += 1
+    for done, (step, query, typed) in enumerate(plan, start=1):
+        _update(step=step)
+        try:
+            query_cache.read_sql(query, path, typed)
+        except Exception:
+            # a failing query fails again for the user; keep warming the rest
+            with _lock:
+                _progress["failed"] += 1
+        _update(done=done)
+    _update(running=False, finished=True, step=None)
+
+
+def start(path=db.DB_PATH, top_n=TOP_ROUTES):
+    """Start the warm-up in a daemon thread, once per process."""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return _thread
+        _thread = threading.Thread(target=run, args=(path, top_n),
+                                   name="cache-warmup", daemon=True)
+        _progress["running"] = True
+        _thread.start()
+    return _thread
+
+
+def progress():
+    """Snapshot of the warm-up: total, done, failed, step, running, finished."""
+    with _lock:
+        return dict(_progress)
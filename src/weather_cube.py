@@ -0,0 +1,148 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import table_versions
+from weather_join import WEATHER_COLUMNS, observation_timestamps
+
+CUBE_PATH = os.path.join(os.path.dirname(__file__), "..", "data",
+                         "weather_cube.npy")
+
+
+def _meta_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def _interpolate_missing_hours(values, observed):
+    """
+    Linearly interpolate, along the hour axis, the hours without observation.
+
+    Values that are NaN in an existing observation (e.g. no wind gust) stay
+    NaN. Wind direction is interpolated through its sine/cosine so that a
+    gap between 350° and 10° is filled around north, not through south.
+    """
+    n_origins, n_hours, n_vars = values.shape
+    wind = WEATHER_COLUMNS.index("wind_dir")
+    radians = np.radians(values[:, :, wind])
+    stacked = np.concatenate(
+        [values, np.sin(radians)[..., None], np.cos(radians)[..., None]],
+        axis=2)
+
+    # one column per (origin, variable), hours as rows
+    table = pd.DataFrame(
+        stacked.transpose(1, 0, 2).reshape(n_hours, -1))
+    table = table.where(np.repeat(observed.T, n_vars + 2, axis=1))
+    table = table.interpolate(limit_direction="both")
+    filled = table.to_numpy().reshape(n_hours, n_origins, n_vars + 2)
+    filled = filled.transpose(1, 0, 2)
+
+    filled[:, :, wind] = np.degrees(
+        np.arctan2(filled[:, :, n_vars], filled[:, :, n_vars + 1])) % 360
+    filled = filled[:, :, :n_vars]
+    return np.where(observed[..., None], values, filled).astype(np.float32)
+
+
+def build_weather_cube(conn, path=CUBE_PATH, weather_version=None):
+    """
+    Build the (origin, hour, variable) weather array and save it as `.npy`.
+
+    Hour 0 is the first local hour of the first observed day; the origins,
+    the start, the variable order and `weather_version` (the version of the
+    weather table it was built from) are stored next to it in a `.json`.
+    """
+    weather = pd.read_sql_query(f"""
+        SELECT origin, year, month, day, hour, {', '.join(WEATHER_COLUMNS)}
+        FROM weather
+    """, conn)
+    weather["timestamp"] = observation_timestamps(weather)
+
+    origins = sorted(weather["origin"].unique())
+    start = weather["timestamp"].min().normalize()
+    hours = ((weather["timestamp"] - start) // pd.Timedelta(hours=1))
+    hours = hours.to_numpy()
+    n_hours = int(hours.max()) + 1
+    origin_idx = pd.Categorical(weather["origin"], categories=origins).codes
+
+    values = np.full((len(origins), n_hours, len(WEATHER_COLUMNS)), np.nan,
+                     dtype=np.float32)
+    values[origin_idx, hours] = weather[WEATHER_COLUMNS].to_numpy(np.float32)
+    observed = np.zeros((len(origins), n_hours), dtype=bool)
+    observed[origin_idx, hours] = True
+
+    values = _interpolate_missing_hours(values, observed)
+
+    np.save(path, values)
+    with open(_meta_path(path), "w") as f:
+        json.dump({"origins": origins, "start": start.isoformat(),
+                   "variables": WEATHER_COLUMNS,
+                   "weather_version": weather_version}, f)
+    return load_weather_cube(path)
+
+
+def load_weather_cube(path=CUBE_PATH):
+    """Open a saved weather cube memory-mapped (nothing is read up front)."""
+    with open(_meta_path(path)) as f:
+        meta = json.load(f)
+    values = np.load(path, mmap_mode="r")
+    return WeatherCube(values, meta["origins"], pd.Timestamp(meta["start"]),
+                       meta["variables"])
+
+
+def _json_version(version):
+    # as stored in the JSON meta file (tuples become lists)
+    return json.loads(json.dumps(version))
+
+
+def ensure_weather_cube(conn, db_path, path=CUBE_PATH, weather_version=None):
+    """
+    Load the cube, rebuilding it when missing or when the weather table
+    changed since it was built (writes to other tables keep it).
+
+    `weather_version` is the token of `weather` (table_versions.versions)
+    the caller keys on; it is read here when None.
+    """
+    if weather_version is None:
+        weather_version = table_versions.versions(db_path, ["weather"])[0]
+    version = _json_version(weather_version)
+    if os.path.exists(path) and os.path.exists(_meta_path(path)):
+        with open(_meta_path(path)) as f:
+            if json.load(f).get("weather_version") == version:
+                return load_weather_cube(path)
+    return build_weather_cube(conn, path, version)
+
+
+class WeatherCube:
+    """Hourly weather per origin, looked up by index arithmetic only."""
+
+    def __init__(self, values, origins, start, variables=WEATHER_COLUMNS):
+        self.values = values
+        self.origins = list(origins)
+        self.start = start
+        self.variables = list(variables)
+        self._origin_index = {o: i for i, o in enumerate(self.origins)}
+
+    def lookup(self, origins, timestamps):
+        """
+        Weather at the nearest hour for each (origin, timestamp) pair.
+
+        Both arguments are array-likes of equal length; unknown origins and
+        timestamps outside the cube give NaN rows.
+        """
+        origin_idx = pd.Series(origins).map(self._origin_index)
+        timestamps = pd.to_datetime(pd.Series(timestamps))
+        hours = ((timestamps - self.start) / pd.Timedelta(hours=1)).round()
+
+        valid = (origin_idx.notna() & hours.between(0, self.values.shape[1] - 1)
+                 ).to_numpy()
+        result = np.full((len(valid), len(self.variables)), np.nan,
+                         dtype=np.float32)
+        result[valid] = self.values[
+            origin_idx[valid].astype(int).to_numpy(),
+            hours[valid].astype(int).to_numpy()]
+        return pd.DataFrame(result, columns=self.variables)
+
+    def at(self, origin, timestamp):
+        """Weather at the nearest hour for a single origin and timestamp."""
+        return self.lookup([origin], [timestamp]).iloc[0]
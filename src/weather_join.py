@@ -0,0 +1,210 @@
+import sqlite3
+
+import pandas as pd
+
+import db
+import table_versions
+
+# Observations further away than this from the departure are not attached
+DEFAULT_TOLERANCE = pd.Timedelta(hours=2)
+
+# flights.rowid -> weather.rowid of the nearest observation, see
+# `ensure_flight_weather`
+MAP_TABLE = "flight_weather"
+# SQL variables per query in `weather_for_flights` (999 in older SQLite)
+_BATCH = 500
+
+WEATHER_COLUMNS = ["temp", "dewp", "humid", "wind_dir", "wind_speed",
+                   "wind_gust", "precip", "pressure", "visib"]
+
+
+def departure_timestamps(flights):
+    """
+    Local departure time of each flight as datetime64.
+
+    The scheduled time plus the departure delay is used, so departures that
+    slip past midnight land on the next day; without a delay the scheduled
+    time is used.
+    """
+    hhmm = pd.to_numeric(flights["sched_dep_time"])
+    minutes = (hhmm // 100) * 60 + hhmm % 100
+    minutes = minutes + pd.to_numeric(flights["dep_delay"]).fillna(0)
+    dates = pd.to_datetime(flights[["year", "month", "day"]].astype("int64"))
+    return dates + pd.to_timedelta(minutes.astype("float64"), unit="min")
+
+
+def observation_timestamps(weather):
+    """Local time of each hourly weather observation as datetime64."""
+    dates = pd.to_datetime(weather[["year", "month", "day"]].astype("int64"))
+    hours = pd.to_numeric(weather["hour"]).astype("float64")
+    return dates + pd.to_timedelta(hours, unit="h")
+
+
+def attach_weather(flights, weather, on="timestamp",
+                   tolerance=DEFAULT_TOLERANCE, direction="nearest"):
+    """
+    Attach the closest weather observation of the same origin to every flight.
+
+    Both frames need an `origin` column and a datetime64 `on` column. This is
+    a single `merge_asof` pass: unlike an exact merge on the hour, flights
+    whose hour has no observation keep the closest one within `tolerance`
+    (NaN weather beyond it). `direction` is "backward", "forward" or
+    "nearest". The result has the same rows and index order as `flights`,
+    plus `weather_time` holding the matched observation time.
+    """
+    left = flights.assign(_order=range(len(flights)))
+    left = left.sort_values([on, "origin"], kind="stable")
+    right = weather.assign(weather_time=weather[on])
+    right = right.sort_values([on, "origin"], kind="stable")
+
+    merged = pd.merge_asof(
+        left,
+        right.drop(columns=[c for c in right.columns
+                            if c in left.columns and c not in (on, "origin")]),
+        on=on,
+        by="origin",
+        tolerance=tolerance,
+        direction=direction,
+    )
+    merged = merged.sort_values("_order")
+    merged.index = flights.index
+    return merged.drop(columns="_order")
+
+
+def build_flight_weather(conn, tolerance=DEFAULT_TOLERANCE, direction="nearest"):
+    """
+    Store the nearest weather observation of every flight in `flight_weather`.
+
+    The table maps flights.rowid to weather.rowid (with the time offset in
+    minutes), is indexed both ways and is rebuilt as a whole. Its meta
+    table records the change counters of `flights` and `weather` it was
+    built from (table_versions.py).
+    """
+    # read first: a write made during the build makes the mapping stale
+    try:
+        counters = dict(conn.execute(f"""
+            SELECT name, version FROM {table_versions.CHANGES_TABLE}
+            WHERE name IN ('flights', 'weather')
+        """))
+    except sqlite3.OperationalError:
+        # not set up (table_versions.install): the mapping is never current
+        counters = {}
+    flights = pd.read_sql_query("""
+        SELECT rowid AS flight_rowid, origin, year, month, day,
+               sched_dep_time, dep_delay
+        FROM flights
+    """, conn)
+    weather = pd.read_sql_query("""
+        SELECT rowid AS weather_rowid, origin, year, month, day, hour
+        FROM weather
+    """, conn)
+
+    flights["timestamp"] = departure_timestamps(flights)
+    weather["timestamp"] = observation_timestamps(weather)
+    weather = weather[["weather_rowid", "origin", "timestamp"]]
+
+    matched = attach_weather(flights[["flight_rowid", "origin", "timestamp"]],
+                             weather, tolerance=tolerance, direction=direction)
+    matched = matched.dropna(subset=["weather_rowid"])
+    matched["offset_minutes"] = (
+        (matched["weather_time"] - matched["timestamp"]).dt.total_seconds() / 60
+    ).round()
+    mapping = matched[["flight_rowid", "weather_rowid", "offset_minutes"]]
+    mapping = mapping.astype("int64")
+
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {MAP_TABLE}")
+        conn.execute(f"""
+            CREATE TABLE {MAP_TABLE} (
+                flight_rowid INTEGER PRIMARY KEY,
+                weather_rowid INTEGER NOT NULL,
+                offset_minutes INTEGER NOT NULL
+            )
+        """)
+        conn.executemany(f"INSERT INTO {MAP_TABLE} VALUES (?, ?, ?)",
+                         mapping.itertuples(index=False, name=None))
+        conn.execute(f"""
+            CREATE INDEX idx_{MAP_TABLE}_weather
+            ON {MAP_TABLE}(weather_rowid)
+        """)
+        conn.execute(f"DROP TABLE IF EXISTS {MAP_TABLE}_meta")
+        conn.execute(f"""
+            CREATE TABLE {MAP_TABLE}_meta (
+                tolerance_minutes INTEGER, direction TEXT,
+                flights_version INTEGER, weather_version INTEGER
+            )
+        """)
+        conn.execute(f"INSERT INTO {MAP_TABLE}_meta VALUES (?, ?, ?, ?)",
+                     (_minutes(tolerance), direction,
+                      counters.get("flights"), counters.get("weather")))
+    return len(mapping)
+
+
+def _minutes(tolerance):
+    return int(tolerance.total_seconds() // 60)
+
+
+def _is_current(conn, tolerance, direction):
+    try:
+        current = conn.execute(f"""
+            SELECT m.flights_version = f.version
+                   AND m.weather_version = w.version
+                   AND m.tolerance_minutes = ? AND m.direction = ?
+            FROM {MAP_TABLE}_meta m
+            JOIN {table_versions.CHANGES_TABLE} f ON f.name = 'flights'
+            JOIN {table_versions.CHANGES_TABLE} w ON w.name = 'weather'
+        """, (_minutes(tolerance), direction)).fetchone()
+    except sqlite3.OperationalError:
+        return False
+    return bool(current and current[0])
+
+
+def is_current(path=db.DB_PATH, tolerance=DEFAULT_TOLERANCE,
+               direction="nearest"):
+    """Whether `flight_weather` matches the current flights and weather."""
+    conn = db.connect(path)
+    try:
+        return _is_current(conn, tolerance, direction)
+    finally:
+        conn.close()
+
+
+def ensure_flight_weather(path=db.DB_PATH, tolerance=DEFAULT_TOLERANCE,
+                          direction="nearest"):
+    """
+    Rebuild `flight_weather` when `flights` or `weather` changed since it
+    was built, or it was built with other parameters.
+    """
+    # the mapping records the change counters of both tables
+    table_versions.install(path, ["flights", "weather"])
+    conn = db.connect(path)
+    try:
+        if not _is_current(conn, tolerance, direction):
+            build_flight_weather(conn, tolerance, direction)
+    finally:
+        conn.close()
+
+
+def weather_for_flights(conn, flight_rowids=None, columns=WEATHER_COLUMNS):
+    """
+    The matched weather observation of each of `flight_rowids` (all flights
+    when None) from `flight_weather`; flights without one are left out.
+    """
+    select = f"""
+        SELECT fw.flight_rowid, fw.offset_minutes,
+               {', '.join('w.' + c for c in columns)}
+        FROM {MAP_TABLE} fw
+        JOIN weather w ON w.rowid = fw.weather_rowid
+    """
+    if flight_rowids is None:
+        return pd.read_sql_query(select, conn)
+    flight_rowids = [int(rowid) for rowid in flight_rowids]
+    batches = [flight_rowids[i:i + _BATCH]
+               for i in range(0, len(flight_rowids), _BATCH)]
+    if not batches:
+        return pd.read_sql_query(select + " WHERE 0", conn)
+    return pd.concat(
+        [pd.read_sql_query(
+            select + f" WHERE fw.flight_rowid IN "
+                     f"({', '.join(['?'] * len(batch))})", conn, params=batch)
+         for batch in batches], ignore_index=True)
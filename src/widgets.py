@@ -0,0 +1,240 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import db
+import dimensions
+import export
+import table_versions
+
+
+def search_airports(codes, query, labels):
+    """
+    Filter airport `codes` on `query` (case-insensitive, code or name).
+
+    Codes starting with the query come first, then other label matches, in
+    their original order.
+    """
+    query = query.strip().lower()
+    if not query:
+        return list(codes)
+    codes = pd.Series(list(codes), dtype=object)
+    text = codes.map(labels).fillna(codes).str.lower()
+    prefix = codes.str.lower().str.startswith(query)
+    contains = text.str.contains(query, regex=False)
+    return codes[prefix].tolist() + codes[contains & ~prefix].tolist()
+
+
+def airport_selectbox(label, codes, index=0, key=None, searchable=False,
+                      container=st.sidebar, db_path=db.DB_PATH):
+    """
+    Selectbox over airport codes labelled 'FAA - Name'.
+
+    Labels come from the shared dimension cache, so formatting an option is
+    a dict lookup. The selectbox already filters as you type; with
+    `searchable` an extra search box narrows long lists up front. Returns
+    the selected code, or None when the search matches nothing.
+    """
+    labels = dimensions.get_dimensions(db_path).airport_labels
+    options = list(codes)
+
+    if searchable:
+        query = container.text_input(f"Search {label.lower()}",
+                                     key=f"{key or label}_search",
+                                     placeholder="Code or airport name")
+        options = search_airports(options, query, labels)
+        if not options:
+            container.warning(f"No airport matches '{query}'.")
+            return None
+
+    return container.selectbox(label, options,
+                               index=min(index, len(options) - 1),
+                               format_func=lambda code: labels.get(code, code),
+                               key=key)
+
+
+def _hhmm_labels(times):
+    """Format HHMM numbers as 'HH:MM' strings, 'N/A' when missing."""
+    text = pd.to_numeric(times).round().astype("Int64").astype("string")
+    text = text.str.zfill(4)
+    return (text.str[:2] + ":" + text.str[2:]).fillna("N/A")
+
+
+def flight_labels(flights):
+    """
+    Selectbox labels for flight rows, built with vectorized string operations.
+
+    'YYYY-MM-DD | Flight XX123 | Dep: HH:MM → Arr: HH:MM | Tail: N123'
+    followed by a delay marker when the departure or arrival is over 15
+    minutes late. The result has the same index as `flights`.
+    """
+    def two_digits(column):
+        return flights[column].astype("Int64").astype("string").str.zfill(2)
+
+    dates = (flights["year"].astype("Int64").astype("string") + "-"
+             + two_digits("month") + "-" + two_digits("day"))
+    dep_delay = pd.to_numeric(flights["dep_delay"]).fillna(0)
+    arr_delay = pd.to_numeric(flights["arr_delay"]).fillna(0)
+    status = pd.Series(np.select(
+        [dep_delay > 15, arr_delay > 15],
+        [" [DEPARTURE DELAYED]", " [ARRIVAL DELAYED]"], ""), index=flights.index)
+
+    return (dates
+            + " | Flight " + flights["carrier"].astype(str)
+            + flights["flight"].astype("Int64").astype("string")
+            + " | Dep: " + _hhmm_labels(flights["dep_time"])
+            + " → Arr: " + _hhmm_labels(flights["arr_time"])
+            + " | Tail: " + flights["tailnum"].astype(object).fillna("N/A").astype(str)
+            + status).astype(object)
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _cached_flight_labels(route_key, flights_version, _flights):
+    # `_flights` is not hashed: the labels are cached per route and dates,
+    # and built again when `flights` changes
+    return flight_labels(_flights)
+
+
+def flight_picker(flights, route_key, page_size=100, container=st,
+                  db_path=db.DB_PATH):
+    """
+    Pick one flight of `flights` (one route and date range).
+
+    Labels are built once per `route_key` (e.g. origin, dest and dates) and
+    version of the `flights` table of `db_path`.
+    The flights can be filtered by date, carrier and delayed-only, and only
+    one page of `page_size` matches is sent to the selectbox. Returns the
+    index label of the selected flight, or None when nothing matches.
+    """
+    labels = _cached_flight_labels(
+        route_key, table_versions.versions(db_path, ["flights"]), flights)
+    dates = pd.to_datetime(flights[["year", "month", "day"]].astype("int64"))
+
+    filter_cols = container.columns([2, 2, 1])
+    with filter_cols[0]:
+        first, last = dates.min().date(), dates.max().date()
+        day_range = st.date_input("Flight dates", (first, last),
+                                  min_value=first, max_value=last,
+                                  key=f"{route_key}_dates")
+    with filter_cols[1]:
+        carriers = st.multiselect(
+            "Carriers", sorted(flights["carrier"].astype(str).unique()),
+            key=f"{route_key}_carriers")
+    with filter_cols[2]:
+        delayed_only = st.checkbox("Delayed only", key=f"{route_key}_delayed")
+
+    mask = pd.Series(True, index=flights.index)
+    if len(day_range) == 2:
+        mask &= dates.between(pd.Timestamp(day_range[0]),
+                              pd.Timestamp(day_range[1]))
+    if carriers:
+        mask &= flights["carrier"].astype(str).isin(carriers)
+    if delayed_only:
+        mask &= labels.str.endswith("DELAYED]")
+
+    matches = labels[mask]
+    if matches.empty:
+        container.info("No flight matches these filters.")
+        return None
+
+    n_pages = (len(matches) - 1) // page_size + 1
+    page = 1
+    if n_pages > 1:
+        page = container.number_input(
+            f"Page (of {n_pages}, {len(matches)} flights)", min_value=1,
+            max_value=n_pages, value=1, step=1, key=f"{route_key}_page")
+    matches = matches.iloc[(page - 1) * page_size:page * page_size]
+
+    return container.selectbox(
+        "Choose a flight to view its wind direction analysis:",
+        options=matches.index.tolist(),
+        format_func=matches.get,
+        key=f"{route_key}_flight")
+
+
+# larger exports are left to the command line (export.py): a download is
+# held in memory by the server
+MAX_DOWNLOAD_ROWS = 100_000
+# temporary export files; the ones older than EXPORT_MAX_AGE (s) are left by
+# sessions that ended and are removed
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "flights_exports")
+EXPORT_MAX_AGE = 3600
+
+
+def _remove_old_exports():
+    try:
+        names = os.listdir(EXPORT_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if time.time() - os.path.getmtime(path) > EXPORT_MAX_AGE:
+                os.remove(path)
+        except OSError:
+            # removed by another session
+            pass
+
+
+def _discard_export(state_key):
+    previous = st.session_state.pop(state_key, None)
+    if previous and os.path.exists(previous[0]):
+        os.remove(previous[0])
+
+
+def export_button(filters, key, container=st, db_path=db.DB_PATH):
+    """
+    Export the flights matching `filters` (see `export.flights_query`).
+
+    Up to MAX_DOWNLOAD_ROWS flights are streamed to a temporary file with a
+    progress bar, then offered for download while the filters and format
+    stay the same; the file is removed once downloaded, or by the next
+    export. More flights are left to the command line shown instead.
+    """
+    fmt = container.radio("Format", export.FORMATS, horizontal=True,
+                          key=f"{key}_export_format")
+    state_key = f"{key}_export_file"
+    if container.button("Prepare export", key=f"{key}_export"):
+        _discard_export(state_key)
+        _remove_old_exports()
+        rows = export.count_flights(db_path, **filters)
+        if rows > MAX_DOWNLOAD_ROWS:
+            container.warning(
+                f"{rows:,} flights are too many to download here (at most "
+                f"{MAX_DOWNLOAD_ROWS:,}). Export them from the command line:")
+            container.code(export.command_line(f"flights_{key}.{fmt}",
+                                               **filters), language="bash")
+            return
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        fd, out = tempfile.mkstemp(suffix=f".{fmt}", dir=EXPORT_DIR)
+        os.close(fd)
+        bar = container.progress(0.0, text="Exporting flights")
+
+        def report(done, total):
+            bar.progress(done / max(total, 1),
+                         text=f"Exporting flights: {done:,} of {total:,}")
+
+        try:
+            rows = export.export_flights(out, fmt, path=db_path,
+                                         progress=report, **filters)
+        except BaseException:
+            os.remove(out)
+            raise
+        st.session_state[state_key] = (out, fmt, rows, filters)
+
+    if state_key in st.session_state:
+        out, exported_fmt, rows, exported = st.session_state[state_key]
+        if (exported_fmt, exported) == (fmt, filters) and os.path.exists(out):
+            with open(out, "rb") as f:
+                container.download_button(
+                    f"Download {rows:,} flights ({fmt})", f,
+                    file_name=f"flights_{key}.{fmt}",
+                    mime=export.MIME_TYPES[fmt], key=f"{key}_download",
+                    on_click=_discard_export, args=(state_key,))
+        else:
+            # the filters or the format changed since
+            _discard_export(state_key)
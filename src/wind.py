@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+import db
+import table_versions
+import weather_join
+
+# wind_speed in the weather table is in mph
+MPH_TO_KNOTS = 0.868976
+
+WIND_COLUMNS = ["route_bearing", "headwind", "crosswind"]
+
+
+def route_bearings(lat1, lon1, lat2, lon2):
+    """Initial compass bearing (0° = north) from point 1 to point 2, vectorized."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype="float64"))
+                              for v in (lat1, lon1, lat2, lon2))
+    diff_long = lon2 - lon1
+    x = np.sin(diff_long) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * \
+        np.cos(lat2) * np.cos(diff_long)
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+def wind_components(bearing, wind_dir, wind_speed):
+    """
+    Split the wind into headwind and crosswind components, in knots.
+
+    `wind_dir` is where the wind blows from, as in the weather table. The
+    headwind is positive against the aircraft (negative is a tailwind) and
+    the crosswind is positive when the wind comes from the right.
+    """
+    angle = np.radians(np.asarray(wind_dir, dtype="float64")
+                       - np.asarray(bearing, dtype="float64"))
+    speed = np.asarray(wind_speed, dtype="float64") * MPH_TO_KNOTS
+    return speed * np.cos(angle), speed * np.sin(angle)
+
+
+def compute_wind_components(flights, airports, cube):
+    """
+    Route bearing, headwind and crosswind for every row of `flights`.
+
+    `flights` needs origin, dest and the columns of
+    `weather_join.departure_timestamps`; the wind at departure is read from
+    the weather cube. Rows without coordinates or weather give NaN.
+    """
+    coords = airports.set_index("faa")[["lat", "lon"]]
+    origin = coords.reindex(flights["origin"].astype(object)).to_numpy()
+    dest = coords.reindex(flights["dest"].astype(object)).to_numpy()
+    bearing = route_bearings(origin[:, 0], origin[:, 1], dest[:, 0], dest[:, 1])
+
+    weather = cube.lookup(flights["origin"].astype(object).to_numpy(),
+                          weather_join.departure_timestamps(flights))
+    headwind, crosswind = wind_components(
+        bearing, weather["wind_dir"], weather["wind_speed"])
+    return pd.DataFrame({"route_bearing": bearing, "headwind": headwind,
+                         "crosswind": crosswind}, index=flights.index)
+
+
+def has_wind_columns(conn):
+    """Whether `update_wind_components` has added its columns to `flights`."""
+    return set(WIND_COLUMNS) <= set(db.table_columns(conn, "flights"))
+
+
+def update_wind_components(conn, cube, full=False):
+    """
+    Store route bearing, headwind and crosswind as columns on `flights`.
+
+    Only rows added since the previous run are computed, unless `full` is
+    set (e.g. after the weather changed). All updates are written in one
+    transaction. Returns the number of flights processed.
+    """
+    existing = db.table_columns(conn, "flights")
+    for column in WIND_COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE flights ADD COLUMN {column} REAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS wind_components_meta (max_rowid INTEGER)
+    """)
+
+    last_rowid = conn.execute(
+        "SELECT MAX(max_rowid) FROM wind_components_meta").fetchone()[0]
+    if full or last_rowid is None:
+        last_rowid = 0
+
+    flights = pd.read_sql_query("""
+        SELECT rowid AS flight_rowid, origin, dest, year, month, day,
+               sched_dep_time, dep_delay
+        FROM flights
+        WHERE rowid > ?
+    """, conn, params=(last_rowid,))
+    if flights.empty:
+        return 0
+    airports = pd.read_sql_query("SELECT faa, lat, lon FROM airports", conn)
+
+    components = compute_wind_components(flights, airports, cube)
+    components = components.round(2).astype(object)
+    components = components.where(components.notna(), None)
+    components["flight_rowid"] = flights["flight_rowid"].astype(int).tolist()
+
+    with table_versions.recording(conn, ["flights"]):
+        conn.executemany(
+            "UPDATE flights SET route_bearing = ?, headwind = ?, crosswind = ? "
+            "WHERE rowid = ?",
+            components.itertuples(index=False, name=None))
+        conn.execute("DELETE FROM wind_components_meta")
+        conn.execute("INSERT INTO wind_components_meta VALUES (?)",
+                     (int(flights["flight_rowid"].max()),))
+    return len(flights)
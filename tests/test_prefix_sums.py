@@ -0,0 +1,131 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import prefix_sums
+
+ROUTES = [("JFK", "ATL", "DL"), ("LGA", "ATL", "DL"), ("LGA", "ORD", "AA"),
+          ("EWR", "ORD", "UA")]
+
+
+def _flights(n, month, seed):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(n):
+        origin, dest, carrier = ROUTES[rng.integers(len(ROUTES))]
+        dep_delay = None if rng.random() < 0.1 else int(rng.integers(-10, 60))
+        arr_delay = None if rng.random() < 0.1 else int(rng.integers(-20, 80))
+        rows.append((2023, month, int(rng.integers(1, 29)), origin, dest,
+                     carrier, dep_delay, arr_delay))
+    return rows
+
+
+def _insert(path, rows):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         rows)
+    conn.close()
+
+
+def _execute(path, sql):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(sql)
+    conn.close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "flights.db")
+    _execute(path, """
+        CREATE TABLE flights (year INTEGER, month INTEGER, day INTEGER,
+                              origin TEXT, dest TEXT, carrier TEXT,
+                              dep_delay REAL, arr_delay REAL)
+    """)
+    _insert(path, _flights(500, 1, seed=0))
+    return path
+
+
+def _reference(path, level, key, start, end):
+    """The KPIs of `prefix_sums.kpis` computed in SQL."""
+    columns = prefix_sums.LEVELS[level]
+    where = " AND ".join(f"{column} = ?" for column in columns)
+    conn = sqlite3.connect(path)
+    flights, dep, arr, delayed = conn.execute(f"""
+        SELECT COUNT(*), AVG(dep_delay), AVG(arr_delay),
+               TOTAL(dep_delay > 15)
+        FROM flights
+        WHERE {where}
+          AND date(printf('%04d-%02d-%02d', year, month, day))
+              BETWEEN ? AND ?
+    """, (*key, start, end)).fetchone()
+    conn.close()
+    return {"total_flights": flights,
+            "avg_dep_delay": np.nan if dep is None else dep,
+            "avg_arr_delay": np.nan if arr is None else arr,
+            "delay_rate": 100 * delayed / flights if flights else 0.0}
+
+
+def _assert_matches(path):
+    sums = prefix_sums.get_prefix_sums(path)
+    for level, columns in prefix_sums.LEVELS.items():
+        keys = {route[:1] if level == "origin" else
+                (route[0], route[1] if level == "route" else route[2])
+                for route in ROUTES}
+        for key in keys:
+            for start, end in [("2023-01-01", "2023-12-31"),
+                               ("2023-01-05", "2023-01-20"),
+                               ("2023-02-10", "2023-02-10")]:
+                got = sums.kpis(level, key, start, end)
+                expected = _reference(path, level, key, start, end)
+                assert got == pytest.approx(expected, nan_ok=True), \
+                    (level, key, start, end)
+
+
+def test_matches_sql(db_path):
+    _assert_matches(db_path)
+
+
+def test_appended_days(db_path):
+    before = prefix_sums.get_prefix_sums(db_path)
+    _insert(db_path, _flights(200, 2, seed=1))
+    after = prefix_sums.get_prefix_sums(db_path)
+    assert after is not before
+    # the totals of the earlier days were kept, not summed again
+    assert after.levels["origin"].keys[:len(before.levels["origin"].keys)] \
+        == before.levels["origin"].keys
+    _assert_matches(db_path)
+
+
+def test_flights_moved_to_another_key(db_path):
+    prefix_sums.get_prefix_sums(db_path)
+    _execute(db_path, "UPDATE flights SET dest = 'ORD' "
+                      "WHERE origin = 'LGA' AND dest = 'ATL'")
+    assert prefix_sums.get_prefix_sums(db_path).kpis(
+        "route", ("LGA", "ATL"), "2023-01-01", "2023-12-31"
+    )["total_flights"] == 0
+    _assert_matches(db_path)
+
+
+@pytest.mark.parametrize("sql", [
+    "UPDATE flights SET dep_delay = 30 WHERE dep_delay IS NULL",
+    "UPDATE flights SET arr_delay = NULL WHERE arr_delay > 50",
+    "DELETE FROM flights WHERE carrier = 'UA'",
+    "INSERT INTO flights VALUES (2023, 1, 3, 'JFK', 'ATL', 'DL', 20, 25)",
+])
+def test_changes_to_summed_days(db_path, sql):
+    prefix_sums.get_prefix_sums(db_path)
+    _execute(db_path, sql)
+    _assert_matches(db_path)
+
+
+def test_refresh_leaves_the_previous_sums(db_path):
+    before = prefix_sums.get_prefix_sums(db_path)
+    expected = before.kpis("origin", "LGA", "2023-01-01", "2023-12-31")
+    _execute(db_path, "DELETE FROM flights WHERE origin = 'LGA'")
+    prefix_sums.get_prefix_sums(db_path)
+    # a reader holding the old instance still gets its totals
+    assert before.kpis("origin", "LGA", "2023-01-01",
+                       "2023-12-31") == expected
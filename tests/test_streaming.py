@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import streaming
+
+
+@pytest.fixture
+def flights():
+    rng = np.random.default_rng(0)
+    delays = rng.integers(-20, 120, 1000).astype("float64")
+    delays[rng.random(1000) < 0.1] = np.nan
+    return pd.DataFrame({
+        "carrier": rng.choice(["AA", "DL", "UA", "B6"], 1000),
+        "origin": rng.choice(["JFK", "LGA", "EWR"], 1000),
+        "arr_delay": delays,
+    })
+
+
+def _chunks(df, size):
+    return [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+
+@pytest.mark.parametrize("by", ["carrier", ["origin", "carrier"]])
+def test_grouped_mean_matches_groupby(flights, by):
+    folded = streaming.GroupedMean(by, "arr_delay")
+    for chunk in _chunks(flights, 128):
+        folded.update(chunk)
+    expected = (flights.groupby(by)["arr_delay"].agg(["mean", "count"])
+                .reset_index())
+    pd.testing.assert_frame_equal(folded.result(), expected,
+                                  check_dtype=False)
+
+
+def test_grouped_mean_merge(flights):
+    halves = [streaming.GroupedMean("carrier", "arr_delay").update(half)
+              for half in _chunks(flights, 500)]
+    merged = halves[0].merge(halves[1]).result()
+    whole = streaming.GroupedMean("carrier", "arr_delay").update(
+        flights).result()
+    pd.testing.assert_frame_equal(merged, whole)
+
+
+def test_grouped_mean_without_values():
+    result = streaming.GroupedMean(["origin"], "arr_delay").result()
+    assert list(result.columns) == ["origin", "mean", "count"]
+    assert result.empty
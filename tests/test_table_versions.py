@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+import table_versions
+
+
+def _execute(path, *statements):
+    conn = sqlite3.connect(path)
+    with conn:
+        for sql in statements:
+            conn.execute(sql)
+    conn.close()
+
+
+def _schema(path):
+    conn = sqlite3.connect(path)
+    schema = conn.execute(
+        "SELECT type, name FROM sqlite_master ORDER BY name").fetchall()
+    conn.close()
+    return schema
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "flights.db")
+    _execute(path, "CREATE TABLE flights (origin TEXT, dep_delay REAL)",
+             "CREATE TABLE planes (tailnum TEXT)",
+             "INSERT INTO flights VALUES ('JFK', 5), ('LGA', 20)")
+    return path
+
+
+def test_reading_versions_does_not_write(db_path):
+    before = _schema(db_path)
+    table_versions.versions(db_path, ["flights", "planes"])
+    assert _schema(db_path) == before
+
+
+def test_untracked_tables_change_with_every_commit(db_path):
+    flights, planes = table_versions.versions(db_path, ["flights", "planes"])
+    _execute(db_path, "INSERT INTO planes VALUES ('N1')")
+    after = table_versions.versions(db_path, ["flights", "planes"])
+    assert after[0] != flights and after[1] != planes
+
+
+def test_installed_tables_change_on_their_own_writes(db_path):
+    assert sorted(table_versions.install(db_path)) == ["flights", "planes"]
+    assert table_versions.install(db_path) == []
+    flights, planes = table_versions.versions(db_path, ["flights", "planes"])
+    _execute(db_path, "UPDATE flights SET dep_delay = 0")
+    after = table_versions.versions(db_path, ["flights", "planes"])
+    assert after[0] != flights and after[1] == planes
+
+
+def test_recording_counts_one_change(db_path):
+    table_versions.install(db_path)
+    conn = sqlite3.connect(db_path)
+    version = "SELECT version FROM table_changes WHERE name = 'flights'"
+    before = conn.execute(version).fetchone()[0]
+    with table_versions.recording(conn, ["flights"]):
+        conn.executemany("INSERT INTO flights VALUES (?, ?)",
+                         [("EWR", delay) for delay in range(100)])
+    assert conn.execute(version).fetchone()[0] == before + 1
+    # the triggers count again, once per row, after the transaction
+    with conn:
+        conn.execute("DELETE FROM flights WHERE dep_delay < 3")
+    assert conn.execute(version).fetchone()[0] == before + 1 + 3
+    conn.close()
+
+
+def test_recording_rolls_back_on_error(db_path):
+    table_versions.install(db_path)
+    conn = sqlite3.connect(db_path)
+    with pytest.raises(ZeroDivisionError):
+        with table_versions.recording(conn, ["flights"]):
+            conn.execute("DELETE FROM flights")
+            1 / 0
+    assert conn.execute("SELECT COUNT(*) FROM flights").fetchone()[0] == 2
+    assert conn.execute("SELECT muted FROM table_changes "
+                        "WHERE name = 'flights'").fetchone()[0] == 0
+    conn.close()